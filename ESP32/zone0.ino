@@ -14,6 +14,8 @@
 #include <WiFiS3.h>
 #endif
 
+#include <WiFiUdp.h>
+
 #include "credentials.h" // Custom header
 #include <Firebase_ESP_Client.h>
 #include <addons/TokenHelper.h> // Provide the token generation process info.
@@ -26,6 +28,18 @@ FirebaseAuth auth;
 FirebaseConfig config;
 
 unsigned long sendDataPrevMillis = 0;
+
+// Local push channel (communication_protocol: udp). Firebase is only polled while pushes are missing.
+#define ZONE_INDEX 0
+#define LOCAL_PORT 4210
+#define PUSH_TIMEOUT_MS 5000
+
+WiFiUDP udp;
+uint8_t packet[64];
+uint16_t lastSession = 0;
+uint32_t lastSeq = 0;
+bool hasSession = false;
+unsigned long lastPushMillis = 0;
 #define LED_BUILTIN 2 
 #define RELAY 4 
 
@@ -104,10 +118,16 @@ void setup() {
     Firebase.setDoubleDigits(5);
 
     config.timeout.serverResponse = 10 * 1000;
+
+    udp.begin(LOCAL_PORT);
+    Serial.printf("Listening for zone states on UDP port %d\n", LOCAL_PORT);
 }
 
 void loop() {
-  if (Firebase.ready() && (millis() - sendDataPrevMillis > 15000 || sendDataPrevMillis == 0)) {
+  handlePushedState();
+
+  bool pushActive = lastPushMillis != 0 && millis() - lastPushMillis < PUSH_TIMEOUT_MS;
+  if (!pushActive && Firebase.ready() && (millis() - sendDataPrevMillis > 15000 || sendDataPrevMillis == 0)) {
     sendDataPrevMillis = millis();
     // Serial.printf("Get string... %s\n", Firebase.RTDB.getString(&fbdo, F("/zones/z0-z1")) ? fbdo.to<const char *>() : fbdo.errorReason().c_str());
 
@@ -128,6 +148,50 @@ void loop() {
   }
 }
 
+// STATE: "TL", version 1, type 1, session (uint16), seq (uint32), zone count (uint8), one class code per zone
+// ACK:   "TL", version 1, type 2, session (uint16), seq (uint32) - all big-endian
+void handlePushedState() {
+  int size = udp.parsePacket();
+  if (size <= 0)
+    return;
+
+  int len = udp.read(packet, sizeof(packet));
+  if (len < 11 || packet[0] != 'T' || packet[1] != 'L' || packet[2] != 1 || packet[3] != 1)
+    return;
+
+  uint16_t session = (packet[4] << 8) | packet[5];
+  uint32_t seq = ((uint32_t)packet[6] << 24) | ((uint32_t)packet[7] << 16) | ((uint32_t)packet[8] << 8) | packet[9];
+  uint8_t count = packet[10];
+  if (len < 11 + count)
+    return;
+
+  // A new session means the sender restarted, so its seq starts over; whatever seq it starts at is applied
+  if (!hasSession || session != lastSession) {
+    hasSession = true;
+    lastSession = session;
+    lastSeq = seq - 1;
+  }
+  // Newer across the uint32 wrap: the sender skips 0 and goes from 0xFFFFFFFF to 1
+  if ((int32_t)(seq - lastSeq) > 0) {
+    lastSeq = seq;
+    uint8_t code = ZONE_INDEX < count ? packet[11 + ZONE_INDEX] : 0;
+    setRelay(code != 0);  // Class code 0 means no vehicle
+    previous_word = " ";  // Let the Firebase fallback re-evaluate if pushes stop
+  }
+  lastPushMillis = millis();
+
+  // Ack every state, including duplicates, so the sender stops retrying
+  uint8_t ack[10] = {'T', 'L', 1, 2, packet[4], packet[5], packet[6], packet[7], packet[8], packet[9]};
+  udp.beginPacket(udp.remoteIP(), udp.remotePort());
+  udp.write(ack, sizeof(ack));
+  udp.endPacket();
+}
+
+void setRelay(bool on) {
+  digitalWrite(LED_BUILTIN, on ? 1 : 0);
+  digitalWrite(RELAY, on ? ON : OFF);
+}
+
 void evaluateData(String word) {
   word.trim();
 
@@ -0,0 +1,308 @@
+"""
+Offline throughput and latency benchmark for the detection pipeline.
+
+Runs the PC pipeline headless over the videos in src/inference/videos (or synthetic
+frames) with an in-memory stand-in for Firebase, and prints the results as JSON so
+they can be compared across commits and detector backends:
+
+    python benchmark.py                              # videos from src/inference/videos
+    python benchmark.py --synthetic 300              # 300 synthetic frames
+    python benchmark.py --detector stub --output bench.json
+    python benchmark.py --micro-only
+"""
+import argparse
+import contextlib
+import cv2
+import glob
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from stls_lib import stls
+from stls_lib.synthetic import grid_zones, write_zones_file
+
+PIPELINE_STAGES = ["decode", "resize", "predict", "zone_assignment", "queuing", "render", "publish"]
+
+def percentiles(samples_ms):
+    if not samples_ms:
+        return {"count": 0}
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "count": int(values.size),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max())
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StubDetector:
+    """Detector stand-in returning random boxes, to measure everything except the model."""
+    def __init__(self, boxes_per_frame, number_of_classes, seed=0):
+        self.boxes_per_frame = boxes_per_frame
+        self.number_of_classes = number_of_classes
+        self.rng = np.random.default_rng(seed)
+
+    def detect(self, frames, confidence):
+        return [random_boxes(self.rng, self.boxes_per_frame, frame.shape[1], frame.shape[0], self.number_of_classes) for frame in frames]
+
+
+def random_boxes(rng, count, frame_width, frame_height, number_of_classes):
+    x1 = rng.uniform(0, frame_width - 40, count)
+    y1 = rng.uniform(0, frame_height - 40, count)
+    w = rng.uniform(20, 160, count)
+    h = rng.uniform(20, 120, count)
+    boxes = np.empty((count, 6), dtype=np.float32)
+    boxes[:, 0], boxes[:, 1] = x1, y1
+    boxes[:, 2], boxes[:, 3] = np.minimum(x1 + w, frame_width - 1), np.minimum(y1 + h, frame_height - 1)
+    boxes[:, 4] = rng.uniform(0.2, 1.0, count)
+    boxes[:, 5] = rng.integers(0, number_of_classes, count)
+    return boxes
+
+
+def synthetic_frames(count, width, height, seed=0):
+    """Moving bright rectangles over a noisy road-grey background."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(90, 140, (height, width, 3), dtype=np.uint8)
+    for indx in range(count):
+        frame = background.copy()
+        for lane in range(4):
+            x = (indx * (8 + lane * 3) + lane * 200) % width
+            y = height // 5 * (lane + 1)
+            frame[max(y - 30, 0):y + 30, x:x + 90] = (40 + lane * 50, 200, 255 - lane * 40)
+        yield frame
+
+
+def time_call(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return percentiles(samples)
+
+
+def run_pipeline(frames, yolo_model, class_list, zones, zone_index, config, render_frames):
+    """Run the headless pipeline over frames, timing every stage separately."""
+    from stls_lib import rtdb, render, zone_state, detections
+
+    number_of_zones = len(zones)
+    frame_width, frame_height = config["frame_width"], config["frame_height"]
+    backend = rtdb.MemoryBackend()
+    publisher = rtdb.Publisher(backend)
+    renderer = render.Renderer("benchmark", 1, "q", zones, class_list) if render_frames else None
+    engine = zone_state.ZoneStateEngine(number_of_zones, config["time_interval"], class_list)
+    ring = detections.DetectionRing()
+
+    stage_samples = {stage: [] for stage in PIPELINE_STAGES}
+    latency_samples = []
+    processed = 0
+    started = time.perf_counter()
+
+    frames = iter(frames)
+    while True:
+        t0 = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        t1 = time.perf_counter()
+        frame = cv2.resize(frame, (frame_width, frame_height))
+        t2 = time.perf_counter()
+        boxes = stls.get_prediction_boxes(frame, yolo_model, config["detect_sensitivity"])
+        t3 = time.perf_counter()
+        box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+        frame_detections = ring.fill(boxes, box_zones)
+        t4 = time.perf_counter()
+        now = time.time()
+        changed = engine.step(frame_detections["class_id"], frame_detections["zone_id"], now)
+        t5 = time.perf_counter()
+        if renderer is not None:
+            data_to_display = {
+                "number_of_zones": number_of_zones,
+                "zones_list": detections.zone_vehicle_names(frame_detections, class_list, number_of_zones),
+                "frame_name": "benchmark",
+                "queuing_data": engine.queuing_data(now),
+                "processing_time": (t5 - t0) * 1000
+            }
+            renderer.render(frame, frame_detections, engine.occupied, data_to_display)
+        t6 = time.perf_counter()
+        if len(changed):
+            publisher.publish(engine.vehicle_names())
+        t7 = time.perf_counter()
+
+        for stage, (begin, end) in zip(PIPELINE_STAGES, [(t0, t1), (t1, t2), (t2, t3), (t3, t4), (t4, t5), (t5, t6), (t6, t7)]):
+            stage_samples[stage].append((end - begin) * 1000)
+        latency_samples.append((t7 - t0) * 1000)
+        processed += 1
+
+    elapsed = time.perf_counter() - started
+    publisher.stop()
+    return {
+        "frames": processed,
+        "fps": processed / elapsed if elapsed > 0 else 0.0,
+        "latency": percentiles(latency_samples),
+        "stages": {stage: percentiles(samples) for stage, samples in stage_samples.items()},
+        "publisher": publisher.stats()
+    }
+
+
+def video_frames(video_path, limit):
+    captured = stls.load_camera(video_path)
+    count = 0
+    try:
+        while limit <= 0 or count < limit:
+            success, frame = captured.read()
+            if not success:
+                break
+            count += 1
+            yield frame
+    finally:
+        captured.release()
+
+
+def run_micro_benchmarks(class_list, frame_width, frame_height, zone_counts, box_counts, repeat):
+    """Scale zone and box counts for track_objects_in_zones, the queuing logic and extract_data_from_file."""
+    from stls_lib import zone_state, detections
+
+    rng = np.random.default_rng(0)
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for number_of_zones in zone_counts:
+            zones = grid_zones(number_of_zones, frame_width, frame_height)
+            zones_file_path = os.path.join(tmp_dir, f"zones_{number_of_zones}.txt")
+            write_zones_file(zones_file_path, zones, frame_width, frame_height)
+            extract_result = time_call(lambda: stls.extract_data_from_file(zones_file_path), repeat)
+
+            start = time.perf_counter()
+            zone_index = stls.build_zone_index(zones, frame_width, frame_height)
+            build_ms = (time.perf_counter() - start) * 1000
+
+            for number_of_boxes in box_counts:
+                boxes = random_boxes(rng, number_of_boxes, frame_width, frame_height, len(class_list))
+                box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+                collected_vehicle = stls.collect_vehicles_by_zone(boxes, box_zones, class_list, number_of_zones)
+                engine = zone_state.ZoneStateEngine(number_of_zones, 3.0, class_list)
+                ring = detections.DetectionRing()
+                zones_data = [{"countdown_start_time": 0.0, "refresh": False, "get_vehicle": 'none'} for _ in range(number_of_zones)]
+
+                results.append({
+                    "zones": number_of_zones,
+                    "boxes": number_of_boxes,
+                    "extract_data_from_file": extract_result,
+                    "build_zone_index_ms": build_ms,
+                    "track_objects_in_zones_polygon": time_call(lambda: stls.track_objects_in_zones(None, boxes, class_list, zones, stls.init_list_of_collected_vehicle(number_of_zones), "off"), repeat),
+                    "track_objects_in_zones_indexed": time_call(lambda: stls.track_objects_in_zones(None, boxes, class_list, zones, stls.init_list_of_collected_vehicle(number_of_zones), "off", zone_index), repeat),
+                    "handle_zone_queuing": time_call(lambda: [stls.handle_zone_queuing(indx, collected_vehicle, time.time(), zones_data, 3.0) for indx in range(number_of_zones)], repeat),
+                    "collect_vehicles_by_zone": time_call(lambda: stls.collect_vehicles_by_zone(boxes, box_zones, class_list, number_of_zones), repeat),
+                    "detection_ring_fill": time_call(lambda: ring.fill(boxes, box_zones), repeat),
+                    "zone_state_engine": time_call(lambda: engine.update(boxes, box_zones, time.time()), repeat)
+                })
+    return results
+
+
+def parse_int_list(value):
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the smart traffic light detection pipeline.")
+    parser.add_argument("--root-data", default="src/utils/root_data.txt", help="Configuration file to read defaults from.")
+    parser.add_argument("--videos", default="src/inference/videos", help="Directory (or single file) of recorded videos.")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N synthetic frames instead of videos.")
+    parser.add_argument("--max-frames", type=int, default=0, help="Stop each video after N frames (0 = all).")
+    parser.add_argument("--detector", default=None, help="ultralytics, onnx, openvino or stub (default: detector_backend from root data).")
+    parser.add_argument("--stub-boxes", type=int, default=20, help="Boxes per frame for the stub detector.")
+    parser.add_argument("--render", action="store_true", help="Also time rendering the overlay (never shown).")
+    parser.add_argument("--micro-zones", type=parse_int_list, default=[2, 8, 32], help="Zone counts for the micro-benchmarks.")
+    parser.add_argument("--micro-boxes", type=parse_int_list, default=[10, 100, 1000], help="Box counts for the micro-benchmarks.")
+    parser.add_argument("--micro-repeat", type=int, default=50)
+    parser.add_argument("--micro-only", action="store_true", help="Only run the micro-benchmarks.")
+    parser.add_argument("--output", default=None, help="Write the JSON report to this file instead of stdout.")
+    args = parser.parse_args()
+
+    # The pipeline logs to stdout; keep stdout clean for the JSON report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(args)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+        print(f"Benchmark report written to {args.output}")
+    else:
+        print(text)
+
+
+def run_benchmark(args):
+    config = stls.extract_root_data(args.root_data)
+    frame_width, frame_height = config["frame_width"], config["frame_height"]
+    class_list = stls.load_class_names(config["class_list_file_path"])
+    detector = (args.detector or str(config.get("detector_backend", "ultralytics"))).lower()
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "detector": detector,
+        "frame_width": frame_width,
+        "frame_height": frame_height,
+        "runs": []
+    }
+
+    if not args.micro_only:
+        if detector == "stub":
+            yolo_model = StubDetector(args.stub_boxes, len(class_list))
+        else:
+            load_start = time.perf_counter()
+            yolo_model = stls.load_model(config["weight_file_path"], detector, config.get("detector_imgsz", 640), config.get("warmup_runs", 3), frame_width, frame_height)
+            report["model_load_ms"] = (time.perf_counter() - load_start) * 1000
+
+        if os.path.exists(config["zones_file_path"]) and os.path.getsize(config["zones_file_path"]) > 0:
+            data = stls.extract_data_from_file(config["zones_file_path"])
+            zones = stls.convert_coordinates(data["zones"], data["frame_width"], data["frame_height"], frame_width, frame_height)
+        else:
+            zones = grid_zones(2, frame_width, frame_height)
+        zone_index = stls.build_zone_index(zones, frame_width, frame_height)
+
+        if args.synthetic > 0:
+            sources = [("synthetic", lambda: synthetic_frames(args.synthetic, frame_width, frame_height))]
+        else:
+            paths = [args.videos] if os.path.isfile(args.videos) else sorted(
+                path for path in glob.glob(os.path.join(args.videos, "*")) if path.lower().endswith((".mp4", ".avi", ".mkv", ".mov"))
+            )
+            if not paths:
+                print(f"No videos found in '{args.videos}', falling back to 300 synthetic frames.", file=sys.stderr)
+                sources = [("synthetic", lambda: synthetic_frames(300, frame_width, frame_height))]
+            else:
+                sources = [(path, lambda path=path: video_frames(path, args.max_frames)) for path in paths]
+
+        for name, make_frames in sources:
+            result = run_pipeline(make_frames(), yolo_model, class_list, zones, zone_index, config, args.render)
+            result["source"] = name
+            report["runs"].append(result)
+
+    report["micro"] = run_micro_benchmarks(class_list, frame_width, frame_height, args.micro_zones, args.micro_boxes, args.micro_repeat)
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+if __name__ == "__main__":
+    main()
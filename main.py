@@ -1,14 +1,18 @@
-from stls_lib import stls
+import time
+STARTUP = time.perf_counter()  # Taken before the other imports, so the startup report includes them
+from stls_lib import stls, actuation, metrics
 
 def handle_invalid_input(input_name, expected_values, value):
     print(f"\nInvalid input found at {input_name}. Input must be one of {expected_values}. Found: {value}")
     exit()
 
-def process_rp_device(data):
+def process_rp_device(data, startup_timer=None):
     """
     Process the Raspberry Pi device logic.
     """
     from stls_lib.rp import rp_write_points, rp_process_video
+    if startup_timer is not None:
+        startup_timer.mark("imports")
     
     write_points_mode = data["write_points_mode"].lower()
     if write_points_mode == "true":
@@ -33,18 +37,134 @@ def process_rp_device(data):
                 frame_width = data["frame_width"],
                 wait_key = data["wait_key"],
                 ord_key = data["ord_key"],
-                communication_protocol = data["communication_protocol"]
+                communication_protocol = data["communication_protocol"],
+                pipeline_mode = str(data.get("pipeline_mode", "off")),
+                queue_size = data.get("queue_size", 2),
+                drop_policy = str(data.get("drop_policy", "oldest")).lower(),
+                firebase_backend = str(data.get("firebase_backend", "firebase")).lower(),
+                target_fps = data.get("target_fps", 0.0),
+                latency_budget_ms = data.get("latency_budget_ms", 0.0),
+                boost_seconds = data.get("boost_seconds", 2.0),
+                render_every = data.get("render_every", 1),
+                detector_backend = str(data.get("detector_backend", "ultralytics")).lower(),
+                detector_imgsz = data.get("detector_imgsz", 640),
+                warmup_runs = data.get("warmup_runs", 3),
+                roi_mode = str(data.get("roi_mode", "off")).lower(),
+                roi_padding = data.get("roi_padding", 32),
+                tracker_mode = str(data.get("tracker", "off")),
+                keyframe_interval = data.get("keyframe_interval", 3),
+                track_max_uncertainty = data.get("track_max_uncertainty", 0.5),
+                motion_gate_mode = str(data.get("motion_gate", "off")),
+                motion_threshold = data.get("motion_threshold", 0.01),
+                motion_force_interval = data.get("motion_force_interval", 5.0),
+                lores_stream = str(data.get("lores_stream", "off")),
+                controllers = actuation.controllers_from_data(data, data.get("esp32_port", actuation.DEFAULT_PORT)),
+                firebase_mirror = str(data.get("firebase_mirror", "off")),
+                metrics_mode = str(data.get("metrics", "off")),
+                metrics_port = data.get("metrics_port", 9108),
+                metrics_log_interval = data.get("metrics_log_interval", 10.0),
+                record_file_path = str(data.get("record_file_path", "")),
+                latency_slo_ms = data.get("latency_slo_ms", 0.0),
+                degraded_imgsz = data.get("degraded_imgsz", 320),
+                light_weight_file_path = str(data.get("light_weight_file_path", "")),
+                hub = actuation.hub_from_data(data),
+                startup_timer = startup_timer
             )
     else:
         handle_invalid_input("data[\"write_points_mode\"]", ["true", "false"], write_points_mode)
 
-def process_pc_device(data):
+def process_pc_multi_source(data, startup_timer=None):
+    """
+    Process several video sources (one per blind curve) with one model on the PC.
+    """
+    from stls_lib.pc import pc_multi_video_process
+    if startup_timer is not None:
+        startup_timer.mark("imports")
+
+    pc_multi_video_process.main(
+            sources = stls.extract_sources(data["sources_file_path"]),
+            weight_file_path = data["weight_file_path"],
+            class_list_file_path = data["class_list_file_path"],
+            detect_sensitivity = data["detect_sensitivity"],
+            frame_name = data["frame_name"],
+            time_interval = data["time_interval"],
+            frame_height = data["frame_height"],
+            frame_width = data["frame_width"],
+            wait_key = data["wait_key"],
+            ord_key = data["ord_key"],
+            communication_protocol = data["communication_protocol"],
+            pipeline_mode = str(data.get("pipeline_mode", "off")),
+            queue_size = data.get("queue_size", 2),
+            drop_policy = str(data.get("drop_policy", "oldest")).lower(),
+            firebase_backend = str(data.get("firebase_backend", "firebase")).lower(),
+            target_fps = data.get("target_fps", 0.0),
+            latency_budget_ms = data.get("latency_budget_ms", 0.0),
+            boost_seconds = data.get("boost_seconds", 2.0),
+            render_every = data.get("render_every", 1),
+            detector_backend = str(data.get("detector_backend", "ultralytics")).lower(),
+            detector_imgsz = data.get("detector_imgsz", 640),
+            warmup_runs = data.get("warmup_runs", 3),
+            firebase_mirror = str(data.get("firebase_mirror", "off")),
+            esp32_port = data.get("esp32_port", actuation.DEFAULT_PORT),
+            metrics_mode = str(data.get("metrics", "off")),
+            metrics_port = data.get("metrics_port", 9108),
+            metrics_log_interval = data.get("metrics_log_interval", 10.0),
+            decode_scale = str(data.get("decode_scale", "off")),
+            resize_interpolation = str(data.get("resize_interpolation", "linear")),
+            hw_decode = str(data.get("hw_decode", "off")),
+            startup_timer = startup_timer
+        )
+
+def process_replay(data):
+    """
+    Replay recorded detections against the configured zones, detect_sensitivity and time_interval.
+    """
+    from stls_lib import recording
+
+    recording.main(
+            replay_file_path = data["replay_file_path"],
+            zones_file_path = data["zones_file_path"],
+            class_list_file_path = data["class_list_file_path"],
+            detect_sensitivity = data["detect_sensitivity"],
+            time_interval = data["time_interval"]
+        )
+
+def process_hub(data, startup_timer=None):
+    """
+    Run the aggregation hub for many edge devices.
+    """
+    from stls_lib import hub
+    if startup_timer is not None:
+        startup_timer.mark("imports")
+        stls.print_data(startup_timer.report())
+
+    hub.main(
+            class_list_file_path = data["class_list_file_path"],
+            communication_protocol = data["communication_protocol"],
+            port = data.get("hub_port", actuation.HUB_PORT),
+            nodes_file_path = str(data.get("hub_nodes_file_path", "")),
+            interval = data.get("hub_interval", 0.05),
+            firebase_interval = data.get("hub_firebase_interval", 1.0),
+            node_timeout = data.get("hub_node_timeout", 5.0),
+            firebase_backend = str(data.get("firebase_backend", "firebase")).lower(),
+            metrics_mode = str(data.get("metrics", "off")),
+            metrics_port = data.get("metrics_port", 9108),
+            metrics_log_interval = data.get("metrics_log_interval", 10.0)
+        )
+
+def process_pc_device(data, startup_timer=None):
     """
     Process the PC device logic.
     """
     from stls_lib.pc import pc_write_points, pc_video_process
+    if startup_timer is not None:
+        startup_timer.mark("imports")
     
     write_points_mode = data["write_points_mode"].lower()
+    if write_points_mode == "false" and "sources_file_path" in data:
+        process_pc_multi_source(data, startup_timer)
+        return
+
     if write_points_mode == "true":
         pc_write_points.main(
                 video_source = data["video_source"],
@@ -69,7 +189,41 @@ def process_pc_device(data):
                 frame_width = data["frame_width"],
                 wait_key = data["wait_key"],
                 ord_key = data["ord_key"],
-                communication_protocol = data["communication_protocol"]
+                communication_protocol = data["communication_protocol"],
+                pipeline_mode = str(data.get("pipeline_mode", "off")),
+                queue_size = data.get("queue_size", 2),
+                drop_policy = str(data.get("drop_policy", "oldest")).lower(),
+                firebase_backend = str(data.get("firebase_backend", "firebase")).lower(),
+                target_fps = data.get("target_fps", 0.0),
+                latency_budget_ms = data.get("latency_budget_ms", 0.0),
+                boost_seconds = data.get("boost_seconds", 2.0),
+                render_every = data.get("render_every", 1),
+                detector_backend = str(data.get("detector_backend", "ultralytics")).lower(),
+                detector_imgsz = data.get("detector_imgsz", 640),
+                warmup_runs = data.get("warmup_runs", 3),
+                roi_mode = str(data.get("roi_mode", "off")).lower(),
+                roi_padding = data.get("roi_padding", 32),
+                tracker_mode = str(data.get("tracker", "off")),
+                keyframe_interval = data.get("keyframe_interval", 3),
+                track_max_uncertainty = data.get("track_max_uncertainty", 0.5),
+                motion_gate_mode = str(data.get("motion_gate", "off")),
+                motion_threshold = data.get("motion_threshold", 0.01),
+                motion_force_interval = data.get("motion_force_interval", 5.0),
+                controllers = actuation.controllers_from_data(data, data.get("esp32_port", actuation.DEFAULT_PORT)),
+                firebase_mirror = str(data.get("firebase_mirror", "off")),
+                metrics_mode = str(data.get("metrics", "off")),
+                metrics_port = data.get("metrics_port", 9108),
+                metrics_log_interval = data.get("metrics_log_interval", 10.0),
+                record_file_path = str(data.get("record_file_path", "")),
+                inference_workers = data.get("inference_workers", 0),
+                decode_scale = str(data.get("decode_scale", "off")),
+                resize_interpolation = str(data.get("resize_interpolation", "linear")),
+                hw_decode = str(data.get("hw_decode", "off")),
+                latency_slo_ms = data.get("latency_slo_ms", 0.0),
+                degraded_imgsz = data.get("degraded_imgsz", 320),
+                light_weight_file_path = str(data.get("light_weight_file_path", "")),
+                hub = actuation.hub_from_data(data),
+                startup_timer = startup_timer
             )
     else:
         handle_invalid_input("data[\"write_points_mode\"]", ["true", "false"], write_points_mode)
@@ -78,15 +232,24 @@ def main():
     """
     Main entry point for the script.
     """
+    startup_timer = metrics.StartupTimer(STARTUP)
+    startup_timer.mark("imports")
     data = stls.extract_root_data(file_path="src/utils/root_data.txt")
+    startup_timer.mark("config")
+
+    if "replay_file_path" in data:
+        process_replay(data)
+        return
 
     device = data.get("device", "").lower()
     if device == "rp":
-        process_rp_device(data)
+        process_rp_device(data, startup_timer)
     elif device == "pc":
-        process_pc_device(data)
+        process_pc_device(data, startup_timer)
+    elif device == "hub":
+        process_hub(data, startup_timer)
     else:
-        handle_invalid_input("data[\"device\"]", ["pc", "rp"], device)
+        handle_invalid_input("data[\"device\"]", ["pc", "rp", "hub"], device)
 
 if __name__ == "__main__":
     main()
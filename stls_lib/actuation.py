@@ -0,0 +1,400 @@
+import os
+import socket
+import struct
+import time
+from stls_lib import rtdb
+
+# Binary state messages pushed to the ESP32 controllers over UDP (network byte order):
+#   STATE: magic "TL", version, type=1, session (uint16), seq (uint32), zone count (uint8), one class code per zone
+#   ACK:   magic "TL", version, type=2, session (uint16), seq (uint32)
+# Class code 0 means no vehicle, otherwise it is the class index + 1 from class.names.
+# The session is random per run, so controllers reset their last seq when the sender restarts.
+# Seq skips 0 when it wraps, and receivers compare it with serial number arithmetic (seq_newer),
+# so a run that outlives 2^32 messages keeps being applied.
+#
+# Edge nodes report to a hub (communication_protocol 'hub') with the same framing over UDP or TCP:
+#   DELTA:   magic "TL", version, type=3, node (uint16), session (uint16), seq (uint32), base seq (uint32),
+#            zone count (uint8), change count (uint8), then (zone, class code) byte pairs
+#   HUB_ACK: magic "TL", version, type=4, node (uint16), session (uint16), seq (uint32)
+# A delta holds only the zones that changed since base seq, the last state the hub acked; base
+# seq 0 carries every zone. The hub acks with the delta's seq once applied, or with seq 0 when
+# it does not hold the base state (e.g. after a restart) and needs the node's full state.
+MAGIC = b"TL"
+VERSION = 1
+STATE = 1
+ACK = 2
+DELTA = 3
+HUB_ACK = 4
+NO_VEHICLE = 0
+DEFAULT_PORT = 4210
+HUB_PORT = 4300
+
+_HEADER = struct.Struct("!2sBBHIB")
+_ACK = struct.Struct("!2sBBHI")
+_DELTA = struct.Struct("!2sBBHHIIBB")
+_HUB_ACK = struct.Struct("!2sBBHHI")
+
+
+def next_seq(seq):
+    """The seq after seq, wrapping past 0xFFFFFFFF to 1 (0 is reserved)."""
+    return (seq + 1) & 0xFFFFFFFF or 1
+
+
+def seq_newer(seq, last_seq):
+    """Whether seq comes after last_seq, across the uint32 wrap (RFC 1982 serial number arithmetic)."""
+    return 0 < (seq - last_seq) & 0xFFFFFFFF < 0x80000000
+
+
+def encode_state(session, seq, codes):
+    return _HEADER.pack(MAGIC, VERSION, STATE, session, seq, len(codes)) + bytes(codes)
+
+
+def encode_ack(session, seq):
+    return _ACK.pack(MAGIC, VERSION, ACK, session, seq)
+
+
+def encode_delta(node, session, seq, base_seq, zone_count, changes):
+    """changes: (zone, class code) pairs; all zones when base_seq is 0."""
+    return _DELTA.pack(MAGIC, VERSION, DELTA, node, session, seq, base_seq, zone_count, len(changes)) + bytes(value for change in changes for value in change)
+
+
+def encode_hub_ack(node, session, seq):
+    return _HUB_ACK.pack(MAGIC, VERSION, HUB_ACK, node, session, seq)
+
+
+def message_size(header):
+    """
+    Full length of the message starting with header (at least 4 bytes), so a TCP stream can be
+    cut into messages; None while more of the header is needed, 0 when it is not ours.
+    """
+    if header[:2] != MAGIC or header[2] != VERSION:
+        return 0
+    if header[3] == ACK:
+        return _ACK.size
+    if header[3] == HUB_ACK:
+        return _HUB_ACK.size
+    if header[3] == STATE:
+        return _HEADER.size + header[_HEADER.size - 1] if len(header) >= _HEADER.size else None
+    if header[3] == DELTA:
+        return _DELTA.size + 2 * header[_DELTA.size - 1] if len(header) >= _DELTA.size else None
+    return 0
+
+
+def decode_message(message):
+    """Parse a state, ack, delta or hub ack message; returns a dict, or None when the message is not ours."""
+    if len(message) >= _ACK.size and message[:2] == MAGIC and message[2] == VERSION:
+        if message[3] == ACK and len(message) == _ACK.size:
+            _, _, _, session, seq = _ACK.unpack(message)
+            return {"type": ACK, "session": session, "seq": seq}
+        if message[3] == STATE and len(message) >= _HEADER.size:
+            _, _, _, session, seq, count = _HEADER.unpack_from(message)
+            codes = list(message[_HEADER.size:_HEADER.size + count])
+            if len(codes) == count:
+                return {"type": STATE, "session": session, "seq": seq, "codes": codes}
+        if message[3] == DELTA and len(message) >= _DELTA.size:
+            _, _, _, node, session, seq, base_seq, zone_count, count = _DELTA.unpack_from(message)
+            pairs = message[_DELTA.size:_DELTA.size + 2 * count]
+            if len(pairs) == 2 * count:
+                return {"type": DELTA, "node": node, "session": session, "seq": seq, "base_seq": base_seq,
+                        "zone_count": zone_count, "changes": list(zip(pairs[0::2], pairs[1::2]))}
+        if message[3] == HUB_ACK and len(message) == _HUB_ACK.size:
+            _, _, _, node, session, seq = _HUB_ACK.unpack(message)
+            return {"type": HUB_ACK, "node": node, "session": session, "seq": seq}
+    return None
+
+
+def parse_address(value, default_port=DEFAULT_PORT):
+    """'192.168.1.50' or '192.168.1.50:4210' -> (host, port)."""
+    host, _, port = str(value).strip().partition(":")
+    return host, int(port) if port else default_port
+
+
+def controllers_from_data(data, default_port=DEFAULT_PORT):
+    """Controller addresses from root_data: IP_ESP32_1, IP_ESP32_2, ... in numeric order."""
+    keys = [key for key in data if key.startswith("IP_ESP32_") and key[len("IP_ESP32_"):].isdigit()]
+    keys.sort(key=lambda key: int(key[len("IP_ESP32_"):]))
+    return [parse_address(data[key], default_port) for key in keys if str(data[key]).lower() not in ("", "none", "off")]
+
+
+class UdpBackend:
+    """
+    Pushes the zone state to every controller and waits for their acks.
+
+    send() transmits only to the controllers that have not acked this seq yet and raises
+    TimeoutError when some stay silent, so the Publisher retries just those with its
+    backoff. A newer state gets a new seq; retries and refreshes reuse the same bytes.
+    """
+    name = "ESP32"
+
+    def __init__(self, controllers, class_list, ack_timeout=0.05):
+        self.controllers = [(socket.gethostbyname(host), port) for host, port in controllers]
+        self.codes = {name: indx + 1 for indx, name in enumerate(class_list)}
+        self.ack_timeout = ack_timeout
+        self.session = int.from_bytes(os.urandom(2), "big")
+        self.seq = 0
+        self.acked = set()
+        self.acked_seq = None
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("0.0.0.0", 0))
+
+    def encode(self, data):
+        """Formatter for the Publisher: vehicle names -> one state message with the next seq."""
+        self.seq = next_seq(self.seq)
+        return encode_state(self.session, self.seq, [self.codes.get(vehicle, NO_VEHICLE) for vehicle in data])
+
+    def describe(self, message):
+        decoded = decode_message(message)
+        return f"seq {decoded['seq']} codes {decoded['codes']}"
+
+    def send(self, message):
+        seq = decode_message(message)["seq"]
+        if seq != self.acked_seq:
+            self.acked_seq = seq
+            self.acked = set()
+
+        waiting = [address for address in self.controllers if address not in self.acked]
+        if not waiting:
+            # Everyone acked this seq already: this is a refresh, resend to all
+            self.acked = set()
+            waiting = self.controllers
+        for address in waiting:
+            self.socket.sendto(message, address)
+
+        deadline = time.perf_counter() + self.ack_timeout
+        while len(self.acked) < len(self.controllers):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            self.socket.settimeout(remaining)
+            try:
+                reply, address = self.socket.recvfrom(64)
+            except socket.timeout:
+                break
+            ack = decode_message(reply)
+            if ack is not None and ack["type"] == ACK and ack["session"] == self.session and ack["seq"] == seq:
+                self.acked.add(address)
+
+        missing = [address for address in self.controllers if address not in self.acked]
+        if missing:
+            raise TimeoutError(f"no ack for seq {seq} from {', '.join(f'{host}:{port}' for host, port in missing)}")
+
+
+class HubBackend:
+    """
+    Reports this node's zone state to the hub as deltas against the last state the hub acked.
+
+    send() waits up to ack_timeout for the hub's ack and raises otherwise, so the Publisher
+    retries with its backoff; every attempt is encoded afresh, so a retry after the hub lost
+    the node's state (e.g. it restarted) carries the full state. The Publisher's refreshes
+    become empty deltas, which keep the node marked alive at the hub. transport is 'udp' or
+    'tcp' (one connection, reopened after errors).
+    """
+    name = "hub"
+
+    def __init__(self, address, node, class_list, transport="udp", ack_timeout=0.2):
+        self.address = (socket.gethostbyname(address[0]), address[1])
+        self.node = node
+        self.transport = transport.lower()
+        if self.transport not in ("udp", "tcp"):
+            raise ValueError(f"Invalid hub_transport: {transport}. Please use 'udp' or 'tcp'.")
+        self.codes = {name: indx + 1 for indx, name in enumerate(class_list)}
+        self.ack_timeout = ack_timeout
+        self.session = int.from_bytes(os.urandom(2), "big")
+        self.seq = 0
+        self.acked_seq = 0
+        self.acked_codes = None
+        self.socket = None
+        self.buffer = b""
+
+    def encode(self, data):
+        """Formatter for the Publisher: vehicle names -> class codes."""
+        return [self.codes.get(vehicle, NO_VEHICLE) for vehicle in data]
+
+    def describe(self, codes):
+        return f"node {self.node} codes {codes}"
+
+    def send(self, codes):
+        self.seq = next_seq(self.seq)
+        if self.acked_codes is None or len(self.acked_codes) != len(codes):
+            base_seq, changes = 0, list(enumerate(codes))
+        else:
+            base_seq, changes = self.acked_seq, [(zone, code) for zone, (code, acked) in enumerate(zip(codes, self.acked_codes)) if code != acked]
+
+        if self.request(encode_delta(self.node, self.session, self.seq, base_seq, len(codes), changes)) == 0:
+            self.acked_codes = None
+            raise ConnectionError(f"the hub lost the state of node {self.node}, resending it in full")
+        self.acked_seq = self.seq
+        self.acked_codes = list(codes)
+
+    def request(self, message):
+        """Send one delta and return the seq of the hub's answer: the delta's seq, or 0 to resend in full."""
+        deadline = time.perf_counter() + self.ack_timeout
+        try:
+            if self.socket is None:
+                if self.transport == "tcp":
+                    self.socket = socket.create_connection(self.address, timeout=self.ack_timeout)
+                    self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                else:
+                    self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                    self.socket.connect(self.address)
+            self.socket.sendall(message)
+            while True:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    raise TimeoutError(f"no ack from the hub at {self.address[0]}:{self.address[1]}")
+                self.socket.settimeout(remaining)
+                ack = decode_message(self.receive())
+                # Late acks of earlier attempts are skipped
+                if ack is not None and ack["type"] == HUB_ACK and ack["node"] == self.node and ack["session"] == self.session and ack["seq"] in (self.seq, 0):
+                    return ack["seq"]
+        except socket.timeout:
+            raise TimeoutError(f"no ack from the hub at {self.address[0]}:{self.address[1]}")
+        except OSError:
+            self.close()
+            raise
+
+    def receive(self):
+        if self.transport == "udp":
+            return self.socket.recv(64)
+        while len(self.buffer) < _HUB_ACK.size:
+            chunk = self.socket.recv(64)
+            if not chunk:
+                raise ConnectionError("the hub closed the connection")
+            self.buffer += chunk
+        message, self.buffer = self.buffer[:_HUB_ACK.size], self.buffer[_HUB_ACK.size:]
+        return message
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+            self.buffer = b""
+
+
+def hub_from_data(data):
+    """The hub settings of an edge node from root_data: (address, node id, transport), or None without hub_address."""
+    if str(data.get("hub_address", "")).lower() in ("", "none", "off"):
+        return None
+    return parse_address(data["hub_address"], HUB_PORT), int(data.get("hub_node_id", 0)), str(data.get("hub_transport", "udp")).lower()
+
+
+class PublisherGroup:
+    """Fans one zone state out to several publishers, e.g. the ESP32 channel plus the Firebase mirror."""
+    def __init__(self, publishers):
+        self.publishers = publishers
+
+    def publish(self, data):
+        for publisher in self.publishers:
+            publisher.publish(data)
+
+    def stop(self, timeout=5.0):
+        for publisher in self.publishers:
+            publisher.stop(timeout)
+
+    def stats(self):
+        return {publisher.name: publisher.stats() for publisher in self.publishers}
+
+
+def firebase_status(communication_protocol: str, firebase_mirror="off"):
+    """'on' when Firebase has to be initialized for this protocol, otherwise 'off'."""
+    protocol = communication_protocol.lower()
+    if protocol in ("udp", "hub"):
+        return "on" if str(firebase_mirror).lower() == "on" else "off"
+    return protocol
+
+
+def start_channel(communication_protocol: str, class_list, controllers, firebase_mirror="off", firebase_backend="firebase",
+                  file_path="firebase_stand_in.jsonl", path='/zones', key='z0-z1', ack_timeout=0.05, refresh_interval=1.0, hub=None):
+    """
+    Publisher for the selected communication_protocol: 'on' is Firebase as before, 'udp'
+    pushes binary states straight to the controllers and 'hub' reports deltas to the hub
+    (hub = (address, node id, transport)), both with Firebase as an optional mirror; 'off'
+    returns None.
+    """
+    protocol = communication_protocol.lower()
+    if protocol in ("on", "off"):
+        return rtdb.start_publisher(protocol, firebase_backend, file_path, path, key)
+    if protocol == "hub":
+        if hub is None:
+            raise ValueError("communication_protocol 'hub' needs hub_address (and hub_node_id) in root_data.")
+        address, node, transport = hub
+        backend = HubBackend(address, node, class_list, transport)
+        print(f"Reporting zone states as node {node} to the hub at {address[0]}:{address[1]} over {transport.upper()}")
+    elif protocol == "udp":
+        if not controllers:
+            raise ValueError("communication_protocol 'udp' needs at least one controller address (IP_ESP32_1, IP_ESP32_2, ...).")
+        backend = UdpBackend(controllers, class_list, ack_timeout)
+        print(f"Pushing zone states over UDP to {', '.join(f'{host}:{port}' for host, port in backend.controllers)}")
+    else:
+        raise ValueError(f"Invalid communication_protocol: {communication_protocol}. Please use 'on', 'off', 'udp' or 'hub'.")
+
+    local = rtdb.Publisher(backend, max_retries=8, base_delay=0.02, max_delay=0.5, formatter=backend.encode, refresh_interval=refresh_interval)
+    if firebase_status(protocol, firebase_mirror) != "on":
+        return local
+    return PublisherGroup([local, rtdb.start_publisher("on", firebase_backend, file_path, path, key)])
+
+
+class LoopbackController:
+    """
+    Stand-in for one ESP32 controller on this machine: applies state messages the way the
+    sketch does (newer seq only, across the wrap; reset on a new session), acks every one of them and keeps
+    what it applied. Set drop_every to ignore every n-th message and exercise retries.
+    """
+    def __init__(self, zone_index=0, host="127.0.0.1", port=0, drop_every=0):
+        self.zone_index = zone_index
+        self.drop_every = drop_every
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind((host, port))
+        self.address = self.socket.getsockname()
+        self.session = None
+        self.last_seq = 0
+        self.received = 0
+        self.applied = []
+
+    def poll(self, timeout=0.1):
+        """Handle at most one message; returns True when one arrived."""
+        self.socket.settimeout(timeout)
+        try:
+            message, sender = self.socket.recvfrom(64)
+        except socket.timeout:
+            return False
+        state = decode_message(message)
+        if state is None or state["type"] != STATE:
+            return True
+        self.received += 1
+        if self.drop_every and self.received % self.drop_every == 0:
+            return True
+
+        if state["session"] != self.session:
+            # Whatever seq a new session starts at is applied
+            self.session = state["session"]
+            self.last_seq = (state["seq"] - 1) & 0xFFFFFFFF
+        if seq_newer(state["seq"], self.last_seq):
+            self.last_seq = state["seq"]
+            self.applied.append(state["codes"][self.zone_index] if self.zone_index < len(state["codes"]) else NO_VEHICLE)
+        self.socket.sendto(encode_ack(state["session"], state["seq"]), sender)
+        return True
+
+    @property
+    def relay_on(self):
+        return bool(self.applied) and self.applied[-1] != NO_VEHICLE
+
+    def close(self):
+        self.socket.close()
+
+
+if __name__ == "__main__":
+    # Run loopback controllers for local testing, e.g. `python -m stls_lib.actuation 4210 4211`
+    # with IP_ESP32_1: 127.0.0.1:4210 and IP_ESP32_2: 127.0.0.1:4211 in root_data.txt.
+    import sys
+    controllers = [LoopbackController(indx, port=int(port)) for indx, port in enumerate(sys.argv[1:] or [DEFAULT_PORT])]
+    print(f"Loopback controllers listening on {', '.join(f'{host}:{port}' for host, port in (c.address for c in controllers))}")
+    try:
+        while True:
+            for controller in controllers:
+                applied = len(controller.applied)
+                if controller.poll(0.01) and len(controller.applied) > applied:
+                    print(f"Zone {controller.zone_index}: relay {'ON' if controller.relay_on else 'OFF'} (seq {controller.last_seq})")
+    except KeyboardInterrupt:
+        for controller in controllers:
+            controller.close()
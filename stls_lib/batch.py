@@ -0,0 +1,262 @@
+import argparse
+import glob
+import multiprocessing as mp
+import os
+import time
+import cv2
+import numpy as np
+from stls_lib import stls, workers, zone_state
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v")
+
+# Columns of the timeline: one row per analysed frame and zone
+TIMELINE_COLUMNS = ("video", "frame", "time", "zone", "count", "occupied", "seen_class", "vehicle", "dwell", "light")
+
+ENGINE_CLOCK_OFFSET = 1.0
+
+_model = None
+_settings = None
+
+
+def _init_worker(model_args, settings):
+    """Pool initializer: one model and one detector thread per worker process."""
+    global _model, _settings
+    cv2.setNumThreads(1)
+    _model = stls.load_model(*model_args)
+    _settings = settings
+
+
+def _detect_chunk(task):
+    """
+    Detect on every stride-th frame of one chunk of a video, in batches. Returns the chunk with
+    its frame numbers, the box count per frame and all boxes in one (N, 6) array.
+    """
+    video_indx, video_path, start_frame, end_frame, stride = task
+    frame_width, frame_height, detect_sensitivity, batch_size = _settings
+    captured = cv2.VideoCapture(video_path)
+    if start_frame > 0:
+        captured.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+
+    frame_numbers, counts, boxes = [], [], []
+    batch, batch_numbers = [], []
+
+    def flush():
+        for boxes_array in stls.get_prediction_boxes_batch(batch, _model, detect_sensitivity):
+            boxes_array = np.asarray(boxes_array, dtype=np.float32).reshape(-1, 6)
+            counts.append(len(boxes_array))
+            boxes.append(boxes_array)
+        frame_numbers.extend(batch_numbers)
+        batch.clear()
+        batch_numbers.clear()
+
+    for frame_number in range(start_frame, end_frame):
+        if not captured.grab():
+            break
+        if frame_number % stride != 0:
+            continue  # Skipped frames are never converted
+        success, frame = captured.retrieve()
+        if not success:
+            break
+        batch.append(stls.fit_frame(frame, frame_width, frame_height))
+        batch_numbers.append(frame_number)
+        if len(batch) == batch_size:
+            flush()
+    if batch:
+        flush()
+    captured.release()
+
+    return (video_indx, start_frame,
+            np.array(frame_numbers, dtype=np.int64),
+            np.array(counts, dtype=np.int32),
+            np.concatenate(boxes) if boxes else np.zeros((0, 6), dtype=np.float32))
+
+
+def split_chunks(video_indx, video_path, chunk_seconds):
+    """(video, path, start, end) frame ranges of about chunk_seconds each, plus the video's fps."""
+    captured = cv2.VideoCapture(video_path)
+    fps = captured.get(cv2.CAP_PROP_FPS) or 30.0
+    total = int(captured.get(cv2.CAP_PROP_FRAME_COUNT))
+    captured.release()
+    chunk_frames = max(int(chunk_seconds * fps), 1)
+    return [(video_indx, video_path, start, min(start + chunk_frames, total)) for start in range(0, total, chunk_frames)], fps
+
+
+def build_timeline(frame_numbers, counts, boxes, fps, zones, zone_index, class_list, time_interval, video_indx=0):
+    """
+    Run the detections of one video, in frame order, through zone assignment and the queuing
+    logic, and return the timeline columns. The zone state runs once over the merged results,
+    so chunk boundaries do not reset countdowns. vehicle is the class the zone publishes (what
+    the controllers act on) and light is on while it holds one; dwell is how long the zone has
+    been occupied without a break.
+    """
+    number_of_zones = len(zones)
+    frames = len(frame_numbers)
+    rows = frames * number_of_zones
+    columns = {
+        "video": np.full(rows, video_indx, dtype=np.int16),
+        "frame": np.repeat(frame_numbers, number_of_zones),
+        "time": np.repeat(frame_numbers / fps, number_of_zones),
+        "zone": np.tile(np.arange(number_of_zones, dtype=np.int16), frames),
+        "count": np.empty(rows, dtype=np.int16),
+        "occupied": np.empty(rows, dtype=bool),
+        "seen_class": np.empty(rows, dtype=np.int16),
+        "vehicle": np.empty(rows, dtype=np.int16),
+        "dwell": np.empty(rows, dtype=np.float32)
+    }
+
+    engine = zone_state.ZoneStateEngine(number_of_zones, time_interval, class_list, verbose=False)
+    occupied_since = np.full(number_of_zones, np.nan)
+    offsets = np.zeros(frames + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    for indx in range(frames):
+        current_time = frame_numbers[indx] / fps
+        frame_boxes = boxes[offsets[indx]:offsets[indx + 1]]
+        # The queuing logic reads a countdown start of 0.0 as "no countdown", so its clock must not start at 0
+        engine.update(frame_boxes, stls.assign_boxes_to_zones(frame_boxes, zones, zone_index), ENGINE_CLOCK_OFFSET + current_time)
+
+        occupied_since[~engine.occupied] = np.nan
+        started = engine.occupied & np.isnan(occupied_since)
+        occupied_since[started] = current_time
+
+        row = slice(indx * number_of_zones, (indx + 1) * number_of_zones)
+        columns["count"][row] = engine.counts
+        columns["occupied"][row] = engine.occupied
+        columns["seen_class"][row] = engine.first_class
+        columns["vehicle"][row] = engine.vehicle
+        columns["dwell"][row] = np.where(engine.occupied, current_time - occupied_since, 0.0)
+
+    columns["light"] = columns["vehicle"] != zone_state.NO_VEHICLE
+    return columns
+
+
+def summarize(columns, number_of_zones, stride, fps):
+    """Per-zone totals of a timeline, for the console."""
+    frame_seconds = stride / fps
+    summary = {}
+    for zone in range(number_of_zones):
+        selected = columns["zone"] == zone
+        light = columns["light"][selected]
+        summary[f"zone_{zone}"] = {
+            "occupied_seconds": round(float(columns["occupied"][selected].sum() * frame_seconds), 1),
+            "light_on_seconds": round(float(light.sum() * frame_seconds), 1),
+            "light_switches": int(np.count_nonzero(light[1:] != light[:-1])),
+            "max_dwell_seconds": round(float(columns["dwell"][selected].max(initial=0.0)), 1)
+        }
+    return summary
+
+
+def write_timeline(output_path, columns, class_list, videos):
+    """Write the timeline as Parquet (with vehicle names, needs pyarrow) or as a compressed NPZ with the lookup tables."""
+    if output_path.lower().endswith(".parquet"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("Writing Parquet needs pyarrow (pip install pyarrow); use a .npz output instead.")
+        names = np.array(list(class_list) + ["none"], dtype=object)
+        table = pa.table({
+            **columns,
+            "video_path": np.array(videos, dtype=object)[columns["video"]],
+            "seen_name": names[columns["seen_class"]],
+            "vehicle_name": names[columns["vehicle"]]
+        })
+        pq.write_table(table, output_path)
+    else:
+        np.savez_compressed(output_path, **columns, class_names=np.array(class_list), videos=np.array(videos))
+    print(f"Timeline written to: {output_path}")
+
+
+def list_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            videos.extend(sorted(file for file in glob.glob(os.path.join(path, "*")) if file.lower().endswith(VIDEO_EXTENSIONS)))
+        else:
+            stls.check_exist_file(path)
+            videos.append(path)
+    return videos
+
+
+def main(video_paths, output_path, weight_file_path, class_list_file_path, zones_file_path, detect_sensitivity, time_interval,
+         frame_width, frame_height, detector_backend="ultralytics", detector_imgsz=640, processes=0, chunk_seconds=60.0,
+         analysis_fps=0.0, batch_size=8):
+    """
+    Offline batch analytics: split the videos into chunks of chunk_seconds, detect on them in
+    parallel worker processes with batched predict calls and no rendering, then merge the
+    results into one per-zone timeline. analysis_fps > 0 only analyses that many frames per
+    second of footage; processes = 0 uses every core.
+    """
+    start = time.perf_counter()
+    videos = list_videos(video_paths)
+    if not videos:
+        raise FileNotFoundError(f"No videos found in {video_paths}.")
+    class_list = stls.load_class_names(class_list_file_path)
+    data = stls.extract_data_from_file(zones_file_path)
+    zones = stls.convert_coordinates(data["zones"], data["frame_width"], data["frame_height"], frame_width, frame_height)
+    zone_index = stls.build_zone_index(zones, frame_width, frame_height)
+
+    tasks, video_fps, strides = [], [], []
+    for video_indx, video_path in enumerate(videos):
+        chunks, fps = split_chunks(video_indx, video_path, chunk_seconds)
+        # Each video gets its own stride, so footage recorded at other frame rates is sampled at the same analysis_fps
+        stride = max(int(round(fps / analysis_fps)), 1) if analysis_fps > 0 else 1
+        tasks.extend(chunk + (stride,) for chunk in chunks)
+        video_fps.append(fps)
+        strides.append(stride)
+
+    processes = processes or os.cpu_count() or 1
+    workers.export_once(weight_file_path, detector_backend, detector_imgsz)
+    model_args = (weight_file_path, detector_backend, detector_imgsz, 0, frame_width, frame_height, 1)
+    settings = (frame_width, frame_height, detect_sensitivity, batch_size)
+    print(f"Batch analytics: {len(videos)} video(s), {len(tasks)} chunks, {processes} processes, every {'/'.join(str(stride) for stride in sorted(set(strides)))} frame(s)")
+
+    # Chunks come back in submission order, so each video's results can be merged as they finish
+    results = [[] for _ in videos]
+    context = mp.get_context("spawn")
+    with context.Pool(processes, initializer=_init_worker, initargs=(model_args, settings)) as pool:
+        for done, result in enumerate(pool.imap(_detect_chunk, tasks), 1):
+            results[result[0]].append(result)
+            print(f"\rChunks: {done}/{len(tasks)}", end="", flush=True)
+    print()
+
+    timelines = []
+    analysed = 0
+    for video_indx, chunks in enumerate(results):
+        if not chunks:
+            print(f"{videos[video_indx]}: no frames, skipped")
+            continue
+        frame_numbers = np.concatenate([chunk[2] for chunk in chunks])
+        counts = np.concatenate([chunk[3] for chunk in chunks])
+        boxes = np.concatenate([chunk[4] for chunk in chunks])
+        analysed += len(frame_numbers)
+        timeline = build_timeline(frame_numbers, counts, boxes, video_fps[video_indx], zones, zone_index, class_list, time_interval, video_indx)
+        timelines.append(timeline)
+        print(f"{videos[video_indx]}:")
+        stls.print_data(summarize(timeline, len(zones), strides[video_indx], video_fps[video_indx]))
+
+    if not timelines:
+        raise SystemExit(f"No frames could be read from {len(videos)} video(s); no timeline written.")
+    columns = {name: np.concatenate([timeline[name] for timeline in timelines]) for name in TIMELINE_COLUMNS}
+    write_timeline(output_path, columns, class_list, videos)
+    elapsed = time.perf_counter() - start
+    print(f"Analysed {analysed} frames in {elapsed:.1f} s ({analysed / elapsed:.1f} frames/s)")
+    return columns
+
+
+if __name__ == "__main__":
+    # python -m stls_lib.batch /path/to/footage --output timeline.parquet --analysis-fps 5
+    parser = argparse.ArgumentParser(description="Analyse recorded footage offline into a per-zone timeline.")
+    parser.add_argument("videos", nargs="+", help="video files or directories of videos")
+    parser.add_argument("--output", default="timeline.npz", help=".npz or .parquet")
+    parser.add_argument("--root-data", default="src/utils/root_data.txt", help="configuration file to read the model, zones and sizes from")
+    parser.add_argument("--processes", type=int, default=0, help="worker processes (0 = one per core)")
+    parser.add_argument("--chunk-seconds", type=float, default=60.0)
+    parser.add_argument("--analysis-fps", type=float, default=0.0, help="frames analysed per second of footage (0 = every frame)")
+    parser.add_argument("--batch-size", type=int, default=8, help="frames per predict call")
+    args = parser.parse_args()
+
+    config = stls.extract_root_data(args.root_data)
+    main(args.videos, args.output, config["weight_file_path"], config["class_list_file_path"], config["zones_file_path"],
+         config["detect_sensitivity"], config["time_interval"], config["frame_width"], config["frame_height"],
+         str(config.get("detector_backend", "ultralytics")).lower(), config.get("detector_imgsz", 640),
+         args.processes, args.chunk_seconds, args.analysis_fps, args.batch_size)
@@ -0,0 +1,129 @@
+import collections
+import time
+import numpy as np
+from stls_lib import stls
+
+
+class ModelSwitch:
+    """
+    Detector stand-in that forwards to one of several model variants: the configured model,
+    then cheaper ones (smaller input size, lighter weights). Every variant is loaded up front,
+    so a switch on the detection thread only changes which model the next frame uses.
+    """
+    def __init__(self, model, imgsz=None):
+        self.names = ["full"]
+        self.models = [(model, imgsz)]
+        self.active = 0
+
+    def add_variant(self, name, model, imgsz=None):
+        """imgsz is only set for models that take the input size per call."""
+        self.names.append(name)
+        self.models.append((model, imgsz))
+
+    def select(self, index):
+        self.active = index
+
+    def detect(self, frames, confidence):
+        model, imgsz = self.models[self.active]
+        return stls.get_prediction_boxes_batch(frames, model, confidence, imgsz)
+
+
+def model_variants(yolo_model, weight_file_path, detector_backend, detector_imgsz, degraded_imgsz, light_weight_file_path="", frame_width=640, frame_height=640):
+    """
+    Wrap the loaded model in a ModelSwitch with a smaller input size variant and, when
+    light_weight_file_path is set, a lighter model at that size. The ultralytics backend takes the
+    size per predict call; exported backends have a fixed input, so they get their own export.
+    The variants are exported and loaded here, at startup, not when the controller first needs them.
+    """
+    per_call = detector_backend.lower() == "ultralytics"
+    switch = ModelSwitch(yolo_model)
+    if 0 < degraded_imgsz < detector_imgsz:
+        if per_call:
+            switch.add_variant(f"imgsz_{degraded_imgsz}", yolo_model, degraded_imgsz)
+        else:
+            switch.add_variant(f"imgsz_{degraded_imgsz}", stls.load_model(weight_file_path, detector_backend, degraded_imgsz, 1, frame_width, frame_height))
+    if light_weight_file_path:
+        light_imgsz = degraded_imgsz if 0 < degraded_imgsz < detector_imgsz else detector_imgsz
+        switch.add_variant("light_model", stls.load_model(light_weight_file_path, detector_backend, light_imgsz, 1, frame_width, frame_height),
+                           light_imgsz if per_call else None)
+    return switch
+
+
+class DegradationController:
+    """
+    Keeps the capture-to-decision latency within latency_slo_ms. It tracks the p95 of the last
+    window frames and, while that is over the SLO, steps down one level at a time through the
+    registered levels (each applies one more saving); when the p95 drops below headroom * SLO
+    it steps back up. After every change it waits hold_seconds and min_samples fresh frames
+    before judging again, so the effect of a level is measured before the next step.
+    """
+    def __init__(self, latency_slo_ms, window=60, min_samples=20, headroom=0.6, hold_seconds=5.0, registry=None):
+        self.latency_slo_ms = latency_slo_ms
+        self.headroom = headroom
+        self.hold_seconds = hold_seconds
+        self.registry = registry
+        self.samples = collections.deque(maxlen=window)
+        self.min_samples = min_samples
+        self.levels = []
+        self.level = 0
+        self.changed_at = 0.0
+        self.level_changes = 0
+        self.p95_ms = 0.0
+
+    def add_level(self, name, apply, revert):
+        self.levels.append((name, apply, revert))
+
+    def level_name(self, level=None):
+        level = self.level if level is None else level
+        return "normal" if level == 0 else self.levels[level - 1][0]
+
+    def observe(self, latency_ms, now=None):
+        """Feed the latency of one decision; steps the level when the window says so."""
+        now = time.time() if now is None else now
+        self.samples.append(latency_ms)
+        if len(self.samples) < self.min_samples or now - self.changed_at < self.hold_seconds:
+            return
+        self.p95_ms = float(np.percentile(self.samples, 95))
+        if self.p95_ms > self.latency_slo_ms and self.level < len(self.levels):
+            self.levels[self.level][1]()
+            self.change(self.level + 1, "down", now)
+        elif self.p95_ms < self.latency_slo_ms * self.headroom and self.level > 0:
+            self.levels[self.level - 1][2]()
+            self.change(self.level - 1, "up", now)
+
+    def change(self, level, direction, now):
+        print(f"[degradation] p95 {self.p95_ms:.0f} ms vs SLO {self.latency_slo_ms:.0f} ms: {self.level_name()} -> {self.level_name(level)}")
+        self.level = level
+        self.level_changes += 1
+        self.changed_at = now
+        self.samples.clear()
+        if self.registry is not None:
+            self.registry.inc("degradation_level_changes_total", direction=direction)
+
+    def stats(self):
+        return {
+            "level": self.level,
+            "level_name": self.level_name(),
+            "level_changes": self.level_changes,
+            "p95_ms": round(self.p95_ms, 1)
+        }
+
+
+def create_controller(latency_slo_ms, renderer, frame_scheduler, model_switch=None, skip_factor=0.5, registry=None):
+    """
+    The degradation controller for a single-source loop, or None when latency_slo_ms is 0.
+    Levels in order: stop rendering, each cheaper model variant, then process fewer frames.
+    """
+    if latency_slo_ms <= 0:
+        return None
+    controller = DegradationController(latency_slo_ms, registry=registry)
+    if not renderer.headless:
+        controller.add_level("render_off", lambda: renderer.suspend(True), lambda: renderer.suspend(False))
+    if model_switch is not None:
+        for indx in range(1, len(model_switch.names)):
+            controller.add_level(model_switch.names[indx], lambda indx=indx: model_switch.select(indx), lambda indx=indx: model_switch.select(indx - 1))
+    controller.add_level("frame_skip", lambda: setattr(frame_scheduler, "rate_scale", skip_factor), lambda: setattr(frame_scheduler, "rate_scale", 1.0))
+    if registry is not None:
+        registry.add_stats("degradation", controller)
+    print(f"Latency SLO: p95 <= {latency_slo_ms:.0f} ms, levels: {' -> '.join(controller.level_name(level) for level in range(len(controller.levels) + 1))}")
+    return controller
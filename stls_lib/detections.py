@@ -0,0 +1,56 @@
+import numpy as np
+
+# One record per detection: corners, score, integer class id, zone id (-1 outside every zone)
+# and track id (-1 when the tracker is off)
+DETECTION_DTYPE = np.dtype([
+    ("box", np.float32, (4,)),
+    ("score", np.float32),
+    ("class_id", np.int16),
+    ("zone_id", np.int16),
+    ("track_id", np.int32)
+])
+
+
+def fill(buffer, boxes, box_zones):
+    """Copy an (N, 6) or tracked (N, 7) boxes array and its zone ids into the first N records of buffer."""
+    detections = buffer[:len(boxes)]
+    detections["box"] = boxes[:, :4]
+    detections["score"] = boxes[:, 4]
+    detections["class_id"] = boxes[:, 5]
+    detections["zone_id"] = box_zones
+    detections["track_id"] = boxes[:, 6] if boxes.shape[1] > 6 else -1
+    return detections
+
+
+def from_boxes(boxes, box_zones):
+    """Detections in a new array, for code outside the frame loop."""
+    return fill(np.empty(len(boxes), dtype=DETECTION_DTYPE), boxes, box_zones)
+
+
+class DetectionRing:
+    """
+    Preallocated structured buffers for the detections of the frames in flight between the
+    stages. fill() copies a frame's boxes straight into the next buffer and returns a view of
+    it, so the frame loop keeps class and zone ids as integers and allocates no per-box Python
+    objects; a buffer only grows when a frame has more detections than any frame before.
+    Like the frame pool, slots must exceed the number of frames in flight.
+    """
+    def __init__(self, slots=8, capacity=64):
+        self.buffers = [np.empty(capacity, dtype=DETECTION_DTYPE) for _ in range(slots)]
+        self.next_slot = 0
+
+    def fill(self, boxes, box_zones):
+        slot = self.next_slot
+        self.next_slot = (slot + 1) % len(self.buffers)
+        if len(boxes) > len(self.buffers[slot]):
+            self.buffers[slot] = np.empty(max(len(boxes), 2 * len(self.buffers[slot])), dtype=DETECTION_DTYPE)
+        return fill(self.buffers[slot], boxes, box_zones)
+
+
+def zone_vehicle_names(detections, class_list, number_of_zones):
+    """Class names of the detections grouped by zone; only built at the display boundary."""
+    names = [[] for _ in range(number_of_zones)]
+    for class_id, zone_id in zip(detections["class_id"].tolist(), detections["zone_id"].tolist()):
+        if zone_id >= 0:
+            names[zone_id].append(class_list[class_id])
+    return names
@@ -0,0 +1,217 @@
+import cv2
+import hashlib
+import numpy as np
+import os
+import shutil
+import time
+
+def file_hash(file_path, length=16):
+    """
+    Short SHA-256 of a file, used to key exported model artifacts to the weights they came from.
+    The hash is remembered in a <file>.sha256 sidecar with the file's size and modification time,
+    so later starts do not read the whole weights file again.
+    """
+    stat = os.stat(file_path)
+    signature = f"{stat.st_size} {stat.st_mtime_ns}"
+    sidecar_path = f"{file_path}.sha256"
+    try:
+        with open(sidecar_path) as f:
+            cached_signature, digest = f.read().rsplit(" ", 1)
+        if cached_signature == signature:
+            return digest.strip()[:length]
+    except (OSError, ValueError):
+        pass
+
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    try:
+        with open(sidecar_path, 'w') as f:
+            f.write(f"{signature} {sha.hexdigest()}")
+    except OSError:
+        pass  # Read-only weights directory: hash again next time
+    return sha.hexdigest()[:length]
+
+
+def exported_model_path(weights_file_path, export_format, imgsz, variant=""):
+    """
+    Where the exported model for these weights lives, next to the weights file. variant tells
+    apart INT8 models of the same weights quantized with other settings (see quantize.quantized_model).
+    """
+    stem = os.path.splitext(weights_file_path)[0]
+    suffix = f"{file_hash(weights_file_path)}-{imgsz}"
+    if export_format == "fused":
+        return f"{stem}-{file_hash(weights_file_path)}-fused.pt"  # Does not depend on the input size
+    elif export_format == "onnx":
+        return f"{stem}-{suffix}.onnx"
+    elif export_format == "onnx_int8":
+        return f"{stem}-{suffix}-int8{f'-{variant}' if variant else ''}.onnx"
+    elif export_format == "openvino":
+        return f"{stem}-{suffix}_openvino_model"
+    raise ValueError(f"Invalid export format: {export_format}. Please use 'fused', 'onnx', 'onnx_int8' or 'openvino'.")
+
+
+def export_model(weights_file_path, export_format, imgsz=640):
+    """
+    Export the .pt weights once and reuse the cached file on later starts. The 'fused' format
+    is the PyTorch model with its Conv and BatchNorm layers already fused and the training state
+    dropped, which the ultralytics backend loads instead of fusing best.pt on every start.
+    """
+    cache_path = exported_model_path(weights_file_path, export_format, imgsz)
+    if os.path.exists(cache_path):
+        print(f"Using cached {export_format} model: {cache_path}")
+        return cache_path
+
+    from ultralytics import YOLO
+    if export_format == "fused":
+        import torch
+        print(f"Fusing {weights_file_path} (one-time)...")
+        model = YOLO(weights_file_path, "v11")
+        model.fuse()
+        # The checkpoint layout ultralytics loads: the model under "model", its training arguments under "train_args"
+        torch.save({"model": model.model, "train_args": (model.ckpt or {}).get("train_args", {})}, f"{cache_path}.tmp")
+        os.replace(f"{cache_path}.tmp", cache_path)  # A restart mid-save never leaves a broken cache
+        print(f"Fused model cached at: {cache_path}")
+        return cache_path
+
+    print(f"Exporting {weights_file_path} to {export_format} (one-time)...")
+    exported = YOLO(weights_file_path, "v11").export(format=export_format, imgsz=imgsz, dynamic=False, simplify=True)
+    shutil.move(str(exported), cache_path)
+    print(f"Exported {export_format} model cached at: {cache_path}")
+    return cache_path
+
+
+def letterbox(frame, imgsz, color=(114, 114, 114)):
+    """Resize keeping the aspect ratio and pad to imgsz x imgsz, the same way Ultralytics does."""
+    height, width = frame.shape[:2]
+    ratio = min(imgsz / height, imgsz / width)
+    new_width, new_height = int(round(width * ratio)), int(round(height * ratio))
+    pad_x, pad_y = (imgsz - new_width) / 2, (imgsz - new_height) / 2
+
+    if (width, height) != (new_width, new_height):
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    frame = cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=color)
+    return frame, ratio, (left, top)
+
+
+def preprocess(frames, imgsz):
+    """BGR frames to a normalized RGB NCHW float32 batch, plus what is needed to undo the letterbox."""
+    batch = np.empty((len(frames), 3, imgsz, imgsz), dtype=np.float32)
+    transforms = []
+    for indx, frame in enumerate(frames):
+        padded, ratio, pad = letterbox(frame, imgsz)
+        rgb = cv2.cvtColor(padded, cv2.COLOR_BGR2RGB)
+        np.multiply(rgb.transpose(2, 0, 1), 1 / 255.0, out=batch[indx], casting='unsafe')
+        transforms.append((ratio, pad, frame.shape[:2]))
+    return batch, transforms
+
+
+def postprocess(output, transforms, confidence, iou=0.7, max_det=300):
+    """
+    Decode raw YOLO11 output (batch, 4 + classes, anchors) into one (N, 6) array per frame
+    with x1, y1, x2, y2, confidence, class, the layout track_objects_in_zones consumes.
+    """
+    results = []
+    for prediction, (ratio, (pad_x, pad_y), (height, width)) in zip(output, transforms):
+        prediction = prediction.T  # (anchors, 4 + classes)
+        class_scores = prediction[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+        keep = scores > confidence
+        if not keep.any():
+            results.append(np.zeros((0, 6), dtype=np.float32))
+            continue
+
+        xywh, scores, class_ids = prediction[keep, :4], scores[keep], class_ids[keep]
+        top_left = xywh[:, :2] - xywh[:, 2:] / 2
+        nms_boxes = np.concatenate([top_left, xywh[:, 2:]], axis=1)
+        selected = cv2.dnn.NMSBoxesBatched(nms_boxes.tolist(), scores.tolist(), class_ids.tolist(), confidence, iou)
+        selected = np.array(selected, dtype=np.int64).reshape(-1)[:max_det]
+
+        boxes = np.empty((len(selected), 6), dtype=np.float32)
+        boxes[:, 0] = (top_left[selected, 0] - pad_x) / ratio
+        boxes[:, 1] = (top_left[selected, 1] - pad_y) / ratio
+        boxes[:, 2] = (top_left[selected, 0] + xywh[selected, 2] - pad_x) / ratio
+        boxes[:, 3] = (top_left[selected, 1] + xywh[selected, 3] - pad_y) / ratio
+        boxes[:, [0, 2]] = np.clip(boxes[:, [0, 2]], 0, width)
+        boxes[:, [1, 3]] = np.clip(boxes[:, [1, 3]], 0, height)
+        boxes[:, 4] = scores[selected]
+        boxes[:, 5] = class_ids[selected]
+        results.append(boxes[np.argsort(-boxes[:, 4])])
+    return results
+
+
+class OnnxDetector:
+    """YOLO11 exported to ONNX, run through onnxruntime on the CPU."""
+    def __init__(self, model_path, imgsz=640, threads=0):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = imgsz
+
+    def detect(self, frames, confidence):
+        results = []
+        # The export is static (batch 1), so batches run frame by frame
+        for frame in frames:
+            batch, transforms = preprocess([frame], self.imgsz)
+            output = self.session.run(None, {self.input_name: batch})[0]
+            results.extend(postprocess(output, transforms, confidence))
+        return results
+
+
+class OpenVinoDetector:
+    """YOLO11 exported to OpenVINO IR, compiled for the CPU."""
+    def __init__(self, model_dir, imgsz=640, threads=0):
+        import openvino as ov
+        core = ov.Core()
+        xml_files = [name for name in os.listdir(model_dir) if name.endswith(".xml")]
+        if not xml_files:
+            raise FileNotFoundError(f"No OpenVINO .xml model found in '{model_dir}'.")
+        model = core.read_model(os.path.join(model_dir, xml_files[0]))
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads > 0:
+            config["INFERENCE_NUM_THREADS"] = threads
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.imgsz = imgsz
+
+    def detect(self, frames, confidence):
+        results = []
+        for frame in frames:
+            batch, transforms = preprocess([frame], self.imgsz)
+            output = self.compiled([batch])[0]
+            results.extend(postprocess(output, transforms, confidence))
+        return results
+
+
+def warm_up(model, frame_width, frame_height, runs=3):
+    """Run a few dummy inferences so the first real frames are not slow."""
+    if runs <= 0:
+        return
+    dummy = np.zeros((frame_height, frame_width, 3), dtype=np.uint8)
+    start = time.perf_counter()
+    for _ in range(runs):
+        if hasattr(model, "detect"):
+            model.detect([dummy], 0.5)
+        else:
+            model.predict(source=[dummy], save=False, conf=0.5, verbose=False)
+    print(f"Model warm-up: {runs} runs in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+def load_detector(weights_file_path, backend="onnx", imgsz=640, threads=0):
+    """Export the .pt weights once for the selected CPU backend and load the cached file (threads=0 lets the runtime decide)."""
+    backend = backend.lower()
+    if backend == "onnx":
+        return OnnxDetector(export_model(weights_file_path, "onnx", imgsz), imgsz, threads)
+    elif backend == "onnx_int8":
+        from stls_lib import quantize
+        return OnnxDetector(quantize.quantized_model(weights_file_path, imgsz), imgsz, threads)
+    elif backend == "openvino":
+        return OpenVinoDetector(export_model(weights_file_path, "openvino", imgsz), imgsz, threads)
+    raise ValueError(f"Invalid detector_backend: {backend}. Please use 'ultralytics', 'onnx', 'onnx_int8' or 'openvino'.")
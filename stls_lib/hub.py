@@ -0,0 +1,484 @@
+import argparse
+import os
+import random
+import selectors
+import socket
+import threading
+import time
+import numpy as np
+from stls_lib import stls, rtdb, actuation, metrics
+
+
+class Node:
+    """What the hub knows about one edge node: its reported zone codes and its outputs."""
+    def __init__(self, node_id, firebase_path=None, controllers=(), links=()):
+        self.node_id = node_id
+        self.firebase_path = firebase_path or f"/zones/node{node_id}"
+        self.controllers = [(socket.gethostbyname(host), port) for host, port in controllers]
+        self.links = list(links)  # (zone, target node, target zone)
+        self.session = None
+        self.seq = 0
+        self.codes = []
+        self.last_seen = 0.0
+        self.online = False
+        self.output = []
+        self.output_seq = 0
+        self.message = None
+
+
+def extract_nodes(file_path):
+    """
+    Read the hub's node file: one block of "key: value" lines per edge node, each starting with
+    its node id and optionally followed by its firebase_path, the comma-separated controller
+    addresses it drives and its links to adjacent curves, e.g. "links: 1>13.0" (a vehicle in
+    zone 1 of this node also shows in zone 0 of node 13). Nodes missing from the file are still
+    accepted, with the default firebase_path /zones/node<id> and no controllers.
+    """
+    stls.check_exist_file(file_path)
+    blocks = []
+
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if ':' not in line or line.startswith('#'):
+                continue
+
+            key, value = line.split(":", 1)
+            key = key.strip()
+            value = value.strip()
+            if key == "node":
+                blocks.append({"node": int(value)})
+            elif blocks:
+                blocks[-1][key] = value
+            else:
+                raise ValueError(f"Found '{key}' before any node in '{file_path}'.")
+
+    nodes = []
+    for block in blocks:
+        controllers = [actuation.parse_address(address) for address in block.get("controllers", "").split(",") if address.strip()]
+        links = []
+        for link in block.get("links", "").split(","):
+            if link.strip():
+                zone, _, target = link.partition(">")
+                target_node, _, target_zone = target.strip().partition(".")
+                links.append((int(zone), int(target_node), int(target_zone or 0)))
+        nodes.append(Node(block["node"], block.get("firebase_path"), controllers, links))
+    return nodes
+
+
+class Hub:
+    """
+    Merges the zone states of many edge nodes and fans them out in batches.
+
+    Edge nodes send deltas (see actuation.HubBackend) over UDP or TCP on the same port; one
+    thread serves both with a selector, so hundreds of nodes cost no thread each. Every
+    interval seconds the nodes that changed get their output recomputed with the cross-curve
+    links, pushed to their controllers with the ESP32 state protocol (acks, retries with
+    backoff and a refresh every refresh_interval, all on the hub's UDP socket), and queued for
+    Firebase, which gets all queued paths as one multi-path update every firebase_interval.
+    A node that has not reported for node_timeout seconds is reported offline.
+    """
+    def __init__(self, class_list, port=actuation.HUB_PORT, host="0.0.0.0", nodes=(), interval=0.05, firebase=None, firebase_interval=1.0,
+                 node_timeout=5.0, ack_timeout=0.05, max_retries=8, max_delay=0.5, refresh_interval=1.0):
+        self.class_list = class_list
+        self.interval = interval
+        self.firebase = firebase
+        self.firebase_interval = firebase_interval
+        self.node_timeout = node_timeout
+        self.ack_timeout = ack_timeout
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self.refresh_interval = refresh_interval
+        self.session = int.from_bytes(os.urandom(2), "big")
+
+        self.nodes = {}
+        self.incoming = {}  # target node -> [(source node, source zone, target zone)]
+        for node in nodes:
+            self.add_node(node)
+        self.dirty = set()
+        self.pending = {}  # controller address -> [message, seq, attempts, next send time]
+        self.firebase_pending = {}
+        self.firebase_confirmed = None
+
+        self.udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.udp.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.udp.bind((host, port))
+        self.udp.setblocking(False)
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((host, self.udp.getsockname()[1]))
+        self.listener.listen(1024)
+        self.listener.setblocking(False)
+        self.address = self.udp.getsockname()
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.udp, selectors.EVENT_READ)
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.connections = {}
+        self.stopped = threading.Event()
+
+        self.messages = 0
+        self.invalid = 0
+        self.deltas = 0
+        self.resyncs = 0
+        self.controller_sends = 0
+        self.controller_retries = 0
+        self.controller_acks = 0
+        self.controller_drops = 0
+        self.firebase_updates = 0
+        self.tick_ms = 0.0
+
+    def add_node(self, node):
+        self.nodes[node.node_id] = node
+        for zone, target_node, target_zone in node.links:
+            self.incoming.setdefault(target_node, []).append((node.node_id, zone, target_zone))
+
+    def node(self, node_id):
+        if node_id not in self.nodes:
+            self.add_node(Node(node_id))
+        return self.nodes[node_id]
+
+    def apply(self, delta, now):
+        """Apply one delta; returns the ack to send back, or None for a stale duplicate."""
+        node = self.node(delta["node"])
+        node.last_seen = now
+        if not node.online:
+            node.online = True
+            print(f"[hub] node {node.node_id} online")
+        if delta["session"] != node.session:
+            node.session = delta["session"]
+            node.seq = 0
+        elif delta["seq"] == node.seq:
+            return actuation.encode_hub_ack(node.node_id, node.session, node.seq)  # A retry of the applied delta
+        elif not actuation.seq_newer(delta["seq"], node.seq):
+            return None
+
+        if delta["base_seq"] == 0:
+            codes = [actuation.NO_VEHICLE] * delta["zone_count"]
+        elif delta["base_seq"] == node.seq and len(node.codes) == delta["zone_count"]:
+            codes = list(node.codes)
+        else:
+            self.resyncs += 1
+            return actuation.encode_hub_ack(node.node_id, node.session, 0)
+        for zone, code in delta["changes"]:
+            if zone < len(codes):
+                codes[zone] = code
+        if codes != node.codes:
+            node.codes = codes
+            self.dirty.add(node.node_id)
+        node.seq = delta["seq"]
+        self.deltas += 1
+        return actuation.encode_hub_ack(node.node_id, node.session, node.seq)
+
+    def handle(self, message, now):
+        """Handle one message from an edge node or a controller; returns (reply to send back, controller ack), either may be None."""
+        self.messages += 1
+        decoded = actuation.decode_message(message)
+        if decoded is not None and decoded["type"] == actuation.DELTA:
+            return self.apply(decoded, now), None
+        if decoded is not None and decoded["type"] == actuation.ACK:
+            return None, decoded
+        self.invalid += 1
+        return None, None
+
+    def controller_ack(self, ack, address):
+        entry = self.pending.get(address)
+        if entry is not None and ack["session"] == self.session and ack["seq"] == entry[1]:
+            del self.pending[address]
+            self.controller_acks += 1
+
+    def output(self, node):
+        """The node's codes with the vehicles of linked zones on adjacent curves filled into its empty zones."""
+        output = list(node.codes)
+        for source_id, source_zone, zone in self.incoming.get(node.node_id, ()):
+            source = self.nodes.get(source_id)
+            if source is not None and source_zone < len(source.codes) and zone < len(output) and output[zone] == actuation.NO_VEHICLE:
+                output[zone] = source.codes[source_zone]
+        return output
+
+    def names(self, codes):
+        return ['none' if code == actuation.NO_VEHICLE or code > len(self.class_list) else self.class_list[code - 1] for code in codes]
+
+    def tick(self, now):
+        """Recompute the outputs of the changed nodes and send what is due."""
+        if self.dirty:
+            affected = set(self.dirty)
+            for node_id in self.dirty:
+                affected.update(target for _, target, _ in self.nodes[node_id].links)
+            self.dirty.clear()
+            for node_id in affected:
+                node = self.nodes.get(node_id)
+                if node is None:
+                    continue
+                output = self.output(node)
+                if output == node.output:
+                    continue
+                node.output = output
+                if node.controllers:
+                    node.output_seq = actuation.next_seq(node.output_seq)
+                    node.message = actuation.encode_state(self.session, node.output_seq, output)
+                    for address in node.controllers:
+                        self.pending[address] = [node.message, node.output_seq, 0, now]
+                if self.firebase is not None:
+                    self.firebase_pending[f"{node.firebase_path}/{rtdb.zones_key(len(output))}"] = rtdb.format_payload(self.names(output))
+
+        for address, entry in list(self.pending.items()):
+            message, _, attempts, due = entry
+            if now < due:
+                continue
+            if attempts > self.max_retries:
+                del self.pending[address]
+                self.controller_drops += 1
+                continue
+            self.send_controller(message, address)
+            if attempts:
+                self.controller_retries += 1
+            entry[2] = attempts + 1
+            entry[3] = now + min(self.ack_timeout * (2 ** attempts), self.max_delay)
+
+    def refresh(self, now):
+        """Resend every node's last output to its controllers once, so a restarted controller catches up, and mark silent nodes offline."""
+        for node in self.nodes.values():
+            if node.message is not None:
+                for address in node.controllers:
+                    if address not in self.pending:
+                        self.send_controller(node.message, address)
+            if node.online and now - node.last_seen > self.node_timeout:
+                node.online = False
+                print(f"[hub] node {node.node_id} offline (no report for {now - node.last_seen:.1f} s)")
+
+    def send_controller(self, message, address):
+        try:
+            self.udp.sendto(message, address)
+            self.controller_sends += 1
+        except OSError as e:
+            print(f"Error sending to the controller at {address[0]}:{address[1]}: {e}")
+
+    def flush_firebase(self):
+        """Publish every path changed since the last confirmed update; the Publisher keeps only the newest dict, so each one carries all of them."""
+        delivered = self.firebase.delivered
+        if delivered is not None and delivered is not self.firebase_confirmed:
+            self.firebase_confirmed = delivered
+            for path, payload in delivered.items():
+                if self.firebase_pending.get(path) == payload:
+                    del self.firebase_pending[path]
+        if self.firebase_pending:
+            self.firebase.publish(self.firebase_pending)
+            self.firebase_updates += 1
+
+    def receive_udp(self, now):
+        for _ in range(1024):  # Bounded, so a flood cannot starve the ticks
+            try:
+                message, address = self.udp.recvfrom(512)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                continue  # e.g. ICMP port unreachable from a controller that is down
+            reply, ack = self.handle(message, now)
+            if reply is not None:
+                self.udp.sendto(reply, address)
+            elif ack is not None:
+                self.controller_ack(ack, address)
+
+    def accept(self):
+        try:
+            connection, _ = self.listener.accept()
+        except (BlockingIOError, InterruptedError):
+            return
+        connection.setblocking(False)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.selector.register(connection, selectors.EVENT_READ)
+        self.connections[connection] = b""
+
+    def receive_tcp(self, connection, now):
+        try:
+            data = connection.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self.disconnect(connection)
+            return
+        buffer = self.connections[connection] + data
+        replies = []
+        while len(buffer) >= 4:
+            size = actuation.message_size(buffer)
+            if size == 0:
+                self.invalid += 1
+                self.disconnect(connection)
+                return
+            if size is None or len(buffer) < size:
+                break
+            reply, _ = self.handle(buffer[:size], now)
+            buffer = buffer[size:]
+            if reply is not None:
+                replies.append(reply)
+        self.connections[connection] = buffer
+        if replies:
+            try:
+                connection.sendall(b"".join(replies))
+            except OSError:
+                self.disconnect(connection)
+
+    def disconnect(self, connection):
+        self.selector.unregister(connection)
+        del self.connections[connection]
+        connection.close()
+
+    def serve(self, duration=0.0):
+        """Serve until stop() (or for duration seconds when set)."""
+        print(f"Hub listening on {self.address[0]}:{self.address[1]} (UDP and TCP), {len(self.nodes)} configured nodes")
+        started = time.time()
+        next_tick = next_refresh = next_firebase = time.perf_counter()
+        while not self.stopped.is_set() and not (duration and time.time() - started >= duration):
+            for key, _ in self.selector.select(max(next_tick - time.perf_counter(), 0.0)):
+                now = time.time()
+                if key.fileobj is self.udp:
+                    self.receive_udp(now)
+                elif key.fileobj is self.listener:
+                    self.accept()
+                else:
+                    self.receive_tcp(key.fileobj, now)
+
+            current = time.perf_counter()
+            if current < next_tick:
+                continue
+            now = time.time()
+            self.tick(now)
+            if current >= next_refresh:
+                self.refresh(now)
+                next_refresh = current + self.refresh_interval
+            if self.firebase is not None and current >= next_firebase:
+                self.flush_firebase()
+                next_firebase = current + self.firebase_interval
+            self.tick_ms = (time.perf_counter() - current) * 1000
+            next_tick = current + self.interval
+        if self.firebase is not None:
+            self.flush_firebase()
+
+    def stop(self):
+        self.stopped.set()
+
+    def close(self):
+        for connection in list(self.connections):
+            self.disconnect(connection)
+        self.selector.close()
+        self.udp.close()
+        self.listener.close()
+
+    def stats(self):
+        return {
+            "nodes": len(self.nodes),
+            "nodes_online": sum(node.online for node in self.nodes.values()),
+            "tcp_connections": len(self.connections),
+            "messages": self.messages,
+            "invalid_messages": self.invalid,
+            "deltas_applied": self.deltas,
+            "resyncs": self.resyncs,
+            "controller_sends": self.controller_sends,
+            "controller_retries": self.controller_retries,
+            "controller_acks": self.controller_acks,
+            "controller_drops": self.controller_drops,
+            "controller_pending": len(self.pending),
+            "firebase_updates": self.firebase_updates,
+            "last_tick_ms": round(self.tick_ms, 3)
+        }
+
+
+def main(class_list_file_path, communication_protocol="on", port=actuation.HUB_PORT, nodes_file_path="", interval=0.05, firebase_interval=1.0,
+         node_timeout=5.0, firebase_backend="firebase", metrics_mode="off", metrics_port=9108, metrics_log_interval=10.0, duration=0.0):
+    """
+    Hub mode: serve edge nodes until interrupted. communication_protocol 'on' writes the merged
+    states to Firebase in batched multi-path updates, 'off' only drives the controllers.
+    """
+    class_list = stls.load_class_names(class_list_file_path)
+    nodes = extract_nodes(nodes_file_path) if nodes_file_path else []
+    protocol = communication_protocol.lower()
+    if protocol not in ("on", "off"):
+        raise ValueError(f"Invalid communication_protocol for the hub: {communication_protocol}. Please use 'on' or 'off'.")
+    rtdb.initialize_firebase(protocol if firebase_backend == "firebase" else "off")
+    firebase = rtdb.Publisher(rtdb.MultiPathBackend(firebase_backend), formatter=dict) if protocol == "on" else None
+
+    hub = Hub(class_list, int(port), nodes=nodes, interval=interval, firebase=firebase, firebase_interval=firebase_interval, node_timeout=node_timeout)
+    registry, metrics_server = metrics.start_metrics(metrics_mode, metrics_port, metrics_log_interval)
+    if registry is not None:
+        registry.add_stats("hub", hub)
+    try:
+        hub.serve(duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        hub.close()
+        if firebase is not None:
+            firebase.stop()
+            stls.print_data(firebase.stats())
+        if metrics_server is not None:
+            metrics_server.stop()
+        stls.print_data(hub.stats())
+    return hub
+
+
+def run_stand_ins(hub_address, count, number_of_zones, class_list, seconds=10.0, change_interval=2.0, transport="udp", first_node=1, seed=0):
+    """
+    Local stand-ins for count edge nodes, in one thread: each reports a random new zone state
+    about every change_interval seconds and an empty delta (a heartbeat) every second otherwise.
+    Returns the ack latencies and failures, to size a hub before the real nodes exist.
+    """
+    rng = random.Random(seed)
+    backends = [actuation.HubBackend(hub_address, first_node + indx, class_list, transport) for indx in range(count)]
+    codes = [[0] * number_of_zones for _ in backends]
+    next_change = [rng.uniform(0, change_interval) for _ in backends]
+    next_beat = [rng.uniform(0, 1.0) for _ in backends]
+    latencies, failures = [], 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        elapsed = time.perf_counter() - started
+        for indx, backend in enumerate(backends):
+            if elapsed >= next_change[indx]:
+                codes[indx] = [rng.choice((0, 0, rng.randint(1, len(class_list)))) for _ in range(number_of_zones)]
+                next_change[indx] = elapsed + rng.expovariate(1.0 / change_interval)
+            elif elapsed < next_beat[indx]:
+                continue
+            next_beat[indx] = elapsed + 1.0
+            start = time.perf_counter()
+            try:
+                backend.send(codes[indx])
+                latencies.append((time.perf_counter() - start) * 1000)
+            except (OSError, ConnectionError):
+                failures += 1
+        time.sleep(0.005)
+    for backend in backends:
+        backend.close()
+    values = np.asarray(latencies or [0.0])
+    return {
+        "nodes": count,
+        "messages": len(latencies),
+        "messages_per_second": round(len(latencies) / seconds, 1),
+        "failures": failures,
+        "ack_p50_ms": round(float(np.percentile(values, 50)), 3),
+        "ack_p95_ms": round(float(np.percentile(values, 95)), 3),
+        "ack_max_ms": round(float(values.max()), 3)
+    }
+
+
+if __name__ == "__main__":
+    # python -m stls_lib.hub                                       # serve, settings from root_data.txt
+    # python -m stls_lib.hub --stand-ins 300 --hub 127.0.0.1:4300  # drive a running hub with 300 local stand-in nodes
+    parser = argparse.ArgumentParser(description="Aggregation hub for many edge nodes, or local stand-in nodes to test one.")
+    parser.add_argument("--root-data", default="src/utils/root_data.txt")
+    parser.add_argument("--stand-ins", type=int, default=0, help="run this many stand-in edge nodes instead of a hub")
+    parser.add_argument("--hub", default=f"127.0.0.1:{actuation.HUB_PORT}", help="hub address for the stand-ins")
+    parser.add_argument("--transport", default="udp", help="udp or tcp, for the stand-ins")
+    parser.add_argument("--zones", type=int, default=2, help="zones per stand-in node")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--change-interval", type=float, default=2.0, help="mean seconds between state changes of a stand-in node")
+    args = parser.parse_args()
+
+    config = stls.extract_root_data(args.root_data)
+    if args.stand_ins > 0:
+        stls.print_data(run_stand_ins(actuation.parse_address(args.hub, actuation.HUB_PORT), args.stand_ins, args.zones, stls.load_class_names(config["class_list_file_path"]),
+                                      args.seconds, args.change_interval, args.transport))
+    else:
+        main(config["class_list_file_path"], str(config.get("communication_protocol", "on")), config.get("hub_port", actuation.HUB_PORT),
+             str(config.get("hub_nodes_file_path", "")), config.get("hub_interval", 0.05), config.get("hub_firebase_interval", 1.0),
+             config.get("hub_node_timeout", 5.0), str(config.get("firebase_backend", "firebase")).lower())
@@ -0,0 +1,268 @@
+import bisect
+import collections
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Latency bucket upper bounds in milliseconds (the last bucket is +Inf)
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 75, 100, 150, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    """
+    Fixed-bucket latency histogram. observe() is a bisect and three additions, so it can sit
+    in the hot loop; each histogram is written by one stage thread only, so it takes no lock.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = list(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (inf when it falls in the last one)."""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds + [float("inf")], self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+
+class Registry:
+    """
+    Metrics for one process: counters and histograms updated by the loops, plus collectors
+    (callables) that read gauges and existing stats() dicts only when the metrics are scraped
+    or logged, so components that already keep counts cost nothing extra.
+    """
+    def __init__(self, prefix="stls"):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.collectors = []
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS, **labels):
+        """Get or create a histogram; hold on to it and call observe() directly."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram(buckets)
+            return self.histograms[key]
+
+    def add_collector(self, collector):
+        """collector() yields (kind, name, labels, value) with kind 'counter' or 'gauge'."""
+        self.collectors.append(collector)
+
+    def add_stats(self, name, source, **labels):
+        """Expose every numeric value of source.stats() as a gauge named <name>_<key>."""
+        def collect():
+            for key, value in source.stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    yield "gauge", f"{name}_{key}", labels, value
+        self.add_collector(collect)
+
+    def samples(self):
+        with self.lock:
+            counters = [("counter", name, dict(labels), value) for (name, labels), value in self.counters.items()]
+        for collector in self.collectors:
+            try:
+                counters.extend(collector())
+            except Exception as e:
+                print(f"Error collecting metrics: {e}")
+        return counters
+
+    def prometheus_text(self):
+        lines = []
+        typed = set()
+
+        def metric(name, kind):
+            full = f"{self.prefix}_{name}"
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} {kind}")
+            return full
+
+        for kind, name, labels, value in sorted(self.samples(), key=lambda sample: sample[1]):
+            lines.append(f"{metric(name, kind)}{format_labels(labels)} {float(value)}")
+
+        with self.lock:
+            histograms = list(self.histograms.items())
+        for (name, labels), histogram in sorted(histograms, key=lambda entry: entry[0]):
+            full = metric(name, "histogram")
+            labels = dict(labels)
+            cumulative = 0
+            for bound, count in zip(histogram.bounds + ["+Inf"], histogram.counts):
+                cumulative += count
+                lines.append(f"{full}_bucket{format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{full}_sum{format_labels(labels)} {histogram.sum}")
+            lines.append(f"{full}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Flat dict for the JSON log line; histograms are summarized as count, mean and p50/p95/p99 bucket bounds."""
+        snapshot = {"time": round(time.time(), 3)}
+        for _, name, labels, value in self.samples():
+            snapshot[name + format_labels(labels)] = value
+        with self.lock:
+            histograms = list(self.histograms.items())
+        for (name, labels), histogram in histograms:
+            snapshot[name + format_labels(dict(labels))] = {
+                "count": histogram.count,
+                "mean_ms": round(histogram.sum / histogram.count, 3) if histogram.count else 0.0,
+                "p50_ms": histogram.quantile(0.50),
+                "p95_ms": histogram.quantile(0.95),
+                "p99_ms": histogram.quantile(0.99)
+            }
+        return snapshot
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def rss_mb():
+    """Current resident set size; falls back to the peak where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StartupTimer:
+    """
+    Wall time of each startup phase, from process start until the loop runs. mark(phase) closes
+    the phase that has been running since the previous mark; report() is a dict for print_data.
+    """
+    def __init__(self, start=None):
+        self.start = self.last = time.perf_counter() if start is None else start
+        self.phases = {}
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.last) * 1000
+        self.last = now
+
+    def report(self):
+        report = {f"startup_{phase}_ms": round(elapsed, 1) for phase, elapsed in self.phases.items()}
+        report["startup_total_ms"] = round((self.last - self.start) * 1000, 1)
+        return report
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of every thread at a fixed interval and counts them in the folded
+    format ("thread;outer;inner count" per line) that flamegraph.pl and speedscope read.
+    It only runs while profile() is called, so it costs nothing otherwise.
+    """
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def profile(self, seconds):
+        """Sample for the given number of seconds and return the folded stacks."""
+        with self.lock:
+            own = threading.get_ident()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = collections.Counter()
+            deadline = time.perf_counter() + seconds
+            while time.perf_counter() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    frames = [f"{entry.name} ({os.path.basename(entry.filename)}:{entry.lineno})" for entry in traceback.extract_stack(frame)]
+                    stacks[";".join([names.get(thread_id, str(thread_id))] + frames)] += 1
+                time.sleep(self.interval)
+            return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+
+class MetricsServer:
+    """
+    Local HTTP endpoint: /metrics (Prometheus text), /metrics.json (the JSON snapshot) and
+    /profile?seconds=N (folded stacks of the running loops, ready for a flame graph).
+    With log_interval, the JSON snapshot is also printed as one line every log_interval seconds.
+    """
+    def __init__(self, registry, port=9108, host="127.0.0.1", log_interval=10.0):
+        self.registry = registry
+        self.profiler = SamplingProfiler()
+        self.log_interval = log_interval
+        self.stopped = threading.Event()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/metrics":
+                    self.reply(server.registry.prometheus_text(), "text/plain; version=0.0.4")
+                elif url.path == "/metrics.json":
+                    self.reply(json.dumps(server.registry.snapshot()), "application/json")
+                elif url.path == "/profile":
+                    seconds = min(float(parse_qs(url.query).get("seconds", ["5"])[0]), 60.0)
+                    self.reply(server.profiler.profile(seconds), "text/plain")
+                else:
+                    self.send_error(404)
+
+            def reply(self, body, content_type):
+                body = body.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep scrapes out of the console
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.threads = [threading.Thread(target=self.httpd.serve_forever, name="stls-metrics", daemon=True)]
+        if log_interval and log_interval > 0:
+            self.threads.append(threading.Thread(target=self._log, name="stls-metrics-log", daemon=True))
+        for thread in self.threads:
+            thread.start()
+        print(f"Metrics on http://{host}:{self.httpd.server_address[1]}/metrics")
+
+    def _log(self):
+        while not self.stopped.wait(self.log_interval):
+            print(f"[metrics] {json.dumps(self.registry.snapshot())}")
+
+    def stop(self):
+        self.stopped.set()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics(status: str, port=9108, log_interval=10.0):
+    """
+    Creates the registry and starts its endpoint if the status is "on"; returns
+    (registry, server), or (None, None) so callers can skip all instrumentation.
+    """
+    if status.lower() != "on":
+        return None, None
+    registry = Registry()
+    registry.add_collector(lambda: [("gauge", "rss_mb", {}, rss_mb())])
+    return registry, MetricsServer(registry, int(port), log_interval=log_interval)
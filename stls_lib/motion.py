@@ -0,0 +1,65 @@
+import cv2
+import numpy as np
+
+class MotionGate:
+    """
+    Cheap pre-detector that decides whether the full detector needs to run.
+
+    Keeps a running-average background of a downscaled grey frame and measures motion energy
+    (the fraction of changed pixels) inside the zone polygons only. The detector runs when the
+    energy crosses threshold, while any zone holds vehicles, and at least every force_interval
+    seconds as a safety net.
+    """
+    def __init__(self, zones, frame_width, frame_height, threshold=0.01, force_interval=5.0, downscale=4, learning_rate=0.05, pixel_threshold=25):
+        self.threshold = threshold
+        self.force_interval = force_interval
+        self.learning_rate = learning_rate
+        self.pixel_threshold = pixel_threshold
+        self.size = (max(frame_width // downscale, 1), max(frame_height // downscale, 1))
+
+        self.mask = np.zeros((self.size[1], self.size[0]), dtype=np.uint8)
+        for zone in zones.values():
+            points = (np.array(zone, dtype=np.float32) / downscale).astype(np.int32)
+            cv2.fillPoly(self.mask, [points], 255)
+        self.mask_pixels = max(int(np.count_nonzero(self.mask)), 1)
+
+        self.background = None
+        self.small = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8)
+        self.gray = np.empty((self.size[1], self.size[0]), dtype=np.uint8)
+        self.diff = np.empty_like(self.gray)
+        self.last_detection = 0.0
+        self.energy = 0.0
+        self.frames_seen = 0
+        self.frames_detected = 0
+
+    def motion_energy(self, frame):
+        cv2.resize(frame, self.size, dst=self.small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self.small, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        if self.background is None:
+            self.background = self.gray.astype(np.float32)
+            return 1.0
+
+        cv2.absdiff(self.gray, cv2.convertScaleAbs(self.background), dst=self.diff)
+        cv2.threshold(self.diff, self.pixel_threshold, 255, cv2.THRESH_BINARY, dst=self.diff)
+        cv2.bitwise_and(self.diff, self.mask, dst=self.diff)
+        energy = cv2.countNonZero(self.diff) / self.mask_pixels
+        cv2.accumulateWeighted(self.gray, self.background, self.learning_rate)
+        return energy
+
+    def should_detect(self, frame, zones_occupied, now):
+        """Call once per processed frame with the frame as captured; True when the full detector should run."""
+        self.frames_seen += 1
+        self.energy = self.motion_energy(frame)
+        detect = self.energy >= self.threshold or zones_occupied or now - self.last_detection >= self.force_interval
+        if detect:
+            self.last_detection = now
+            self.frames_detected += 1
+        return detect
+
+    def stats(self):
+        return {
+            "frames_seen": self.frames_seen,
+            "frames_detected": self.frames_detected,
+            "frames_gated": self.frames_seen - self.frames_detected,
+            "last_motion_energy": self.energy
+        }
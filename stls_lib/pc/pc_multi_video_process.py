@@ -0,0 +1,159 @@
+import cv2
+import time
+from stls_lib import stls, rtdb, actuation, pipeline, scheduler, render, metrics, video_input, detections
+
+def load_source(indx, source, class_list, frame_name, frame_width, frame_height, time_interval, wait_key, ord_key,
+                communication_protocol, firebase_backend, target_fps, latency_budget_ms, boost_seconds, render_every, firebase_mirror="off", default_port=actuation.DEFAULT_PORT, registry=None,
+                decode_scale="off", resize_interpolation="linear", pool_size=8, hw_decode="off"):
+    """Open one curve: its camera, zones, scheduler, publisher and output stage."""
+    video_source = source["video_source"]
+    zones_file_path = source["zones_file_path"]
+    captured = video_input.VideoInput(video_source, frame_width, frame_height, decode_scale, resize_interpolation, pool_size, hw_decode)
+
+    # Extract data from this source's zones file
+    data = stls.extract_data_from_file(zones_file_path)
+    zones = stls.convert_coordinates(data["zones"], data["frame_width"], data["frame_height"], frame_width, frame_height)
+    number_of_zones = data["number_of_zones"]
+    zone_index = stls.get_zone_index(zones_file_path, zones, frame_width, frame_height)
+
+    controllers = [actuation.parse_address(address, default_port) for address in source["controllers"]]
+    publisher = actuation.start_channel(communication_protocol, class_list, controllers, firebase_mirror, firebase_backend,
+                                        f"firebase_stand_in_{indx}.jsonl", source["firebase_path"], rtdb.zones_key(number_of_zones))
+    frame_scheduler = scheduler.create_scheduler(
+        source_fps = captured.get(cv2.CAP_PROP_FPS),
+        target_fps = target_fps,
+        latency_budget_ms = latency_budget_ms,
+        live = captured.live,
+        boost_seconds = boost_seconds
+    )
+    if registry is not None:
+        registry.add_stats("scheduler", frame_scheduler, source=indx)
+    window_name = frame_name if frame_name.lower() == "off" else f"{frame_name} [{indx}]"
+    renderer = render.Renderer(window_name, wait_key, ord_key, zones, class_list, render_every)
+
+    return {
+        "index": indx,
+        "captured": captured,
+        "zones": zones,
+        "zone_index": zone_index,
+        "number_of_zones": number_of_zones,
+        "scheduler": frame_scheduler,
+        "publisher": publisher,
+        "detections": detections.DetectionRing(pool_size),
+        "output": pipeline.build_output_stage(number_of_zones, time_interval, class_list, renderer, communication_protocol, publisher, frame_scheduler, registry, {"source": indx}),
+        "active": True
+    }
+
+
+def main(sources,
+         weight_file_path: str,
+         class_list_file_path: str,
+         detect_sensitivity: float,
+         time_interval: float,
+         frame_name: str,
+         frame_height: int,
+         frame_width: int,
+         wait_key: int,
+         ord_key: str,
+         communication_protocol: str,
+         pipeline_mode: str = "off",
+         queue_size: int = 2,
+         drop_policy: str = "oldest",
+         firebase_backend: str = "firebase",
+         target_fps: float = 0.0,
+         latency_budget_ms: float = 0.0,
+         boost_seconds: float = 2.0,
+         render_every: int = 1,
+         detector_backend: str = "ultralytics",
+         detector_imgsz: int = 640,
+         warmup_runs: int = 3,
+         firebase_mirror: str = "off",
+         esp32_port: int = actuation.DEFAULT_PORT,
+         metrics_mode: str = "off",
+         metrics_port: int = 9108,
+         metrics_log_interval: float = 10.0,
+         decode_scale: str = "off",
+         resize_interpolation: str = "linear",
+         hw_decode: str = "off",
+         startup_timer = None
+         ):
+    """
+    Serve several blind curves from one process and one model: every tick gathers the
+    due frame of each source into a single batched predict call and routes the boxes
+    back to that source's zones, queuing state and Firebase path.
+    """
+    startup_timer = startup_timer or metrics.StartupTimer()
+    yolo_model = stls.load_model(weight_file_path, detector_backend, detector_imgsz, warmup_runs, frame_width, frame_height)
+    class_list = stls.load_class_names(class_list_file_path)
+    startup_timer.mark("model")
+
+    # Initalizing the Firebase Real-time Database once; every source publishes to its own path
+    rtdb.initialize_firebase(actuation.firebase_status(communication_protocol, firebase_mirror) if firebase_backend == "firebase" else "off")
+    startup_timer.mark("firebase")
+
+    registry, metrics_server = metrics.start_metrics(metrics_mode, metrics_port, metrics_log_interval)
+    curves = [
+        load_source(indx, source, class_list, frame_name, frame_width, frame_height, time_interval, wait_key, ord_key,
+                    communication_protocol, firebase_backend, target_fps, latency_budget_ms, boost_seconds, render_every, firebase_mirror, esp32_port, registry,
+                    decode_scale, resize_interpolation, 2 * queue_size + 4, hw_decode)
+        for indx, source in enumerate(sources)
+    ]
+    startup_timer.mark("sources")
+
+    # Capture stage: one due frame from every source that is still running
+    def capture():
+        items = []
+        for curve in curves:
+            while curve["active"]:
+                start_time = time.time() * 1000
+                curr_time = time.time()
+                if not curve["captured"].grab():
+                    curve["active"] = False
+                    print(f"Source {curve['index']} ended.")
+                    break
+
+                if curve["scheduler"].should_process(curr_time):
+                    frame = curve["captured"].retrieve()
+                    if frame is None:
+                        curve["active"] = False
+                        break
+                    items.append({"curve": curve, "frame": frame, "start_time": start_time, "curr_time": curr_time})
+                    break
+        return items if items else None
+
+    # Inference stage: a single batched predict call for all gathered frames
+    def inference(items):
+        inference_start = time.perf_counter()
+        frames = [stls.fit_frame(item["frame"], frame_width, frame_height) for item in items]
+        boxes_list = stls.get_prediction_boxes_batch(frames, yolo_model, detect_sensitivity)
+
+        for item, frame, boxes in zip(items, frames, boxes_list):
+            curve = item["curve"]
+            box_zones = stls.assign_boxes_to_zones(boxes, curve["zones"], curve["zone_index"])
+            item["frame"] = frame
+            item["detections"] = curve["detections"].fill(boxes, box_zones)
+
+        elapsed = time.perf_counter() - inference_start
+        for item in items:
+            item["curve"]["scheduler"].record_processing(elapsed)
+        return items
+
+    # Output stage: each source keeps its own queuing state, publisher and window
+    def output(items):
+        success = True
+        for item in items:
+            success = item["curve"]["output"](item) and success
+        return success
+
+    startup_timer.mark("setup")
+    stls.print_data(startup_timer.report())
+    pipeline.run(capture, inference, output, pipeline_mode, queue_size, drop_policy, registry = registry)
+
+    for curve in curves:
+        if curve["publisher"] is not None:
+            curve["publisher"].stop()
+            stls.print_data(curve["publisher"].stats())
+        curve["captured"].release()
+    if metrics_server is not None:
+        metrics_server.stop()
+    cv2.destroyAllWindows()
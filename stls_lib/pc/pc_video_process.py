@@ -1,6 +1,6 @@
 import cv2
 import time
-from stls_lib import stls, rtdb
+from stls_lib import stls, rtdb, actuation, pipeline, scheduler, render, roi, tracker, motion, metrics, recording, workers, video_input, degradation
 
 def main(video_source, 
          weight_file_path: str, 
@@ -13,69 +13,151 @@ def main(video_source,
          frame_width: int, 
          wait_key: int, 
          ord_key: str,
-         communication_protocol: str
+         communication_protocol: str,
+         pipeline_mode: str = "off",
+         queue_size: int = 2,
+         drop_policy: str = "oldest",
+         firebase_backend: str = "firebase",
+         target_fps: float = 0.0,
+         latency_budget_ms: float = 0.0,
+         boost_seconds: float = 2.0,
+         render_every: int = 1,
+         detector_backend: str = "ultralytics",
+         detector_imgsz: int = 640,
+         warmup_runs: int = 3,
+         roi_mode: str = "off",
+         roi_padding: int = 32,
+         tracker_mode: str = "off",
+         keyframe_interval: int = 3,
+         track_max_uncertainty: float = 0.5,
+         motion_gate_mode: str = "off",
+         motion_threshold: float = 0.01,
+         motion_force_interval: float = 5.0,
+         controllers = (),
+         firebase_mirror: str = "off",
+         metrics_mode: str = "off",
+         metrics_port: int = 9108,
+         metrics_log_interval: float = 10.0,
+         record_file_path: str = "",
+         inference_workers: int = 0,
+         decode_scale: str = "off",
+         resize_interpolation: str = "linear",
+         hw_decode: str = "off",
+         latency_slo_ms: float = 0.0,
+         degraded_imgsz: int = 320,
+         light_weight_file_path: str = "",
+         hub = None,
+         startup_timer = None
          ):
     
+    # Startup phases are timed from process start when main.py passes its timer
+    startup_timer = startup_timer or metrics.StartupTimer()
+
+    # Inference workers detect every frame they get, so the tracker and motion gate would skip nothing
+    if inference_workers > 0 and (tracker_mode.lower() == "on" or motion_gate_mode.lower() == "on"):
+        raise ValueError("inference_workers cannot be combined with tracker or motion_gate; set inference_workers to 0 or turn them off.")
+
     # Load YOLO model and configurations
-    captured = stls.load_camera(video_source)
-    yolo_model = stls.load_model(weight_file_path)
+    captured = video_input.VideoInput(video_source, frame_width, frame_height, decode_scale, resize_interpolation, pool_size = 2 * queue_size + 4, hw_decode = hw_decode)
+    startup_timer.mark("video_input")
+    # With inference workers, every worker process loads its own model instead
+    yolo_model = stls.load_model(weight_file_path, detector_backend, detector_imgsz, warmup_runs, frame_width, frame_height) if inference_workers <= 0 else None
     class_list = stls.load_class_names(class_list_file_path)
+    startup_timer.mark("model")
 
     # Extract data from the zones.txt file
     data = stls.extract_data_from_file(zones_file_path)
     zones = stls.convert_coordinates(data["zones"], data["frame_width"], data["frame_height"], frame_width, frame_height) # Ensuring the zone coordinates to fit the new frame dimensions
     number_of_zones = data["number_of_zones"]
+    zone_index = stls.get_zone_index(zones_file_path, zones, frame_width, frame_height) # Zone label raster for vectorized box-to-zone lookup
+    rois = roi.compute_rois(zones, frame_width, frame_height, roi_mode, roi_padding) if roi_mode != "off" else None # Only the zone area goes to the detector
+    startup_timer.mark("zones")
+
+    # Optional pool of inference worker processes fed through a shared memory frame ring
+    pool = None
+    if inference_workers > 0:
+        pool = workers.start_pool(inference_workers, weight_file_path, detector_backend, detector_imgsz, warmup_runs, frame_width, frame_height, detect_sensitivity, rois)
+        startup_timer.mark("inference_workers")
+
+    # Initalizing the Firebase Real-time Database (if used) and the background publisher for the selected protocol
+    rtdb.initialize_firebase(actuation.firebase_status(communication_protocol, firebase_mirror) if firebase_backend == "firebase" else "off")
+    publisher = actuation.start_channel(communication_protocol, class_list, controllers, firebase_mirror, firebase_backend, key = rtdb.zones_key(number_of_zones), hub = hub)
+    startup_timer.mark("publisher")
+
+    # Adaptive frame skipping driven by the measured processing time
+    frame_scheduler = scheduler.create_scheduler(
+        source_fps = captured.get(cv2.CAP_PROP_FPS),
+        target_fps = target_fps,
+        latency_budget_ms = latency_budget_ms,
+        live = captured.live,
+        boost_seconds = boost_seconds
+    )
+
+    # Optional tracker so the detector only runs on keyframes
+    vehicle_tracker = tracker.Tracker(keyframe_interval, track_max_uncertainty) if tracker_mode.lower() == "on" else None
+
+    # Optional motion gate so the detector sleeps while the zones are empty and static
+    gate = motion.MotionGate(zones, frame_width, frame_height, motion_threshold, motion_force_interval) if motion_gate_mode.lower() == "on" else None
+
+    # Optional recording of the detections, for replaying them later without inference
+    recorder = recording.Recorder(record_file_path, frame_width, frame_height, detect_sensitivity) if record_file_path else None
+
+    # Optional metrics endpoint (/metrics, /profile) and periodic JSON log line
+    registry, metrics_server = metrics.start_metrics(metrics_mode, metrics_port, metrics_log_interval)
+    if registry is not None:
+        registry.add_stats("scheduler", frame_scheduler)
+        for name, component in (("tracker", vehicle_tracker), ("motion_gate", gate)):
+            if component is not None:
+                registry.add_stats(name, component)
+
+    # Capture stage: grab every frame, but only convert and resize the ones the scheduler picks
+    def capture():
+        while True:
+            start_time = time.time() * 1000
+            curr_time = time.time()
+
+            if not captured.grab():
+                return None
+
+            if frame_scheduler.should_process(curr_time):
+                frame = captured.retrieve(resize = rois is None) # ROI crops are cut from the decoded frame
+                if frame is None:
+                    return None
+                return {"frame": frame, "start_time": start_time, "curr_time": curr_time}
+
+    # Optional latency SLO: the controller can switch detection to cheaper model variants
+    model_switch = None
+    if latency_slo_ms > 0 and yolo_model is not None:
+        model_switch = yolo_model = degradation.model_variants(yolo_model, weight_file_path, detector_backend, detector_imgsz, degraded_imgsz, light_weight_file_path, frame_width, frame_height)
+        startup_timer.mark("model_variants")
+
+    inference = pipeline.build_inference_stage(yolo_model, class_list, zones, zone_index, number_of_zones, detect_sensitivity, frame_width, frame_height, frame_scheduler, rois, keep_frame = frame_name.lower() != "off", tracker = vehicle_tracker, motion_gate = gate, recorder = recorder, detection_slots = 2 * queue_size + 4)
+    renderer = render.Renderer(frame_name, wait_key, ord_key, zones, class_list, render_every)
+    controller = degradation.create_controller(latency_slo_ms, renderer, frame_scheduler, model_switch, registry = registry)
+    output = pipeline.build_output_stage(number_of_zones, time_interval, class_list, renderer, communication_protocol, publisher, frame_scheduler, registry, degradation = controller)
+    startup_timer.mark("setup")
+    stls.print_data(startup_timer.report())
+    try:
+        pipeline.run(capture, inference, output, pipeline_mode, queue_size, drop_policy, registry = registry, pool = pool)
+    finally:
+        if pool is not None:
+            pool.close()
 
-    # Initalizing the Firebase Real-time Database
-    rtdb.initialize_firebase(communication_protocol)
-
-    # Initialize zones and tracking data
-    count = 0
-    success = True
-    zones_data = [{"countdown_start_time": 0.0, "refresh": False, "get_vehicle": 'none'} for _ in range(number_of_zones)]
-    prev_vehic_zone0 = 'none'
-    prev_vehic_zone1 = 'none'
-
-    while success:
-        start_time = time.time() * 1000
-        curr_time = time.time()
-        success, frame = captured.read()
-        
-        if not success:
-            break
-
-        count += 1
-        if count % 3 != 0:
-            continue
-
-        collected_vehicle = stls.init_list_of_collected_vehicle(number_of_zones)
-        frame = cv2.resize(frame, (frame_width, frame_height))
-        boxes = stls.get_prediction_boxes(frame, yolo_model, detect_sensitivity)
-        stls.draw_polylines_zones(frame, zones, frame_name)  # Optional visualization
-        collected_vehicle = stls.track_objects_in_zones(frame, boxes, class_list, zones, collected_vehicle, frame_name)
-
-        queuing_data = []
-        for indx in range(number_of_zones):
-            queuing_data.append(stls.handle_zone_queuing(indx, collected_vehicle, curr_time, zones_data, time_interval))
-            stls.traffic_light_display(frame, indx, is_zone_occupied = len(collected_vehicle[indx]) > 0) # Optional visualization
-
-        curr_vehic_zone0 = queuing_data[0]["vehicle"]
-        curr_vehic_zone1 = queuing_data[1]["vehicle"]    
-        # Only send to Firebase if vehicle data has changed
-        if curr_vehic_zone0 != prev_vehic_zone0 or curr_vehic_zone1 != prev_vehic_zone1:
-            rtdb.send_data_in_firebase([curr_vehic_zone0, curr_vehic_zone1], communication_protocol)
-            prev_vehic_zone0 = curr_vehic_zone0
-            prev_vehic_zone1 = curr_vehic_zone1
-
-        data_to_display = {
-            "number_of_zones": number_of_zones,
-            "zones_list": collected_vehicle,
-            "frame_name": frame_name,
-            "queuing_data": queuing_data,
-            "processing_time": (time.time() * 1000) - start_time
-        }
-        stls.display_zone_info(frame, data_to_display)  # Optional visualization       
-        success = stls.show_frame(frame, frame_name, wait_key, ord_key)  # Optional frame display
+    if controller is not None:
+        stls.print_data(controller.stats())
+    if vehicle_tracker is not None:
+        stls.print_data(vehicle_tracker.stats())
+    if gate is not None:
+        stls.print_data(gate.stats())
+    if publisher is not None:
+        publisher.stop()
+        stls.print_data(publisher.stats())
+    if metrics_server is not None:
+        metrics_server.stop()
+    stls.print_data(captured.stats())
+    if recorder is not None:
+        recorder.close()
+        print(f"Recorded {recorder.frames} frames to '{record_file_path}'")
 
     captured.release()
-    cv2.destroyAllWindows()
\ No newline at end of file
+    cv2.destroyAllWindows()
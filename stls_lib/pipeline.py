@@ -0,0 +1,397 @@
+import numpy as np
+import queue
+import threading
+import time
+from stls_lib import stls, rtdb, roi, zone_state, detections, recording
+
+class StageQueue:
+    """
+    Bounded hand-off queue between two pipeline stages.
+    With the "oldest" drop policy a full queue discards its oldest item so latency stays bounded.
+    """
+    def __init__(self, maxsize: int, drop_policy: str):
+        if drop_policy not in ("oldest", "block"):
+            raise ValueError(f"Invalid drop_policy: {drop_policy}. Please use 'oldest' or 'block'.")
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.drop_policy = drop_policy
+        self.dropped = 0
+
+    def put(self, item, stop_event):
+        if self.drop_policy == "oldest":
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    return
+                except queue.Full:
+                    try:
+                        self.queue.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+
+        while not stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, stop_event):
+        while not stop_event.is_set():
+            try:
+                return self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def depth(self):
+        return self.queue.qsize()
+
+
+class StageStats:
+    """Per-stage item count and busy time, used to report throughput (and fill the stage's latency histogram)."""
+    def __init__(self, name: str, histogram=None):
+        self.name = name
+        self.histogram = histogram
+        self.count = 0
+        self.busy_time = 0.0
+        self.start_time = time.perf_counter()
+
+    def add(self, elapsed):
+        self.count += 1
+        self.busy_time += elapsed
+        if self.histogram is not None:
+            self.histogram.observe(elapsed * 1000)
+
+    def summary(self):
+        wall_time = max(time.perf_counter() - self.start_time, 1e-9)
+        return {
+            "stage": self.name,
+            "items": self.count,
+            "fps": self.count / wall_time,
+            "avg_ms": (self.busy_time / self.count * 1000) if self.count else 0.0
+        }
+
+
+def create_stage_stats(registry=None):
+    names = ["capture", "inference", "output"]
+    if registry is None:
+        return [StageStats(name) for name in names]
+    return [StageStats(name, registry.histogram("stage_latency_ms", stage=name)) for name in names]
+
+
+def print_stats(stats, queues):
+    parts = [f"{s['stage']}: {s['fps']:.1f} fps ({s['avg_ms']:.1f} ms)" for s in (stat.summary() for stat in stats)]
+    dropped = sum(q.dropped for q in queues)
+    depth = [q.depth() for q in queues]
+    print(f"[pipeline] {' | '.join(parts)} | queue depth: {depth} | dropped: {dropped}")
+
+
+def build_inference_stage(yolo_model, class_list, zones, zone_index, number_of_zones, detect_sensitivity, frame_width, frame_height, scheduler=None, rois=None, keep_frame=True, tracker=None, motion_gate=None, recorder=None, detection_slots=8):
+    """
+    Return the stage that resizes a captured frame, runs detection and assigns boxes to zones.
+    The result travels on as item["detections"], a view into a ring of detection_slots structured
+    buffers (more than the frames in flight) with integer class and zone ids.
+    With rois, only the zone regions are cropped from the captured frame and sent to the detector,
+    and the full-frame resize is skipped unless the frame is needed for rendering (keep_frame).
+    With a tracker, the detector only runs on keyframes and tracks are propagated in between.
+    With a motion_gate, the detector is skipped while the zones are empty and static.
+    With a recorder, the raw detector output of every processed frame (none for tracked or gated
+    frames) is appended to a recording for replay, before the tracker smooths it.
+    Nothing is drawn here; the measured time is fed to the scheduler so it can adapt the frame skipping.
+    """
+    def detect(item):
+        if "detected_boxes" in item:
+            # Detection already ran in an inference worker process, on the frame-sized shared memory slot
+            return item["frame"], item["detected_boxes"]
+        if rois:
+            boxes = roi.detect_in_rois(item["frame"], rois, yolo_model, detect_sensitivity, frame_width, frame_height)
+            frame = stls.fit_frame(item["frame"], frame_width, frame_height) if keep_frame else None
+        elif item.get("detect_frame") is not None:
+            # The camera already delivered a small frame at detector resolution; scale its boxes up to frame space
+            detect_frame = item["detect_frame"]
+            boxes = stls.get_prediction_boxes(detect_frame, yolo_model, detect_sensitivity)
+            boxes = stls.scale_boxes(boxes, frame_width / detect_frame.shape[1], frame_height / detect_frame.shape[0])
+            frame = stls.fit_frame(item["frame"], frame_width, frame_height) if keep_frame else None
+        else:
+            frame = stls.fit_frame(item["frame"], frame_width, frame_height)
+            boxes = stls.get_prediction_boxes(frame, yolo_model, detect_sensitivity)
+        return frame, boxes
+
+    ring = detections.DetectionRing(detection_slots)
+    zones_occupied = [False]
+    no_boxes = np.zeros((0, 7 if tracker is not None else 6), dtype=np.float32)
+
+    def inference(item):
+        inference_start = time.perf_counter()
+        status = recording.DETECTED
+        if motion_gate is not None and not motion_gate.should_detect(item["frame"], zones_occupied[0], item["curr_time"]):
+            frame = stls.fit_frame(item["frame"], frame_width, frame_height) if keep_frame else None
+            boxes = detected = no_boxes
+            status = recording.GATED
+        elif tracker is None:
+            frame, boxes = detect(item)
+            detected = boxes
+        elif tracker.needs_detection():
+            frame, detected = detect(item)
+            boxes = tracker.update(detected)
+        else:
+            frame = stls.fit_frame(item["frame"], frame_width, frame_height) if keep_frame else None
+            boxes = tracker.propagate()
+            detected = no_boxes
+            status = recording.PROPAGATED
+
+        if recorder is not None:
+            recorder.record(item["curr_time"], detected, status)
+        box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+        zones_occupied[0] = bool((box_zones >= 0).any())
+        item["frame"] = frame
+        item["detections"] = ring.fill(boxes, box_zones)
+        if scheduler is not None:
+            scheduler.record_processing(time.perf_counter() - inference_start + item.get("detect_time", 0.0))
+        return item
+    return inference
+
+
+def build_output_stage(number_of_zones, time_interval, class_list, renderer, communication_protocol, publisher=None, scheduler=None, registry=None, metric_labels=None, degradation=None):
+    """
+    Return the stage that updates the zone state engine, actuates the lights and hands the frame to the renderer.
+    Only zone changes are published; when a publisher is given they are only enqueued and never block on I/O.
+    With a degradation controller, the capture-to-decision latency of every frame is fed to it.
+    With a metrics registry, the capture-to-output latency, per-zone detections, state transitions
+    and publisher counters are reported into it.
+    """
+    engine = zone_state.ZoneStateEngine(number_of_zones, time_interval, class_list)
+    frame_latency = None
+    if registry is not None:
+        labels = metric_labels or {}
+        frame_latency = registry.histogram("frame_latency_ms", **labels)
+
+        def collect_zones():
+            for zone in range(number_of_zones):
+                yield "counter", "zone_detections_total", {**labels, "zone": zone}, int(engine.detections[zone])
+            yield "counter", "zone_transitions_total", labels, engine.transitions
+        registry.add_collector(collect_zones)
+        for channel in getattr(publisher, "publishers", [publisher] if publisher is not None else []):
+            registry.add_stats("publisher", channel, **labels, backend=channel.name)
+
+    def output(item):
+        frame = item["frame"]
+        frame_detections = item["detections"]
+        changed = engine.step(frame_detections["class_id"], frame_detections["zone_id"], item["curr_time"])
+
+        if scheduler is not None:
+            scheduler.notify_occupancy(engine.occupied, item["curr_time"])
+
+        # Only send to Firebase if vehicle data has changed
+        if len(changed):
+            if publisher is not None:
+                publisher.publish(engine.vehicle_names())
+            else:
+                rtdb.send_data_in_firebase(engine.vehicle_names(), communication_protocol)
+
+        if degradation is not None:
+            degradation.observe((time.time() * 1000) - item["start_time"], item["curr_time"])
+
+        rendered = renderer.should_render()
+        if rendered:
+            data_to_display = {
+                "number_of_zones": number_of_zones,
+                "zones_list": detections.zone_vehicle_names(frame_detections, class_list, number_of_zones),
+                "frame_name": renderer.frame_name,
+                "queuing_data": engine.queuing_data(item["curr_time"]),
+                "processing_time": (time.time() * 1000) - item["start_time"],
+                "achieved_fps": scheduler.achieved_fps if scheduler is not None else None
+            }
+            renderer.render(frame, frame_detections, engine.occupied, data_to_display)
+        success = renderer.show(frame, rendered)
+        if frame_latency is not None:
+            frame_latency.observe((time.time() * 1000) - item["start_time"])
+        return success
+    output.engine = engine
+    return output
+
+
+def run_sequential(capture, inference, output, report_interval=0.0, registry=None):
+    """Run the three stages one after another on the calling thread."""
+    stats = create_stage_stats(registry)
+    last_report = time.perf_counter()
+
+    while True:
+        t0 = time.perf_counter()
+        item = capture()
+        if item is None:
+            break
+        t1 = time.perf_counter()
+        item = inference(item)
+        t2 = time.perf_counter()
+        success = output(item)
+        t3 = time.perf_counter()
+
+        stats[0].add(t1 - t0)
+        stats[1].add(t2 - t1)
+        stats[2].add(t3 - t2)
+        if report_interval > 0 and t3 - last_report >= report_interval:
+            print_stats(stats, [])
+            last_report = t3
+        if not success:
+            break
+
+    return [stat.summary() for stat in stats]
+
+
+def run_pipelined(capture, inference, output, queue_size=2, drop_policy="oldest", report_interval=5.0, registry=None):
+    """
+    Run capture and inference on worker threads connected by bounded queues.
+    The output stage stays on the calling thread because cv2.imshow must run there.
+    """
+    stop_event = threading.Event()
+    capture_queue = StageQueue(queue_size, drop_policy)
+    output_queue = StageQueue(queue_size, drop_policy)
+    queues = [capture_queue, output_queue]
+    stats = create_stage_stats(registry)
+    if registry is not None:
+        def collect_queues():
+            for name, stage_queue in zip(["capture", "output"], queues):
+                yield "gauge", "queue_depth", {"queue": name}, stage_queue.depth()
+                yield "counter", "queue_dropped_total", {"queue": name}, stage_queue.dropped
+        registry.add_collector(collect_queues)
+    end_of_stream = object()
+
+    def capture_worker():
+        try:
+            while not stop_event.is_set():
+                t0 = time.perf_counter()
+                item = capture()
+                if item is None:
+                    break
+                stats[0].add(time.perf_counter() - t0)
+                capture_queue.put(item, stop_event)
+        finally:
+            # The end marker must never be dropped, so wait for room regardless of the policy
+            while not stop_event.is_set():
+                try:
+                    capture_queue.queue.put(end_of_stream, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    def inference_worker():
+        try:
+            while not stop_event.is_set():
+                item = capture_queue.get(stop_event)
+                if item is None or item is end_of_stream:
+                    break
+                t0 = time.perf_counter()
+                item = inference(item)
+                stats[1].add(time.perf_counter() - t0)
+                output_queue.put(item, stop_event)
+        finally:
+            while not stop_event.is_set():
+                try:
+                    output_queue.queue.put(end_of_stream, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+
+    workers = [
+        threading.Thread(target=capture_worker, name="stls-capture", daemon=True),
+        threading.Thread(target=inference_worker, name="stls-inference", daemon=True)
+    ]
+    for worker in workers:
+        worker.start()
+
+    last_report = time.perf_counter()
+    try:
+        while True:
+            item = output_queue.get(stop_event)
+            if item is None or item is end_of_stream:
+                break
+            t0 = time.perf_counter()
+            success = output(item)
+            t1 = time.perf_counter()
+            stats[2].add(t1 - t0)
+            if report_interval > 0 and t1 - last_report >= report_interval:
+                print_stats(stats, queues)
+                last_report = t1
+            if not success:
+                break
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join(timeout=2.0)
+
+    print_stats(stats, queues)
+    return [stat.summary() for stat in stats]
+
+
+def run_process_pool(capture, pool, inference, output, report_interval=5.0, registry=None):
+    """
+    Run detection in the worker processes of an InferencePool. A capture thread feeds frames into
+    the shared memory ring while the calling thread takes the results back in frame order and runs
+    the rest of the inference stage (tracking, zone assignment) and the output stage on them.
+    """
+    stop_event = threading.Event()
+    capture_done = threading.Event()
+    stats = create_stage_stats(registry)
+    if registry is not None:
+        registry.add_collector(lambda: [("gauge", "frames_in_flight", {}, pool.in_flight())])
+
+    def capture_worker():
+        try:
+            while not stop_event.is_set():
+                t0 = time.perf_counter()
+                item = capture()
+                if item is None:
+                    break
+                stats[0].add(time.perf_counter() - t0)
+                if not pool.submit(item, stop_event):
+                    break
+        finally:
+            capture_done.set()
+
+    worker = threading.Thread(target=capture_worker, name="stls-capture", daemon=True)
+    worker.start()
+
+    last_report = time.perf_counter()
+    try:
+        while not (capture_done.is_set() and pool.in_flight() == 0):
+            try:
+                item = pool.next_result()
+            except queue.Empty:
+                continue
+            t0 = time.perf_counter()
+            item = inference(item)
+            t1 = time.perf_counter()
+            success = output(item)
+            t2 = time.perf_counter()
+            pool.release(item)
+
+            stats[1].add(t1 - t0 + item.get("detect_time", 0.0))
+            stats[2].add(t2 - t1)
+            if report_interval > 0 and t2 - last_report >= report_interval:
+                print_stats(stats, [])
+                last_report = t2
+            if not success:
+                break
+    finally:
+        stop_event.set()
+        worker.join(timeout=2.0)
+
+    print_stats(stats, [])
+    return [stat.summary() for stat in stats]
+
+
+def run(capture, inference, output, pipeline_mode="off", queue_size=2, drop_policy="oldest", report_interval=5.0, registry=None, pool=None):
+    """
+    Run the detection loop either sequentially or as a threaded pipeline, depending on pipeline_mode,
+    or with detection in the worker processes of pool when one is given.
+    """
+    if pool is not None:
+        return run_process_pool(capture, pool, inference, output, report_interval, registry)
+    if pipeline_mode.lower() == "on":
+        return run_pipelined(capture, inference, output, queue_size, drop_policy, report_interval, registry)
+    elif pipeline_mode.lower() == "off":
+        return run_sequential(capture, inference, output, registry=registry)
+    else:
+        raise ValueError(f"Invalid pipeline_mode: {pipeline_mode}. Please use 'on' or 'off'.")
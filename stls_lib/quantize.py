@@ -0,0 +1,283 @@
+import argparse
+import glob
+import json
+import os
+import tempfile
+import time
+import cv2
+import numpy as np
+from stls_lib import detectors, metrics, tracker
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov", ".m4v")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def sample_video_frames(videos_dir, count=200):
+    """Frames spread evenly over every video in videos_dir, for calibration and latency runs."""
+    videos = sorted(path for path in glob.glob(os.path.join(videos_dir, "*")) if path.lower().endswith(VIDEO_EXTENSIONS))
+    frames = []
+    for indx, video_path in enumerate(videos):
+        # Share the frame budget between the videos
+        wanted = count // len(videos) + (1 if indx < count % len(videos) else 0)
+        captured = cv2.VideoCapture(video_path)
+        total = int(captured.get(cv2.CAP_PROP_FRAME_COUNT))
+        step = max(total // max(wanted, 1), 1)
+        position = 0
+        while len(frames) < count and wanted > 0:
+            success = captured.grab()
+            if not success:
+                break
+            if position % step == 0:
+                success, frame = captured.retrieve()
+                if success:
+                    frames.append(frame)
+                    wanted -= 1
+            position += 1
+        captured.release()
+    return frames
+
+
+class FrameCalibrationReader:
+    """Feeds letterboxed calibration frames to onnxruntime's static quantizer, one at a time."""
+    def __init__(self, frames, imgsz, input_name):
+        self.frames = iter(frames)
+        self.imgsz = imgsz
+        self.input_name = input_name
+
+    def get_next(self):
+        frame = next(self.frames, None)
+        if frame is None:
+            return None
+        return {self.input_name: detectors.preprocess([frame], self.imgsz)[0]}
+
+
+def head_postprocess_nodes(model_path):
+    """
+    The non-convolution nodes of the YOLO11 detect head (DFL, box decoding, concat, sigmoid).
+    Quantizing them costs accuracy (box coordinates span 0..imgsz) and saves next to no time.
+    """
+    import onnx
+    graph = onnx.load(model_path).graph
+    heads = sorted({node.name.split("/")[1] for node in graph.node if node.name.startswith("/model.")}, key=lambda name: int(name.split(".")[1]))
+    head = f"/{heads[-1]}/" if heads else None
+    return [node.name for node in graph.node if head and node.name.startswith(head) and node.op_type != "Conv"]
+
+
+def quantize_onnx(fp32_path, int8_path, frames, imgsz, mode="static"):
+    """
+    Write an INT8 copy of the FP32 ONNX model: static QDQ quantization calibrated on frames
+    (weights and activations, per-channel weights), or dynamic (weights only) when mode is
+    'dynamic' or there are no calibration frames.
+    """
+    import onnxruntime as ort
+    from onnxruntime import quantization
+
+    if mode == "static" and not frames:
+        print("No calibration frames found; falling back to dynamic quantization.")
+        mode = "dynamic"
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        prepared_path = os.path.join(tmp_dir, "prepared.onnx")
+        try:
+            quantization.quant_pre_process(fp32_path, prepared_path, skip_symbolic_shape=True)
+        except Exception as e:
+            print(f"Skipping quantization pre-processing: {e}")
+            prepared_path = fp32_path
+
+        excluded = head_postprocess_nodes(prepared_path)
+        if mode == "static":
+            input_name = ort.InferenceSession(prepared_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+            print(f"Calibrating on {len(frames)} frames ({len(excluded)} head nodes kept in FP32)...")
+            quantization.quantize_static(
+                prepared_path, int8_path, FrameCalibrationReader(frames, imgsz, input_name),
+                quant_format=quantization.QuantFormat.QDQ,
+                activation_type=quantization.QuantType.QUInt8,
+                weight_type=quantization.QuantType.QInt8,
+                per_channel=True,
+                calibrate_method=quantization.CalibrationMethod.MinMax,
+                nodes_to_exclude=excluded
+            )
+        elif mode == "dynamic":
+            quantization.quantize_dynamic(prepared_path, int8_path, weight_type=quantization.QuantType.QUInt8, nodes_to_exclude=excluded)
+        else:
+            raise ValueError(f"Invalid quantization mode: {mode}. Please use 'static' or 'dynamic'.")
+    print(f"INT8 ({mode}) model written to: {int8_path}")
+    return int8_path
+
+
+def cached_int8_path(weights_file_path, imgsz, mode, calibration_frames):
+    """The INT8 cache path for these weights, keyed by the quantization mode and, for static, the calibration frame count."""
+    variant = f"static-c{calibration_frames}" if mode == "static" else mode
+    int8_path = detectors.exported_model_path(weights_file_path, "onnx_int8", imgsz, variant)
+    if os.path.exists(int8_path):
+        print(f"Using cached INT8 model: {int8_path}")
+        return int8_path, True
+    return int8_path, False
+
+
+def quantized_model(weights_file_path, imgsz=640, videos_dir="src/inference/videos", calibration_frames=200, mode="static"):
+    """The cached INT8 model for these weights and settings, quantized once (from the cached FP32 ONNX export) when missing."""
+    int8_path, cached = cached_int8_path(weights_file_path, imgsz, mode, calibration_frames)
+    if cached:
+        return int8_path
+    frames = sample_video_frames(videos_dir, calibration_frames) if mode == "static" else []
+    if mode == "static" and not frames:
+        # Cache the fallback under its own key, so a later run with calibration videos still calibrates
+        print("No calibration frames found; falling back to dynamic quantization.")
+        mode = "dynamic"
+        int8_path, cached = cached_int8_path(weights_file_path, imgsz, mode, calibration_frames)
+        if cached:
+            return int8_path
+    fp32_path = detectors.export_model(weights_file_path, "onnx", imgsz)
+    return quantize_onnx(fp32_path, int8_path, frames, imgsz, mode)
+
+
+def load_labelled_set(images_dir):
+    """YOLO-format labelled images: images_dir/x.jpg with labels in ../labels/x.txt (class cx cy w h, normalized)."""
+    labels_dir = os.path.join(os.path.dirname(os.path.normpath(images_dir)), "labels")
+    samples = []
+    for image_path in sorted(glob.glob(os.path.join(images_dir, "*"))):
+        if not image_path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        label_path = os.path.join(labels_dir, os.path.splitext(os.path.basename(image_path))[0] + ".txt")
+        labels = np.loadtxt(label_path, dtype=np.float32, ndmin=2) if os.path.exists(label_path) else np.zeros((0, 5), dtype=np.float32)
+        samples.append((image_path, labels.reshape(-1, 5)))
+    return samples
+
+
+def match_predictions(pred_classes, true_classes, iou):
+    """(predictions, thresholds) boolean matrix of true positives, matching each box at most once per threshold."""
+    correct = np.zeros((len(pred_classes), len(IOU_THRESHOLDS)), dtype=bool)
+    iou = iou * (true_classes[:, None] == pred_classes[None, :])
+    for indx, threshold in enumerate(IOU_THRESHOLDS):
+        matches = np.argwhere(iou >= threshold)
+        if len(matches) == 0:
+            continue
+        matches = matches[np.argsort(-iou[matches[:, 0], matches[:, 1]])]
+        matches = matches[np.unique(matches[:, 1], return_index=True)[1]]
+        matches = matches[np.unique(matches[:, 0], return_index=True)[1]]
+        correct[matches[:, 1], indx] = True
+    return correct
+
+
+def average_precision(recall, precision):
+    """Area under the interpolated precision-recall curve, 101-point like COCO."""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    curve = np.interp(points, recall, precision)
+    return float(np.sum((curve[1:] + curve[:-1]) / 2 * np.diff(points)))
+
+
+def mean_average_precision(correct, confidences, pred_classes, true_classes):
+    """mAP50 and mAP50-95 over the classes that have ground truth boxes."""
+    order = np.argsort(-confidences)
+    correct, pred_classes = correct[order], pred_classes[order]
+    ap = []
+    for class_id in np.unique(true_classes):
+        selected = pred_classes == class_id
+        total = int((true_classes == class_id).sum())
+        tp = np.cumsum(correct[selected], axis=0)
+        fp = np.cumsum(~correct[selected], axis=0)
+        recall = tp / total
+        precision = tp / np.maximum(tp + fp, 1)
+        ap.append([average_precision(recall[:, t], precision[:, t]) if len(tp) else 0.0 for t in range(len(IOU_THRESHOLDS))])
+    if not ap:
+        return 0.0, 0.0
+    ap = np.array(ap)
+    return float(ap[:, 0].mean()), float(ap.mean())
+
+
+def evaluate(detector, samples, confidence=0.001):
+    """mAP50 and mAP50-95 of a detector on a labelled set."""
+    all_correct, all_confidences, all_pred_classes, all_true_classes = [], [], [], []
+    for image_path, labels in samples:
+        image = cv2.imread(image_path)
+        height, width = image.shape[:2]
+        boxes = detector.detect([image], confidence)[0]
+
+        truth = np.empty((len(labels), 4), dtype=np.float32)
+        truth[:, 0] = (labels[:, 1] - labels[:, 3] / 2) * width
+        truth[:, 1] = (labels[:, 2] - labels[:, 4] / 2) * height
+        truth[:, 2] = (labels[:, 1] + labels[:, 3] / 2) * width
+        truth[:, 3] = (labels[:, 2] + labels[:, 4] / 2) * height
+        true_classes = labels[:, 0].astype(np.int64)
+
+        all_correct.append(match_predictions(boxes[:, 5].astype(np.int64), true_classes, tracker.iou_matrix(truth, boxes[:, :4])))
+        all_confidences.append(boxes[:, 4])
+        all_pred_classes.append(boxes[:, 5].astype(np.int64))
+        all_true_classes.append(true_classes)
+
+    return mean_average_precision(np.concatenate(all_correct), np.concatenate(all_confidences),
+                                  np.concatenate(all_pred_classes), np.concatenate(all_true_classes))
+
+
+def measure(model_path, imgsz, frames, runs, threads=0):
+    """Load a model and time it on frames; returns the detector and its latency and memory numbers."""
+    rss_before = metrics.rss_mb()
+    detector = detectors.OnnxDetector(model_path, imgsz, threads)
+    rss_after = metrics.rss_mb()
+    detectors.warm_up(detector, frames[0].shape[1], frames[0].shape[0], 3)
+
+    samples_ms = []
+    for indx in range(runs):
+        frame = frames[indx % len(frames)]
+        start = time.perf_counter()
+        detector.detect([frame], 0.25)
+        samples_ms.append((time.perf_counter() - start) * 1000)
+    return detector, {
+        "model_file_mb": round(os.path.getsize(model_path) / (1024 * 1024), 2),
+        "session_rss_mb": round(rss_after - rss_before, 1),
+        "latency_mean_ms": round(float(np.mean(samples_ms)), 2),
+        "latency_p50_ms": round(float(np.percentile(samples_ms, 50)), 2),
+        "latency_p95_ms": round(float(np.percentile(samples_ms, 95)), 2)
+    }
+
+
+def compare(weights_file_path, imgsz=640, videos_dir="src/inference/videos", data_dir=None, calibration_frames=200, mode="static", runs=50, threads=0):
+    """Quantize (if needed) and report latency, memory and, with a labelled set, mAP of FP32 against INT8."""
+    fp32_path = detectors.export_model(weights_file_path, "onnx", imgsz)
+    int8_path = quantized_model(weights_file_path, imgsz, videos_dir, calibration_frames, mode)
+
+    frames = sample_video_frames(videos_dir, 20)
+    samples = load_labelled_set(data_dir) if data_dir else []
+    if not frames and samples:
+        frames = [cv2.imread(image_path) for image_path, _ in samples[:20]]
+    if not frames:
+        frames = [np.random.default_rng(0).integers(0, 255, (imgsz, imgsz, 3), dtype=np.uint8)]
+
+    report = {"weights": weights_file_path, "imgsz": imgsz, "mode": mode, "threads": threads, "labelled_images": len(samples)}
+    for name, model_path in (("fp32", fp32_path), ("int8", int8_path)):
+        detector, numbers = measure(model_path, imgsz, frames, runs, threads)
+        if samples:
+            numbers["mAP50"], numbers["mAP50-95"] = (round(value, 4) for value in evaluate(detector, samples))
+        report[name] = numbers
+        del detector
+
+    report["speedup"] = round(report["fp32"]["latency_mean_ms"] / max(report["int8"]["latency_mean_ms"], 1e-9), 2)
+    if samples:
+        report["mAP50-95_drop"] = round(report["fp32"]["mAP50-95"] - report["int8"]["mAP50-95"], 4)
+    return report
+
+
+if __name__ == "__main__":
+    # python -m stls_lib.quantize --data path/to/valid/images --output int8_report.json
+    parser = argparse.ArgumentParser(description="Quantize the detector to INT8 and compare it with FP32.")
+    parser.add_argument("--weights", default="src/YOLO11_training/train_result/weights/best.pt")
+    parser.add_argument("--imgsz", type=int, default=640, help="the training image size (args.yaml)")
+    parser.add_argument("--videos", default="src/inference/videos", help="videos to sample calibration frames from")
+    parser.add_argument("--data", default=None, help="held-out labelled images (YOLO format, labels in ../labels)")
+    parser.add_argument("--calibration-frames", type=int, default=200)
+    parser.add_argument("--mode", default="static", choices=["static", "dynamic"])
+    parser.add_argument("--runs", type=int, default=50, help="timed inferences per model")
+    parser.add_argument("--threads", type=int, default=0, help="onnxruntime threads (0 = runtime default)")
+    parser.add_argument("--output", default=None, help="write the report as JSON to this file")
+    args = parser.parse_args()
+
+    report = compare(args.weights, args.imgsz, args.videos, args.data, args.calibration_frames, args.mode, args.runs, args.threads)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
@@ -0,0 +1,179 @@
+import argparse
+import itertools
+import os
+import struct
+import numpy as np
+from stls_lib import stls, zone_state
+
+# Append-only detection recording (little-endian):
+#   header: magic "STLSREC2", frame width (uint16), frame height (uint16), recording confidence (float32)
+#   record: timestamp (float64), status (uint8), box count (uint32), then count * 6 float32 (x1, y1, x2, y2, conf, cls)
+# The boxes are the raw detector output. The status says how the frame was handled: DETECTED frames
+# carry what the detector reported; PROPAGATED (tracker between keyframes) and GATED (motion gate,
+# zones empty and static) frames carry no boxes. A record cut short by a crash is ignored when reading.
+MAGIC = b"STLSREC2"
+_HEADER = struct.Struct("<8sHHf")
+_RECORD = struct.Struct("<dBI")
+BOX_COLUMNS = 6
+
+DETECTED = 0
+PROPAGATED = 1
+GATED = 2
+
+
+class Recorder:
+    """
+    Appends the detector output of every processed frame, with its timestamp and status, to a recording file.
+    An existing recording is only continued when it was made with the same frame size and detect_sensitivity.
+    """
+    def __init__(self, file_path, frame_width, frame_height, detect_sensitivity, flush_every=100):
+        exists = os.path.exists(file_path) and os.path.getsize(file_path) > 0
+        if exists:
+            with open(file_path, "rb") as file:
+                magic, width, height, sensitivity = _HEADER.unpack(file.read(_HEADER.size))
+            if magic != MAGIC or (width, height) != (frame_width, frame_height):
+                raise ValueError(f"'{file_path}' is not a {frame_width}x{frame_height} detection recording; use another record_file_path.")
+            if sensitivity != np.float32(detect_sensitivity):
+                raise ValueError(f"'{file_path}' was recorded with detect_sensitivity {sensitivity:g}, not {detect_sensitivity:g}; use another record_file_path.")
+        self.file = open(file_path, "ab")
+        if not exists:
+            self.file.write(_HEADER.pack(MAGIC, frame_width, frame_height, detect_sensitivity))
+        self.flush_every = flush_every
+        self.frames = 0
+        print(f"Recording detections to '{file_path}'")
+
+    def record(self, timestamp, boxes, status=DETECTED):
+        boxes = np.ascontiguousarray(boxes[:, :BOX_COLUMNS], dtype=np.float32)
+        self.file.write(_RECORD.pack(timestamp, status, len(boxes)))
+        self.file.write(boxes.tobytes())
+        self.frames += 1
+        if self.frames % self.flush_every == 0:
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class Recording:
+    """
+    A detection recording loaded for replay: one timestamp and status per frame and all boxes
+    in a single (N, 6) array, with offsets[i]:offsets[i + 1] selecting the boxes of frame i.
+    """
+    def __init__(self, file_path):
+        data = np.fromfile(file_path, dtype=np.uint8)
+        if len(data) < _HEADER.size:
+            raise ValueError(f"'{file_path}' is not a detection recording.")
+        magic, self.frame_width, self.frame_height, self.detect_sensitivity = _HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"'{file_path}' is not a detection recording.")
+
+        # Walk the record headers once, then copy every box block into one array
+        timestamps, statuses, starts, counts = [], [], [], []
+        position = _HEADER.size
+        while position + _RECORD.size <= len(data):
+            timestamp, status, count = _RECORD.unpack_from(data, position)
+            end = position + _RECORD.size + count * BOX_COLUMNS * 4
+            if end > len(data):
+                break
+            timestamps.append(timestamp)
+            statuses.append(status)
+            starts.append(position + _RECORD.size)
+            counts.append(count)
+            position = end
+
+        self.timestamps = np.array(timestamps, dtype=np.float64)
+        self.statuses = np.array(statuses, dtype=np.uint8)
+        self.offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.offsets[1:])
+        self.boxes = np.empty((int(self.offsets[-1]), BOX_COLUMNS), dtype=np.float32)
+        flat = self.boxes.reshape(-1).view(np.uint8)
+        for start, count, offset in zip(starts, counts, self.offsets[:-1]):
+            size = count * BOX_COLUMNS * 4
+            flat[offset * BOX_COLUMNS * 4:offset * BOX_COLUMNS * 4 + size] = data[start:start + size]
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def frames(self, min_confidence=0.0):
+        """
+        Yield (timestamp, boxes) per frame the zones were decided on, keeping only boxes at or above
+        min_confidence. Gated frames yield no boxes; frames the tracker propagated are skipped,
+        since the replay has no tracker to carry the boxes of the previous keyframe forward.
+        """
+        keep = self.boxes[:, 4] >= min_confidence
+        for indx in range(len(self.timestamps)):
+            if self.statuses[indx] == PROPAGATED:
+                continue
+            start, end = self.offsets[indx], self.offsets[indx + 1]
+            boxes = self.boxes[start:end]
+            yield self.timestamps[indx], boxes[keep[start:end]]
+
+
+def replay(recording, zones, class_list, time_interval, detect_sensitivity=0.0):
+    """
+    Feed a recording through zone assignment and the queuing logic without decoding or inference.
+    Boxes below detect_sensitivity are dropped first, so the sensitivity can be raised after the
+    fact (it cannot go below the one used while recording). Returns the timeline of zone changes
+    and per-zone totals.
+    """
+    if detect_sensitivity < recording.detect_sensitivity:
+        print(f"Note: the recording only holds boxes with confidence >= {recording.detect_sensitivity:.2f}.")
+    number_of_zones = len(zones)
+    zone_index = stls.build_zone_index(zones, recording.frame_width, recording.frame_height)
+    engine = zone_state.ZoneStateEngine(number_of_zones, time_interval, class_list, verbose=False)
+    occupied_time = np.zeros(number_of_zones, dtype=np.float64)
+    timeline = []
+    prev_timestamp = None
+
+    for timestamp, boxes in recording.frames(detect_sensitivity):
+        box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+        if prev_timestamp is not None:
+            occupied_time += engine.occupied * (timestamp - prev_timestamp)
+        prev_timestamp = timestamp
+        for zone in engine.update(boxes, box_zones, timestamp):
+            timeline.append((float(timestamp), int(zone), engine.vehicle_name(zone)))
+
+    return {
+        "frames": len(recording),
+        "transitions": engine.transitions,
+        "detections_per_zone": engine.detections.tolist(),
+        "occupied_seconds_per_zone": occupied_time.round(2).tolist(),
+        "timeline": timeline
+    }
+
+
+def load_zones(zones_file_path, frame_width, frame_height):
+    data = stls.extract_data_from_file(zones_file_path)
+    return stls.convert_coordinates(data["zones"], data["frame_width"], data["frame_height"], frame_width, frame_height)
+
+
+def main(replay_file_path, zones_file_path, class_list_file_path, detect_sensitivity, time_interval):
+    """Replay mode: run one recording against the configured zones, sensitivity and interval."""
+    recording = Recording(replay_file_path)
+    zones = load_zones(zones_file_path, recording.frame_width, recording.frame_height)
+    result = replay(recording, zones, stls.load_class_names(class_list_file_path), time_interval, detect_sensitivity)
+    for timestamp, zone, vehicle in result["timeline"]:
+        print(f"{timestamp - recording.timestamps[0]:9.2f}s  zone {zone}: {vehicle}")
+    del result["timeline"]
+    stls.print_data(result)
+
+
+if __name__ == "__main__":
+    # Parameter sweep, e.g.:
+    # python -m stls_lib.recording detections.stlsrec --zones src/utils/zones.txt --sensitivity 0.15,0.3 --interval 2,3
+    parser = argparse.ArgumentParser(description="Replay a detection recording over a grid of zones files, sensitivities and intervals.")
+    parser.add_argument("recording")
+    parser.add_argument("--zones", default="src/utils/zones.txt", help="comma-separated zones files")
+    parser.add_argument("--classes", default="src/utils/class.names")
+    parser.add_argument("--sensitivity", default="0.15", help="comma-separated confidence thresholds")
+    parser.add_argument("--interval", default="3.0", help="comma-separated time_interval values")
+    args = parser.parse_args()
+
+    recording = Recording(args.recording)
+    class_list = stls.load_class_names(args.classes)
+    print(f"{len(recording)} frames, {len(recording.boxes)} boxes")
+    for zones_file_path, sensitivity, interval in itertools.product(args.zones.split(","), args.sensitivity.split(","), args.interval.split(",")):
+        zones = load_zones(zones_file_path, recording.frame_width, recording.frame_height)
+        result = replay(recording, zones, class_list, float(interval), float(sensitivity))
+        print(f"{zones_file_path} sensitivity={sensitivity} interval={interval}: {result['transitions']} transitions, "
+              f"occupied {result['occupied_seconds_per_zone']} s, detections {result['detections_per_zone']}")
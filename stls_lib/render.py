@@ -0,0 +1,85 @@
+import cv2
+import numpy as np
+from stls_lib import stls
+
+class Renderer:
+    """
+    Rendering layer kept apart from detection.
+    Headless (frame_name: off) draws nothing and allocates nothing; display mode batches
+    all translucent box fills into one overlay and one blend per frame, and can render
+    only every render_every processed frames.
+    """
+    colors = {'box': (86, 179, 255), 'text': (255, 255, 255), 'center': (255, 89, 94)}
+
+    def __init__(self, frame_name: str, wait_key: int, ord_key: str, zones, class_list, render_every: int = 1, box_alpha: float = 0.2):
+        self.frame_name = frame_name
+        self.zones = zones
+        self.class_list = class_list
+        self.headless = frame_name.lower() == "off"
+        self.wait_key = wait_key
+        self.ord_key = ord_key
+        self.render_every = max(1, int(render_every))
+        self.box_alpha = box_alpha
+        self.frame_count = 0
+        self.suspended = False  # Set while the degradation controller has rendering turned off
+        self.overlay = None  # Reused between frames, grown only when a larger region is needed
+
+    def should_render(self):
+        """Advance the frame counter and tell whether this processed frame gets drawn."""
+        if self.headless or self.suspended:
+            return False
+        self.frame_count += 1
+        return (self.frame_count - 1) % self.render_every == 0
+
+    def suspend(self, suspended):
+        self.suspended = suspended
+
+    def overlay_for(self, height, width):
+        if self.overlay is None or self.overlay.shape[0] < height or self.overlay.shape[1] < width:
+            self.overlay = np.empty((height, width, 3), dtype=np.uint8)
+        return self.overlay[:height, :width]
+
+    def draw_detections(self, frame, frame_detections, class_list):
+        """Draw every detection that landed in a zone, with a single blend for all the translucent fills."""
+        selected = frame_detections[frame_detections["zone_id"] >= 0]
+        if len(selected) == 0:
+            return
+
+        corners = selected["box"].astype(np.int32)
+        frame_height, frame_width = frame.shape[:2]
+        x0 = max(int(corners[:, 0].min()), 0)
+        y0 = max(int(corners[:, 1].min()), 0)
+        x1 = min(int(corners[:, 2].max()) + 1, frame_width)
+        y1 = min(int(corners[:, 3].max()) + 1, frame_height)
+
+        if x1 > x0 and y1 > y0:
+            region = frame[y0:y1, x0:x1]
+            overlay = self.overlay_for(y1 - y0, x1 - x0)
+            np.copyto(overlay, region)
+            for bx1, by1, bx2, by2 in corners:
+                cv2.rectangle(overlay, (int(bx1) - x0, int(by1) - y0), (int(bx2) - x0, int(by2) - y0), self.colors['box'], cv2.FILLED)
+            cv2.addWeighted(overlay, self.box_alpha, region, 1 - self.box_alpha, 0, region)
+
+        for (bx1, by1, bx2, by2), conf_score, cls, track_id in zip(corners.tolist(), selected["score"].tolist(), selected["class_id"].tolist(), selected["track_id"].tolist()):
+            cls_center_pnt = ((bx1 + bx2) // 2, (by1 + by2) // 2)
+            cv2.rectangle(frame, (bx1, by1), (bx2, by2), self.colors['box'], 2)
+            cv2.circle(frame, cls_center_pnt, 4, self.colors['center'], -1)
+            text = f"{class_list[cls]} {conf_score:.2f}"
+            if track_id >= 0:  # Tracked detections carry their persistent id
+                text = f"#{track_id} {text}"
+            cv2.putText(frame, text, (bx1, by1 - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.6, self.colors['text'], 2)
+
+    def render(self, frame, frame_detections, occupied, data_to_display):
+        stls.draw_polylines_zones(frame, self.zones, self.frame_name)
+        self.draw_detections(frame, frame_detections, self.class_list)
+        for indx in range(len(occupied)):
+            stls.traffic_light_display(frame, indx, is_zone_occupied = bool(occupied[indx]), number_of_zones = len(occupied))
+        stls.display_zone_info(frame, data_to_display)
+
+    def show(self, frame, rendered):
+        """Show a rendered frame; on skipped frames only poll the keyboard. Returns False on quit."""
+        if self.headless:
+            return True
+        if rendered:
+            return stls.show_frame(frame, self.frame_name, self.wait_key, self.ord_key)
+        return not (cv2.waitKey(1) & 0xFF == ord(self.ord_key))
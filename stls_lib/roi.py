@@ -0,0 +1,65 @@
+import cv2
+import math
+import numpy as np
+from stls_lib import stls
+
+def compute_rois(zones, frame_width, frame_height, roi_mode="union", padding=32):
+    """
+    Regions of the frame the detector needs to see, as (x1, y1, x2, y2) in frame coordinates:
+    one box around all zones for "union", or one box per zone for "tiles".
+    """
+    rects = []
+    for zone in zones.values():
+        points = np.array(zone, dtype=np.int32)
+        x1, y1 = points.min(axis=0) - padding
+        x2, y2 = points.max(axis=0) + padding
+        rects.append((max(int(x1), 0), max(int(y1), 0), min(int(x2), frame_width), min(int(y2), frame_height)))
+
+    if roi_mode == "union":
+        rects = [(min(r[0] for r in rects), min(r[1] for r in rects), max(r[2] for r in rects), max(r[3] for r in rects))]
+    elif roi_mode != "tiles":
+        raise ValueError(f"Invalid roi_mode: {roi_mode}. Please use 'off', 'union' or 'tiles'.")
+
+    rects = [rect for rect in rects if rect[2] > rect[0] and rect[3] > rect[1]]
+    coverage = sum((x2 - x1) * (y2 - y1) for x1, y1, x2, y2 in rects) / float(frame_width * frame_height)
+    print(f"ROI mode '{roi_mode}': {len(rects)} region(s) covering {coverage * 100:.1f}% of the frame")
+    return rects
+
+
+def detect_in_rois(source_frame, rois, yolo_model, confidence, frame_width, frame_height, iou=0.5):
+    """
+    Crop the regions straight from the source frame (no full-frame resize), run the detector
+    on the crops at its native input size and map the boxes back to frame coordinates.
+    """
+    source_height, source_width = source_frame.shape[:2]
+    scale_x = source_width / frame_width
+    scale_y = source_height / frame_height
+
+    crops, offsets = [], []
+    for x1, y1, x2, y2 in rois:
+        sx1, sy1 = int(x1 * scale_x), int(y1 * scale_y)
+        sx2, sy2 = min(math.ceil(x2 * scale_x), source_width), min(math.ceil(y2 * scale_y), source_height)
+        crops.append(source_frame[sy1:sy2, sx1:sx2])
+        offsets.append((sx1, sy1))
+
+    boxes_list = stls.get_prediction_boxes_batch(crops, yolo_model, confidence)
+
+    mapped = []
+    for boxes, (offset_x, offset_y) in zip(boxes_list, offsets):
+        if len(boxes) == 0:
+            continue
+        boxes = np.array(boxes, dtype=np.float32)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] + offset_x) / scale_x
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] + offset_y) / scale_y
+        mapped.append(boxes)
+
+    if not mapped:
+        return np.zeros((0, 6), dtype=np.float32)
+    boxes = np.concatenate(mapped)
+    if len(mapped) == 1:
+        return boxes
+
+    # Vehicles inside overlapping tiles are detected twice; keep the best box per class
+    xywh = np.concatenate([boxes[:, :2], boxes[:, 2:4] - boxes[:, :2]], axis=1)
+    keep = cv2.dnn.NMSBoxesBatched(xywh.tolist(), boxes[:, 4].tolist(), boxes[:, 5].astype(np.int32).tolist(), confidence, iou)
+    return boxes[np.array(keep, dtype=np.int64).reshape(-1)]
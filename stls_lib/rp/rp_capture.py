@@ -0,0 +1,63 @@
+import cv2
+import numpy as np
+from picamera2 import Picamera2, MappedArray
+
+class PicameraCapture:
+    """
+    Raspberry Pi camera capture into a fixed pool of preallocated buffers.
+
+    Each captured request is mapped in place and copied once into the next pool slot, then
+    the camera buffer is released straight away (holding Picamera2's DMA buffers across the
+    pipeline would stall the camera). Callers get views of pool slots, so steady-state
+    capture allocates nothing. The pool must be larger than the number of frames in flight.
+
+    With use_lores, the camera's ISP also produces a small stream at detector resolution,
+    so detection needs no CPU resize.
+    """
+    def __init__(self, frame_width, frame_height, pool_size=6, use_lores=False, lores_width=640):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.use_lores = use_lores
+
+        self.picam2 = Picamera2()
+        lores = None
+        if use_lores:
+            # Keep the aspect ratio; the ISP needs even dimensions
+            lores_height = int(round(lores_width * frame_height / frame_width / 2)) * 2
+            self.lores_size = (lores_width, lores_height)
+            lores = {"size": self.lores_size, "format": "YUV420"}
+        config = self.picam2.create_preview_configuration(main={"size": (frame_width, frame_height), "format": "RGB888"}, lores=lores)
+        self.picam2.align_configuration(config)
+        self.picam2.configure(config)
+        self.main_size = config["main"]["size"]
+
+        width, height = self.main_size
+        self.pool = np.empty((pool_size, height, width, 3), dtype=np.uint8)
+        if use_lores:
+            self.lores_pool = np.empty((pool_size, self.lores_size[1], self.lores_size[0], 3), dtype=np.uint8)
+        self.next_slot = 0
+        self.picam2.start()
+
+    def read(self):
+        """Capture the newest frame; returns (frame, detect_frame) as views into the pool (detect_frame is None without lores)."""
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % len(self.pool)
+
+        request = self.picam2.capture_request()
+        try:
+            with MappedArray(request, "main") as mapped:
+                frame = self.pool[slot]
+                np.copyto(frame, mapped.array[:frame.shape[0], :frame.shape[1], :3])
+            detect_frame = None
+            if self.use_lores:
+                with MappedArray(request, "lores") as mapped:
+                    # The lores stream is YUV420; convert straight into the pool slot
+                    detect_frame = self.lores_pool[slot]
+                    lores_height = self.lores_size[1]
+                    cv2.cvtColor(mapped.array[:lores_height * 3 // 2, :self.lores_size[0]], cv2.COLOR_YUV2BGR_I420, dst=detect_frame)
+        finally:
+            request.release()
+        return frame, detect_frame
+
+    def stop(self):
+        self.picam2.stop()
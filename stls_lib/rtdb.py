@@ -1,5 +1,6 @@
-import firebase_admin
-from firebase_admin import credentials, db
+import json
+import threading
+import time
 from stls_lib import stls
 
 def initialize_firebase(status: str):
@@ -8,6 +9,8 @@ def initialize_firebase(status: str):
     """
     if status.lower() == "on":
         try:
+            import firebase_admin  # Only paid for when Firebase is used
+            from firebase_admin import credentials
             service_acc_key_path = "src/private_api/serviceAccountKey.json"
             stls.check_exist_file(service_acc_key_path)
             cred = credentials.Certificate(service_acc_key_path)
@@ -31,12 +34,249 @@ def send_data_in_firebase(data, status: str):
     """
     if status.lower() == "on":
         try:
+            from firebase_admin import db
             ref = db.reference('/zones')  # Path to your Firebase database
-            ref.child('z0-z1').set(f"{data[0]}&{data[1]}")  # Update specific fields in '/zones'
-            print(f"Data sent to Firebase: {data[0]}&{data[1]}")
+            ref.child(zones_key(len(data))).set(format_payload(data))  # Update specific fields in '/zones'
+            print(f"Data sent to Firebase: {format_payload(data)}")
         except Exception as e:
             print(f"Error sending data to Firebase: {e}. Check internet connection or database permissions.")
     elif status.lower() == "off":
         print("Data sending skipped. Status is off.")
     else:
-        print(f"Invalid status provided: {status}. Please use 'on' or 'off'.")
\ No newline at end of file
+        print(f"Invalid status provided: {status}. Please use 'on' or 'off'.")
+
+
+def zones_key(number_of_zones):
+    """Database key holding the state of all zones: 'z0-z1' for two zones, 'z0-z1-z2-z3' for four."""
+    return "-".join(f"z{zone_index}" for zone_index in range(number_of_zones))
+
+
+def format_payload(data):
+    """Join the per-zone vehicle names into the string the ESP32 controllers parse, e.g. 'car&none'."""
+    return "&".join(str(vehicle) for vehicle in data)
+
+
+class FirebaseBackend:
+    """Writes the payload to the Realtime Database, reusing one cached reference object."""
+    def __init__(self, path='/zones', key='z0-z1'):
+        self.path = path
+        self.key = key
+        self.ref = None
+
+    def send(self, payload):
+        if self.ref is None:
+            from firebase_admin import db
+            self.ref = db.reference(self.path).child(self.key)
+        self.ref.set(payload)
+
+
+class MultiPathBackend:
+    """
+    Writes a {path: payload} dict as one multi-path update of the Realtime Database, so the
+    states of many curves cost one request. The memory and file stand-ins get the dict as is.
+    """
+    name = "Firebase"
+
+    def __init__(self, backend="firebase", file_path="firebase_stand_in.jsonl"):
+        self.stand_in = None if backend.lower() == "firebase" else create_backend(backend, file_path)
+        self.ref = None
+
+    def send(self, updates):
+        if self.stand_in is not None:
+            self.stand_in.send(updates)
+            return
+        if self.ref is None:
+            from firebase_admin import db
+            self.ref = db.reference('/')
+        self.ref.update(updates)
+
+    def describe(self, updates):
+        return f"{len(updates)} paths"
+
+
+class MemoryBackend:
+    """In-memory stand-in for Firebase, keeps every payload it receives."""
+    def __init__(self):
+        self.history = []
+
+    def send(self, payload):
+        self.history.append(payload)
+
+    @property
+    def latest(self):
+        return self.history[-1] if self.history else None
+
+
+class FileBackend:
+    """File stand-in for Firebase, appends one JSON line per payload."""
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def send(self, payload):
+        with open(self.file_path, "a") as file:
+            file.write(json.dumps({"time": time.time(), "payload": payload}) + "\n")
+
+
+class Publisher:
+    """
+    Background publisher with a single-slot "latest state wins" buffer.
+    publish() only stores the newest state and returns immediately; a worker thread
+    sends it with retry and exponential backoff. A state that ran out of retries is kept and
+    retried in the background, still backing off up to max_delay, until it is delivered or a
+    newer state replaces it, so a receiver never stays on an older state once the connection
+    recovers. With refresh_interval set, the last delivered state is also sent again whenever
+    nothing new arrived for that long.
+    """
+    def __init__(self, backend, max_retries=5, base_delay=0.5, max_delay=8.0, formatter=format_payload, refresh_interval=None):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.formatter = formatter
+        self.refresh_interval = refresh_interval
+        self.name = getattr(backend, "name", "Firebase")
+        self.describe = getattr(backend, "describe", str)
+        self.delivered = None
+        self.undelivered = None  # Newest state dropped after its retries, resent until delivered
+        self.undelivered_attempts = 0
+
+        self.pending = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+
+        self.sends = 0
+        self.failures = 0
+        self.drops = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.last_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+
+        self.thread = threading.Thread(target=self._run, name="stls-publisher", daemon=True)
+        self.thread.start()
+
+    def publish(self, data):
+        """Enqueue the newest zone state; never blocks on I/O."""
+        with self.lock:
+            if self.pending is not None:
+                self.coalesced += 1
+            self.pending = (self.formatter(data), time.perf_counter())
+        self.wakeup.set()
+
+    def _take_pending(self):
+        with self.lock:
+            item = self.pending
+            self.pending = None
+            self.wakeup.clear()
+        return item
+
+    def _run(self):
+        while True:
+            woken = True
+            if not self.stopped.is_set():
+                woken = self.wakeup.wait(self._idle_timeout())
+            item = self._take_pending()
+            if item is None:
+                if self.stopped.is_set():
+                    return
+                if not woken and (self.delivered is not None or self.undelivered is not None):
+                    self._refresh()
+                continue
+
+            attempt = 0
+            while True:
+                payload, enqueued_at = item
+                try:
+                    self.backend.send(payload)
+                    latency_ms = (time.perf_counter() - enqueued_at) * 1000
+                    self.sends += 1
+                    self.last_latency_ms = latency_ms
+                    self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+                    self.total_latency_ms += latency_ms
+                    self.delivered = payload
+                    self.undelivered = None
+                    self.undelivered_attempts = 0
+                    print(f"Data sent to {self.name}: {self.describe(payload)}")
+                    break
+                except Exception as e:
+                    self.failures += 1
+                    attempt += 1
+                    print(f"Error sending data to {self.name}: {e}. Check the connection or permissions.")
+                    if attempt > self.max_retries or self.stopped.is_set():
+                        self.drops += 1
+                        self.undelivered = payload
+                        self.undelivered_attempts = attempt
+                        break
+
+                    # Back off, but a newer state replaces the one being retried (latest wins)
+                    delay = min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+                    if self.wakeup.wait(delay):
+                        newer = self._take_pending()
+                        if newer is not None:
+                            self.drops += 1
+                            item = newer
+                            attempt = 0
+
+    def _idle_timeout(self):
+        """How long to wait for a new state: the backoff of an undelivered state, else refresh_interval (None waits forever)."""
+        if self.undelivered is None:
+            return self.refresh_interval
+        delay = min(self.base_delay * (2 ** (self.undelivered_attempts - 1)), self.max_delay)
+        return delay if self.refresh_interval is None else min(delay, self.refresh_interval)
+
+    def _refresh(self):
+        """Send the newest state again, once, so a restarted receiver catches up; delivered only moves on success."""
+        payload = self.undelivered if self.undelivered is not None else self.delivered
+        try:
+            self.backend.send(payload)
+            self.refreshes += 1
+            if payload is self.undelivered:
+                self.delivered = payload
+                self.undelivered = None
+                self.undelivered_attempts = 0
+                print(f"Data sent to {self.name}: {self.describe(payload)}")
+        except Exception as e:
+            self.failures += 1
+            if payload is self.undelivered:
+                self.undelivered_attempts += 1
+            print(f"Error refreshing {self.name}: {e}.")
+
+    def stats(self):
+        return {
+            "sends": self.sends,
+            "failures": self.failures,
+            "drops": self.drops,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "last_latency_ms": self.last_latency_ms,
+            "avg_latency_ms": self.total_latency_ms / self.sends if self.sends else 0.0,
+            "max_latency_ms": self.max_latency_ms
+        }
+
+    def stop(self, timeout=5.0):
+        """Flush the last pending state and stop the worker thread."""
+        self.stopped.set()
+        self.wakeup.set()
+        self.thread.join(timeout=timeout)
+
+
+def create_backend(backend: str, file_path="firebase_stand_in.jsonl", path='/zones', key='z0-z1'):
+    if backend.lower() == "firebase":
+        return FirebaseBackend(path, key)
+    elif backend.lower() == "memory":
+        return MemoryBackend()
+    elif backend.lower() == "file":
+        return FileBackend(file_path)
+    raise ValueError(f"Invalid firebase_backend: {backend}. Please use 'firebase', 'memory' or 'file'.")
+
+
+def start_publisher(status: str, backend="firebase", file_path="firebase_stand_in.jsonl", path='/zones', key='z0-z1'):
+    """
+    Starts a background publisher if the status is "on", otherwise returns None
+    and the caller keeps using send_data_in_firebase.
+    """
+    if status.lower() != "on":
+        return None
+    return Publisher(create_backend(backend, file_path, path, key))
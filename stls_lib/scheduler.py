@@ -0,0 +1,120 @@
+import math
+import time
+
+# Source frames of slack for live sources, so frame timing jitter does not cost a whole frame
+LIVE_SLACK_FRAMES = 0.5
+
+class FrameScheduler:
+    """
+    Decides which captured frames get processed, based on the measured processing time
+    instead of a fixed "every third frame" rule.
+
+    The desired processing rate comes from target_fps, or from latency_budget_ms (one frame
+    per budget), or falls back to a third of the source rate. It is capped by what the
+    processing stage can actually sustain, and multiplied by boost_factor for boost_seconds
+    after a zone becomes occupied. rate_scale (1.0 unless the degradation controller lowers
+    it) scales the final rate down to skip more frames.
+    """
+    def __init__(self, source_fps, target_fps=0.0, latency_budget_ms=0.0, live=False, boost_seconds=2.0, boost_factor=2.0, smoothing=0.2):
+        self.source_fps = source_fps if source_fps and source_fps > 0 else 30.0
+        self.target_fps = target_fps
+        self.latency_budget_ms = latency_budget_ms
+        self.live = live
+        self.boost_seconds = boost_seconds
+        self.boost_factor = boost_factor
+        self.smoothing = smoothing
+
+        self.processing_time = 0.0  # Smoothed seconds per processed frame
+        self.boost_until = 0.0
+        self.prev_occupied = []
+        self.frames_seen = 0
+        self.frames_processed = 0
+        self.frames_since_processed = 0
+        self.last_processed_at = 0.0
+        self.achieved_fps = 0.0
+        self.rate_scale = 1.0
+
+    def desired_fps(self, now):
+        if self.target_fps > 0:
+            fps = self.target_fps
+        elif self.latency_budget_ms > 0:
+            fps = 1000.0 / self.latency_budget_ms
+        else:
+            fps = self.source_fps / 3
+        if now < self.boost_until:
+            fps *= self.boost_factor
+        return fps
+
+    def processing_fps(self, now=None):
+        """The rate to process at: desired rate capped by capacity and by the source rate."""
+        now = time.time() if now is None else now
+        fps = min(self.desired_fps(now), self.source_fps)
+        if self.processing_time > 0:
+            fps = min(fps, 1.0 / self.processing_time)
+        return fps * self.rate_scale
+
+    def stride(self, now=None):
+        """Number of source frames per processed frame for file sources."""
+        return max(1, math.ceil(self.source_fps / self.processing_fps(now) - 1e-6))
+
+    def should_process(self, now=None):
+        """Call once per captured frame; returns True when this frame should be processed."""
+        now = time.time() if now is None else now
+        self.frames_seen += 1
+        self.frames_since_processed += 1
+
+        if self.live:
+            # Live sources always hand us the newest frame, so the decision is purely time based
+            due = now - self.last_processed_at >= 1.0 / self.processing_fps(now) - LIVE_SLACK_FRAMES / self.source_fps
+        else:
+            due = self.frames_since_processed >= self.stride(now)
+
+        if due:
+            if self.last_processed_at > 0:
+                interval = now - self.last_processed_at
+                if interval > 0:
+                    rate = 1.0 / interval
+                    self.achieved_fps = rate if self.achieved_fps == 0 else self.achieved_fps + self.smoothing * (rate - self.achieved_fps)
+            self.last_processed_at = now
+            self.frames_since_processed = 0
+            self.frames_processed += 1
+        return due
+
+    def time_until_due(self, now=None):
+        """Seconds until a live source should hand over its next frame, so it is only pulled when needed."""
+        now = time.time() if now is None else now
+        if not self.live or self.last_processed_at == 0:
+            return 0.0
+        # Same slack as should_process, so the frame pulled at this time is the one that gets processed
+        due_at = self.last_processed_at + 1.0 / self.processing_fps(now) - LIVE_SLACK_FRAMES / self.source_fps
+        return max(0.0, due_at - now)
+
+    def record_processing(self, elapsed):
+        """Feed the measured processing time (seconds) of one frame."""
+        if self.processing_time == 0:
+            self.processing_time = elapsed
+        else:
+            self.processing_time += self.smoothing * (elapsed - self.processing_time)
+
+    def notify_occupancy(self, occupied, now=None):
+        """Raise the rate for a short while when a zone has just become occupied."""
+        now = time.time() if now is None else now
+        newly_occupied = any(curr and not prev for curr, prev in zip(occupied, self.prev_occupied))
+        if newly_occupied:
+            self.boost_until = now + self.boost_seconds
+        self.prev_occupied = list(occupied)
+
+    def stats(self):
+        return {
+            "frames_read": self.frames_seen,
+            "frames_processed": self.frames_processed,
+            "frames_skipped": self.frames_seen - self.frames_processed,
+            "processing_fps": self.processing_fps(),
+            "achieved_fps": self.achieved_fps
+        }
+
+
+def create_scheduler(source_fps, target_fps=0.0, latency_budget_ms=0.0, live=False, boost_seconds=2.0):
+    scheduler = FrameScheduler(source_fps, target_fps, latency_budget_ms, live, boost_seconds)
+    print(f"Frame scheduler: source {scheduler.source_fps:.1f} fps, live={live}, target {scheduler.processing_fps():.1f} fps")
+    return scheduler
@@ -2,7 +2,6 @@ import cv2
 import numpy as np
 import os
 import re
-from ultralytics import YOLO
 
 def read_class_names(file_path: str) -> list:
         with open(file_path, 'r') as f:
@@ -97,6 +96,15 @@ def draw_polylines_zones(image, data, frame_name, linesColor=(0, 255, 0), txtCol
         cv2.putText(image, f"{key}", tuple(centroid), cv2.FONT_HERSHEY_SIMPLEX, fontScale, txtColor, thickness)
         
 
+def blend_rectangle(frame, top_left, bottom_right, color, alpha):
+    """Blend a filled rectangle into the frame in place, touching only the pixels under it."""
+    x1, y1 = max(top_left[0], 0), max(top_left[1], 0)
+    x2, y2 = min(bottom_right[0] + 1, frame.shape[1]), min(bottom_right[1] + 1, frame.shape[0])
+    if x2 <= x1 or y2 <= y1:
+        return
+    region = frame[y1:y2, x1:x2]
+    cv2.addWeighted(region, 1 - alpha, np.full_like(region, color), alpha, 0, region)
+
 def display_zone_info(frame, data, color=(255, 255, 255), font = cv2.FONT_HERSHEY_SIMPLEX, font_scale = 0.75, thickness = 2, bg_color = (0, 0, 0), alpha = 0.6):
     frame_name = data["frame_name"]
     if frame_name.lower() == "off":
@@ -107,7 +115,6 @@ def display_zone_info(frame, data, color=(255, 255, 255), font = cv2.FONT_HERSHE
     zones_list = data["zones_list"]
     processing_time = data["processing_time"]
     frame_width = frame.shape[1]
-    overlay = frame.copy()
     
     collected_text = []
     collected_position = []
@@ -119,19 +126,21 @@ def display_zone_info(frame, data, color=(255, 255, 255), font = cv2.FONT_HERSHE
         position = (25, 25 + 30 * zone_indx)
         collected_position.append(position)
         (text_w, text_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-        cv2.rectangle(overlay, (position[0] - 5, position[1] - text_h - 5), (position[0] + text_w + 5, position[1] + 5), bg_color, cv2.FILLED)
+        blend_rectangle(frame, (position[0] - 5, position[1] - text_h - 5), (position[0] + text_w + 5, position[1] + 5), bg_color, alpha)
 
     text = f"Process Time per frame: {processing_time:.2f} ms"
+    achieved_fps = data.get("achieved_fps")
+    if achieved_fps is not None:
+        text += f" | {achieved_fps:.1f} FPS"
     if (frame_width > 1000):
         position = (frame_width - 550, 30)
     else:
-        position = (25, 25 + 30 * 2)
+        position = (25, 25 + 30 * number_of_zones)
     (text_w, text_h), _ = cv2.getTextSize(text, font, font_scale, thickness)
-    cv2.rectangle(overlay, (position[0] - 5, position[1] - text_h - 5), (position[0] + text_w + 5, position[1] + 5), bg_color, cv2.FILLED)
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+    blend_rectangle(frame, (position[0] - 5, position[1] - text_h - 5), (position[0] + text_w + 5, position[1] + 5), bg_color, alpha)
 
-    cv2.putText(frame, collected_text[0], collected_position[0], font, font_scale, color, thickness)
-    cv2.putText(frame, collected_text[1], collected_position[1], font, font_scale, color, thickness)
+    for text_line, text_position in zip(collected_text, collected_position):
+        cv2.putText(frame, text_line, text_position, font, font_scale, color, thickness)
     cv2.putText(frame, text, position, font, font_scale, color, 2, cv2.LINE_AA)
 
 
@@ -140,7 +149,86 @@ def check_camera(cap):
         raise TypeError("Cannot open camera.")
 
 
-def track_objects_in_zones(frame, boxes, class_list, zones, collected_vehicle, frame_name):
+_zone_index_cache = {}
+
+def build_zone_index(zones, frame_width, frame_height, edge_band=5):
+    """
+    Rasterize the zones into a (frame_height, frame_width) label image where each pixel
+    holds the index of the first zone that strictly contains it, or -1 for no zone.
+    """
+    zone_index = np.full((frame_height, frame_width), -1, dtype=np.int16)
+    band = np.zeros((frame_height, frame_width), dtype=np.uint8)
+
+    # Paint in reverse order so the lowest zone index wins where polygons overlap (first-match-wins)
+    for zone_indx in reversed(range(len(zones))):
+        points_array = np.array(list(zones.values())[zone_indx], dtype=np.int32)
+        mask = np.zeros((frame_height, frame_width), dtype=np.uint8)
+        cv2.fillPoly(mask, [points_array], 1)
+
+        # fillPoly includes edge pixels, so settle every pixel near the outline with the exact test
+        band[:] = 0
+        cv2.polylines(band, [points_array], isClosed=True, color=1, thickness=edge_band)
+        ys, xs = np.nonzero(band)
+        contour = points_array.reshape(-1, 1, 2)
+        for x, y in zip(xs.tolist(), ys.tolist()):
+            mask[y, x] = cv2.pointPolygonTest(contour, (x, y), False) == 1
+
+        zone_index[mask.astype(bool)] = zone_indx
+
+    return zone_index
+
+def get_zone_index(zones_file_path, zones, frame_width, frame_height):
+    """Return the cached zone index, rebuilding it only when the zones file or the frame size changes."""
+    key = (zones_file_path, frame_width, frame_height)
+    mtime = os.path.getmtime(zones_file_path)
+    cached = _zone_index_cache.get(key)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, build_zone_index(zones, frame_width, frame_height))
+        _zone_index_cache[key] = cached
+    return cached[1]
+
+def assign_boxes_to_zones(boxes, zones, zone_index):
+    """Return the zone index of every box center (-1 when outside all zones) with one batched gather."""
+    if len(boxes) == 0:
+        return np.empty(0, dtype=np.int16)
+
+    # Same truncation and integer center as the per-box path: int(x1 + x2) // 2
+    corners = boxes[:, :4].astype(np.int32)
+    center_x = (corners[:, 0] + corners[:, 2]) // 2
+    center_y = (corners[:, 1] + corners[:, 3]) // 2
+
+    frame_height, frame_width = zone_index.shape
+    inside = (center_x >= 0) & (center_x < frame_width) & (center_y >= 0) & (center_y < frame_height)
+    box_zones = np.full(len(boxes), -1, dtype=np.int16)
+    box_zones[inside] = zone_index[center_y[inside], center_x[inside]]
+
+    # Centers off the raster are rare, fall back to the exact polygon test for those
+    for idx in np.nonzero(~inside)[0]:
+        cls_center_pnt = (int(center_x[idx]), int(center_y[idx]))
+        for zone_indx, zone in enumerate(zones.values()):
+            if cv2.pointPolygonTest(np.array(zone, dtype=np.int32), cls_center_pnt, False) == 1:
+                box_zones[idx] = zone_indx
+                break
+    return box_zones
+
+def collect_vehicles_by_zone(boxes, box_zones, class_list, number_of_zones):
+    """Group the class names of the boxes by the zone they were assigned to, without drawing anything."""
+    collected_vehicle = init_list_of_collected_vehicle(number_of_zones)
+    for idx in np.nonzero(box_zones >= 0)[0]:
+        collected_vehicle[box_zones[idx]].append(class_list[int(boxes[idx, 5])])
+    return collected_vehicle
+
+def track_objects_in_zones(frame, boxes, class_list, zones, collected_vehicle, frame_name, zone_index=None):
+    if zone_index is not None:
+        box_zones = assign_boxes_to_zones(boxes, zones, zone_index)
+        for idx in np.nonzero(box_zones >= 0)[0]:
+            x1, y1, x2, y2, conf_score, cls = boxes[idx]
+            x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
+            cls_center_pnt = (int(x1 + x2) // 2, int(y1 + y2) // 2)
+            show_object_info(frame, x1, y1, x2, y2, cls, "%.2f" % conf_score, class_list, cls_center_pnt, frame_name)
+            collected_vehicle[box_zones[idx]].append(class_list[int(cls)])
+        return collected_vehicle
+
     for idx, box in enumerate(boxes):
         x1, y1, x2, y2, conf_score, cls = box
         x1, y1, x2, y2 = map(int, [x1, y1, x2, y2])
@@ -174,9 +262,30 @@ def init_list_of_collected_vehicle(number_of_zones):
     return collected_vehicle
 
 
-def load_model(weights_file_path):
+def load_model(weights_file_path, backend="ultralytics", imgsz=640, warmup_runs=0, frame_width=640, frame_height=640, threads=0):
+    """
+    Load the detector for the selected backend (ultralytics, onnx, onnx_int8, openvino or synthetic) and
+    warm it up so the first frames of the loop are not slow. threads > 0 caps the detector's CPU threads.
+    """
+    if backend.lower() == "synthetic":
+        # Boxes of the synthetic scene instead of a model, for stress tests; needs no weights
+        from stls_lib import synthetic
+        return synthetic.SyntheticDetector()
     check_exist_file(weights_file_path)
-    return YOLO(weights_file_path, "v11")
+    from stls_lib import detectors
+    if backend.lower() == "ultralytics":
+        # torch and ultralytics are only imported here, so other modes start without them
+        if threads > 0:
+            import torch
+            torch.set_num_threads(threads)
+        from ultralytics import YOLO
+        model = YOLO(detectors.export_model(weights_file_path, "fused"), "v11")
+    else:
+        model = detectors.load_detector(weights_file_path, backend, imgsz, threads)
+
+    if warmup_runs > 0:
+        detectors.warm_up(model, frame_width, frame_height, warmup_runs)
+    return model
 
 
 def load_class_names(class_names_file_path):
@@ -184,18 +293,55 @@ def load_class_names(class_names_file_path):
     return read_class_names(class_names_file_path)
 
 
+def is_live_source(video_source):
+    """Camera indices and network streams are live; anything else is treated as a file."""
+    if isinstance(video_source, int):
+        return True
+    return str(video_source).lower().startswith(("rtsp://", "rtmp://", "http://", "https://", "udp://", "tcp://"))
+
 def load_camera(video_source):
+    if str(video_source).startswith("synthetic://"):
+        from stls_lib import synthetic
+        return synthetic.open_capture(video_source)
     captured = cv2.VideoCapture(video_source)
     check_camera(captured)
+    if is_live_source(video_source):
+        captured.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short so reads return the newest frame
     return captured
 
+def fit_frame(frame, frame_width, frame_height):
+    """Resize to the processing size, skipping the resize when the frame already has it."""
+    if frame.shape[1] == frame_width and frame.shape[0] == frame_height:
+        return frame
+    return cv2.resize(frame, (frame_width, frame_height))
+
+def scale_boxes(boxes, scale_x, scale_y):
+    """Scale the box corners of an (N, 6) boxes array, leaving confidence and class untouched."""
+    boxes = np.array(boxes, dtype=np.float32)
+    boxes[:, [0, 2]] *= scale_x
+    boxes[:, [1, 3]] *= scale_y
+    return boxes
+
 def get_prediction_boxes(frame, yolo_model, confidence):
+    if hasattr(yolo_model, "detect"):  # Exported backends already return the boxes array
+        return yolo_model.detect([frame], confidence)[0]
     pred = yolo_model.predict(source=[frame], save=False, conf=confidence)
     results = pred[0]
     boxes = results.boxes.data.numpy()
     return boxes
 
 
+def get_prediction_boxes_batch(frames, yolo_model, confidence, imgsz=None):
+    """Run one batched predict call over several frames and return one boxes array per frame (imgsz overrides the ultralytics input size)."""
+    if hasattr(yolo_model, "detect"):
+        return yolo_model.detect(list(frames), confidence)
+    if imgsz:
+        pred = yolo_model.predict(source=list(frames), save=False, conf=confidence, imgsz=imgsz)
+    else:
+        pred = yolo_model.predict(source=list(frames), save=False, conf=confidence)
+    return [results.boxes.data.numpy() for results in pred]
+
+
 def show_frame(frame, frame_name, wait_key, ord_key):
     if frame_name.lower() == "off":
         return True
@@ -222,7 +368,7 @@ def extract_root_data(file_path: str):
             key = key.strip()
             value = value.strip()
             
-            if key == "mqtt_broker" or key == "SERVICE_UUID" or key == "CHARACTERISTIC_UUID" or key == "IP_ESP32_1" or key == "IP_ESP32_2":
+            if key == "mqtt_broker" or key == "SERVICE_UUID" or key == "CHARACTERISTIC_UUID" or key.startswith("IP_ESP32_"):
                 get_data[key] = value
             else:
                 # Try to convert to float or int if possible
@@ -238,6 +384,39 @@ def extract_root_data(file_path: str):
     return get_data
     
 
+def extract_sources(file_path: str):
+    """
+    Read the multi-source file: one block of "key: value" lines per curve, each block
+    starting with video_source and followed by its zones_file_path, firebase_path and
+    optionally the comma-separated controller addresses for communication_protocol 'udp'.
+    """
+    check_exist_file(file_path)
+    sources = []
+
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if ':' not in line or line.startswith('#'):
+                continue
+
+            key, value = line.split(":", 1)
+            key = key.strip()
+            value = value.strip()
+            if key == "video_source":
+                sources.append({"video_source": int(value) if value.isdigit() else value})
+            elif sources:
+                sources[-1][key] = value
+            else:
+                raise ValueError(f"Found '{key}' before any video_source in '{file_path}'.")
+
+    for indx, source in enumerate(sources):
+        if "zones_file_path" not in source:
+            raise ValueError(f"Source {indx} ({source['video_source']}) in '{file_path}' has no zones_file_path.")
+        source.setdefault("firebase_path", f"/zones/curve{indx}")
+        source["controllers"] = [address.strip() for address in source.get("controllers", "").split(",") if address.strip()]
+    return sources
+    
+
 def handle_zone_queuing(zone_index, collected_vehicle, current_time, zones_data, interval):
     zone = zones_data[zone_index]
 
@@ -268,12 +447,17 @@ def handle_zone_queuing(zone_index, collected_vehicle, current_time, zones_data,
         "current_time": f'{remaining_time:.2f}'
     }
 
-def traffic_light_display(frame, zone_index, is_zone_occupied, rect_color=(100, 100, 100), thickness=4, radius=15):
+def traffic_light_display(frame, zone_index, is_zone_occupied, rect_color=(100, 100, 100), thickness=4, radius=15, number_of_zones=2):
     # Get the frame dimensions
     frame_width = frame.shape[1]
     frame_height = frame.shape[0]
 
-    if zone_index == 0:
+    if number_of_zones > 2:
+        # Spread the lights evenly between the left and right positions of the two-zone layout
+        left_x, right_x = int(0.05 * frame_width), int(frame_width - 100)
+        top_left = (left_x + (right_x - left_x) * zone_index // (number_of_zones - 1), int(frame_height - 150))
+        bottom_right = (top_left[0] + 50, top_left[1] + 100)
+    elif zone_index == 0:
         top_left = (int(0.05 * frame_width), int(frame_height - 150))
         bottom_right = (top_left[0] + 50, top_left[1] + 100)
     else:
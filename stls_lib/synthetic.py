@@ -0,0 +1,393 @@
+import argparse
+import collections
+import os
+import time
+from urllib.parse import parse_qsl, urlparse
+import cv2
+import numpy as np
+from stls_lib import stls
+
+# Length and width of each class in lane heights, in the order of src/utils/class.names
+# (bus, car, microbus, motorbike, pickup-van, tricycle, truck); cycled for longer class lists
+CLASS_SHAPES = ((2.8, 0.85), (1.5, 0.7), (1.9, 0.75), (0.7, 0.35), (1.7, 0.7), (0.9, 0.5), (2.6, 0.85))
+DEFAULT_CLASS_WEIGHTS = (1, 6, 2, 3, 2, 1, 1)
+
+# The frame number is stamped into the top left corner as STAMP_BITS cells of STAMP_CELL pixels,
+# big enough to survive the resize to the processing size
+STAMP_BITS = 24
+STAMP_CELL = 8
+
+# Most recent frames whose detections a SyntheticDetector can still look up
+HISTORY_FRAMES = 256
+
+_active_scene = None
+
+
+class Scene:
+    """
+    Vehicles driving through the frame along horizontal lanes, alternating in direction. About
+    `vehicles` are on screen in the steady state; arrivals are Poisson, and every burst_interval
+    seconds the arrival rate rises by burst_factor for burst_seconds. step() advances one frame
+    (1 / fps seconds of scene time, independent of the wall clock) and sets the ground truth
+    boxes and the boxes a detector would report: each vehicle is missed with miss_rate, its
+    corners get jitter pixels of noise and its confidence is drawn from [0.5, 1.0).
+    The same seed always gives the same scene.
+    """
+    def __init__(self, frame_width=1280, frame_height=720, lanes=6, vehicles=20, number_of_classes=7, class_weights=DEFAULT_CLASS_WEIGHTS,
+                 speed_min=60.0, speed_max=240.0, burst_interval=0.0, burst_seconds=3.0, burst_factor=4.0, fps=30.0,
+                 miss_rate=0.0, jitter=0.0, seed=0):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.fps = fps
+        self.burst_interval = burst_interval
+        self.burst_seconds = burst_seconds
+        self.burst_factor = burst_factor
+        self.miss_rate = miss_rate
+        self.jitter = jitter
+        self.speed_range = (speed_min, speed_max)
+        self.rng = np.random.default_rng(seed)
+
+        self.lane_height = frame_height / lanes
+        self.lane_center = (np.arange(lanes) + 0.5) * self.lane_height
+        self.lane_direction = np.where(np.arange(lanes) % 2 == 0, 1.0, -1.0)
+        weights = np.resize(np.asarray(class_weights, dtype=np.float64), number_of_classes)
+        self.class_probabilities = weights / weights.sum()
+        self.shapes = np.array([CLASS_SHAPES[indx % len(CLASS_SHAPES)] for indx in range(number_of_classes)]) * self.lane_height
+        # Arrivals that keep `vehicles` on screen: each one stays frame_width / speed seconds, on average
+        # frame_width * ln(max / min) / (max - min) for uniformly drawn speeds
+        mean_stay = frame_width * (np.log(speed_max / speed_min) / (speed_max - speed_min) if speed_max > speed_min else 1.0 / speed_min)
+        self.arrival_rate = vehicles / mean_stay
+
+        # One entry per vehicle on screen (structure of arrays, like the zone state)
+        self.lane = np.empty(0, dtype=np.int64)
+        self.x = np.empty(0)
+        self.speed = np.empty(0)
+        self.class_id = np.empty(0, dtype=np.int64)
+        self.spawn(vehicles, anywhere=True)
+
+        self.frame_index = 0
+        self.time = 0.0
+        self.truth = self.ground_truth()
+        self.detected = self.truth
+        self.history = collections.OrderedDict()
+        self.background = None
+
+    def spawn(self, count, anywhere=False):
+        """Add count vehicles, at the entry edge of their lane or, with anywhere, across the frame."""
+        if count <= 0:
+            return
+        lane = self.rng.integers(0, len(self.lane_center), count)
+        class_id = self.rng.choice(len(self.class_probabilities), count, p=self.class_probabilities)
+        length = self.shapes[class_id, 0]
+        if anywhere:
+            x = self.rng.uniform(0, self.frame_width, count)
+        else:
+            x = np.where(self.lane_direction[lane] > 0, -length / 2, self.frame_width + length / 2)
+        self.lane = np.concatenate([self.lane, lane])
+        self.x = np.concatenate([self.x, x])
+        self.speed = np.concatenate([self.speed, self.rng.uniform(*self.speed_range, count)])
+        self.class_id = np.concatenate([self.class_id, class_id])
+
+    def in_burst(self):
+        return self.burst_interval > 0 and self.time % self.burst_interval < self.burst_seconds
+
+    def step(self):
+        """Advance one frame; returns the ground truth boxes of the new frame."""
+        dt = 1.0 / self.fps
+        self.time += dt
+        self.frame_index += 1
+        self.x += self.speed * self.lane_direction[self.lane] * dt
+
+        half_length = self.shapes[self.class_id, 0] / 2
+        on_screen = (self.x + half_length > 0) & (self.x - half_length < self.frame_width)
+        if not on_screen.all():
+            self.lane, self.x, self.speed, self.class_id = self.lane[on_screen], self.x[on_screen], self.speed[on_screen], self.class_id[on_screen]
+        rate = self.arrival_rate * (self.burst_factor if self.in_burst() else 1.0)
+        self.spawn(self.rng.poisson(rate * dt))
+
+        self.truth = self.ground_truth()
+        self.detected = self.detections(self.truth)
+        self.history[self.frame_index] = self.detected
+        if len(self.history) > HISTORY_FRAMES:
+            self.history.popitem(last=False)
+        return self.truth
+
+    def ground_truth(self):
+        """(N, 6) boxes of the vehicles on screen, clipped to the frame, with confidence 1."""
+        length, width = self.shapes[self.class_id, 0], self.shapes[self.class_id, 1]
+        y = self.lane_center[self.lane]
+        boxes = np.empty((len(self.x), 6), dtype=np.float32)
+        boxes[:, 0] = np.clip(self.x - length / 2, 0, self.frame_width - 1)
+        boxes[:, 1] = y - width / 2
+        boxes[:, 2] = np.clip(self.x + length / 2, 0, self.frame_width - 1)
+        boxes[:, 3] = y + width / 2
+        boxes[:, 4] = 1.0
+        boxes[:, 5] = self.class_id
+        return boxes
+
+    def detections(self, truth):
+        """What a detector would report for the ground truth boxes."""
+        boxes = truth[self.rng.random(len(truth)) >= self.miss_rate] if self.miss_rate > 0 else truth.copy()
+        if self.jitter > 0:
+            boxes[:, :4] += self.rng.normal(0, self.jitter, (len(boxes), 4))
+        boxes[:, 4] = self.rng.uniform(0.5, 1.0, len(boxes))
+        return boxes
+
+    def occupancy(self, zones, zone_index):
+        """Ground truth: which zones hold a vehicle in the current frame, by the pipeline's own assignment rule."""
+        occupied = np.zeros(len(zones), dtype=bool)
+        box_zones = stls.assign_boxes_to_zones(self.truth, zones, zone_index)
+        occupied[box_zones[box_zones >= 0]] = True
+        return occupied
+
+    def render(self, out=None):
+        """The current frame as a BGR image: class coloured vehicles on a road, with the frame number stamped in."""
+        if self.background is None:
+            self.background = np.full((self.frame_height, self.frame_width, 3), 100, dtype=np.uint8)
+            for lane in range(1, len(self.lane_center)):
+                y = int(lane * self.lane_height)
+                for x in range(0, self.frame_width, 60):
+                    cv2.line(self.background, (x, y), (x + 30, y), (220, 220, 220), 2)
+        frame = out if out is not None and out.shape == self.background.shape else np.empty_like(self.background)
+        np.copyto(frame, self.background)
+        for x1, y1, x2, y2, _, class_id in self.truth.astype(np.int32).tolist():
+            color = ((class_id * 67) % 256, (class_id * 131 + 80) % 256, (class_id * 29 + 160) % 256)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, -1)
+        stamp_frame_number(frame, self.frame_index)
+        return frame
+
+
+def stamp_frame_number(frame, frame_number):
+    frame[:STAMP_CELL, :STAMP_BITS * STAMP_CELL] = 0
+    for bit in range(STAMP_BITS):
+        if frame_number >> bit & 1:
+            frame[:STAMP_CELL, bit * STAMP_CELL:(bit + 1) * STAMP_CELL] = 255
+
+
+def read_frame_number(frame, scene_width, scene_height):
+    """The stamped frame number of a (possibly resized) synthetic frame; 0 for any other image."""
+    scale_x, scale_y = frame.shape[1] / scene_width, frame.shape[0] / scene_height
+    y = int(STAMP_CELL / 2 * scale_y)
+    xs = ((np.arange(STAMP_BITS) + 0.5) * STAMP_CELL * scale_x).astype(np.int32)
+    bits = frame[y, xs, 0] > 127
+    return int(np.dot(bits, 1 << np.arange(STAMP_BITS)))
+
+
+class SyntheticCapture:
+    """
+    cv2.VideoCapture stand-in that plays a Scene. grab() only advances the scene, so skipped
+    frames are never drawn; frames = 0 plays forever. Like a file, it is not paced to its fps.
+    """
+    def __init__(self, scene, frames=0):
+        self.scene = scene
+        self.frames = frames
+
+    def isOpened(self):
+        return True
+
+    def grab(self):
+        if self.frames and self.scene.frame_index >= self.frames:
+            return False
+        self.scene.step()
+        return True
+
+    def retrieve(self, image=None):
+        return True, self.scene.render(image)
+
+    def read(self):
+        if not self.grab():
+            return False, None
+        return self.retrieve()
+
+    def get(self, prop):
+        return {
+            cv2.CAP_PROP_FPS: self.scene.fps,
+            cv2.CAP_PROP_FRAME_WIDTH: self.scene.frame_width,
+            cv2.CAP_PROP_FRAME_HEIGHT: self.scene.frame_height,
+            cv2.CAP_PROP_FRAME_COUNT: self.frames,
+            cv2.CAP_PROP_POS_FRAMES: self.scene.frame_index
+        }.get(prop, 0.0)
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        pass
+
+
+def parse_source(video_source):
+    """Scene keyword arguments and the frame count of a synthetic://?vehicles=120&lanes=8&seconds=60 source."""
+    defaults = Scene.__init__.__defaults__
+    names = Scene.__init__.__code__.co_varnames[1:1 + len(defaults)]
+    types = dict(zip(names, (type(value) for value in defaults)))
+    scene_args, seconds = {}, 60.0
+    for key, value in parse_qsl(urlparse(str(video_source)).query):
+        if key == "seconds":
+            seconds = float(value)
+        elif key == "class_weights":
+            scene_args[key] = [float(weight) for weight in value.split(",")]
+        elif key in types:
+            scene_args[key] = types[key](float(value))
+        else:
+            raise ValueError(f"Unknown synthetic source parameter '{key}'; expected seconds or one of {', '.join(names)}.")
+    return scene_args, int(seconds * scene_args.get("fps", 30.0))
+
+
+def open_capture(video_source):
+    """Open a synthetic:// source; the scene becomes the one SyntheticDetector reports on."""
+    global _active_scene
+    scene_args, frames = parse_source(video_source)
+    _active_scene = Scene(**scene_args)
+    print(f"Synthetic source: {_active_scene.frame_width}x{_active_scene.frame_height}, {len(_active_scene.lane_center)} lanes, "
+          f"about {len(_active_scene.x)} vehicles, {frames or 'endless'} frames")
+    return SyntheticCapture(_active_scene, frames)
+
+
+class SyntheticDetector:
+    """
+    Detector stand-in that needs no model. On frames of a synthetic:// source it reads the
+    stamped frame number and returns that frame's detections, scaled to the frame it is given.
+    On any other footage it plays its own scene, one step per frame, so the boxes do not match
+    the pixels but the load downstream of the detector is the same.
+    """
+    def __init__(self, number_of_classes=7):
+        self.number_of_classes = number_of_classes
+        self.own_scene = None
+
+    def detect(self, frames, confidence):
+        return [self.detect_frame(frame, confidence) for frame in frames]
+
+    def detect_frame(self, frame, confidence):
+        scene = _active_scene
+        if scene is not None:
+            boxes = scene.history.get(read_frame_number(frame, scene.frame_width, scene.frame_height))
+            if boxes is None:
+                return np.zeros((0, 6), dtype=np.float32)
+        else:
+            if self.own_scene is None:
+                self.own_scene = Scene(frame.shape[1], frame.shape[0], number_of_classes=self.number_of_classes)
+            scene = self.own_scene
+            boxes = scene.detections(scene.step())
+        boxes = boxes[boxes[:, 4] >= confidence]
+        if frame.shape[1] != scene.frame_width or frame.shape[0] != scene.frame_height:
+            boxes = stls.scale_boxes(boxes, frame.shape[1] / scene.frame_width, frame.shape[0] / scene.frame_height)
+        return boxes
+
+
+def grid_zones(number_of_zones, frame_width, frame_height):
+    """Split the frame into a grid of rectangular zones."""
+    columns = int(np.ceil(np.sqrt(number_of_zones)))
+    rows = int(np.ceil(number_of_zones / columns))
+    cell_w, cell_h = frame_width // columns, frame_height // rows
+    zones = {}
+    for indx in range(number_of_zones):
+        x, y = (indx % columns) * cell_w, (indx // columns) * cell_h
+        zones[indx] = [(x + 2, y + 2), (x + cell_w - 2, y + 2), (x + cell_w - 2, y + cell_h - 2), (x + 2, y + cell_h - 2)]
+    return zones
+
+
+def write_zones_file(file_path, zones, frame_width, frame_height):
+    """Write zones in the same format as pc_write_points."""
+    with open(file_path, "w") as file:
+        file.write("zones: \n")
+        for zone_id, points in zones.items():
+            formatted_points = ', '.join([f"({x}, {y})" for x, y in points])
+            file.write(f"   {zone_id}: [{formatted_points}]\n")
+        file.write(f"\nnumber_of_zone: {len(zones)}\n")
+        file.write(f"frame_width: {frame_width}\n")
+        file.write(f"frame_height: {frame_height}\n")
+
+
+def timing(samples_ms):
+    values = np.asarray(samples_ms, dtype=np.float64)
+    return {"mean_ms": round(float(values.mean()), 4), "p95_ms": round(float(np.percentile(values, 95)), 4), "max_ms": round(float(values.max()), 4)}
+
+
+def stress(scene, zones, class_list, time_interval, frames, legacy=True):
+    """
+    Stream the scene's detections (no frames, no model) through zone assignment, the zone state
+    and the publisher for the given number of frames, timing every stage, and compare the zone
+    occupancy decided from the detections with the ground truth.
+    """
+    from stls_lib import detections, rtdb, zone_state
+
+    number_of_zones = len(zones)
+    zone_index = stls.build_zone_index(zones, scene.frame_width, scene.frame_height)
+    engine = zone_state.ZoneStateEngine(number_of_zones, time_interval, class_list, verbose=False)
+    ring = detections.DetectionRing()
+    publisher = rtdb.Publisher(rtdb.MemoryBackend())
+    zones_data = [{"countdown_start_time": 0.0, "refresh": False, "get_vehicle": 'none'} for _ in range(number_of_zones)]
+
+    samples = collections.defaultdict(list)
+    boxes_per_frame = []
+    agreement = 0
+    for _ in range(frames):
+        scene.step()
+        boxes = scene.detected
+        boxes_per_frame.append(len(boxes))
+        # The queuing logic reads a countdown start of 0.0 as "no countdown", so its clock must not start at 0
+        now = 1.0 + scene.time
+
+        t0 = time.perf_counter()
+        box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+        frame_detections = ring.fill(boxes, box_zones)
+        t1 = time.perf_counter()
+        changed = engine.step(frame_detections["class_id"], frame_detections["zone_id"], now)
+        t2 = time.perf_counter()
+        if len(changed):
+            publisher.publish(engine.vehicle_names())
+        t3 = time.perf_counter()
+        samples["zone_assignment"].append((t1 - t0) * 1000)
+        samples["zone_state"].append((t2 - t1) * 1000)
+        samples["publish"].append((t3 - t2) * 1000)
+
+        if legacy:
+            t4 = time.perf_counter()
+            collected_vehicle = stls.track_objects_in_zones(None, boxes, class_list, zones, stls.init_list_of_collected_vehicle(number_of_zones), "off", zone_index)
+            for indx in range(number_of_zones):
+                stls.handle_zone_queuing(indx, collected_vehicle, now, zones_data, time_interval)
+            samples["legacy_track_and_queue"].append((time.perf_counter() - t4) * 1000)
+
+        agreement += int(np.count_nonzero(engine.occupied == scene.occupancy(zones, zone_index)))
+
+    publisher.stop()
+    return {
+        "frames": frames,
+        "zones": number_of_zones,
+        "boxes_per_frame_mean": round(float(np.mean(boxes_per_frame)), 1),
+        "boxes_per_frame_max": int(np.max(boxes_per_frame)),
+        "occupancy_agreement": round(agreement / (frames * number_of_zones), 4),
+        "stages": {stage: timing(stage_samples) for stage, stage_samples in samples.items()},
+        "publisher": publisher.stats()
+    }
+
+
+if __name__ == "__main__":
+    # python -m stls_lib.synthetic --zones 8 --vehicles 150 --frames 3000 --miss-rate 0.05 --jitter 2
+    parser = argparse.ArgumentParser(description="Stress the zone logic with a synthetic traffic scene, no model or video needed.")
+    parser.add_argument("--zones", type=int, default=8)
+    parser.add_argument("--vehicles", type=int, default=120, help="vehicles on screen in the steady state")
+    parser.add_argument("--lanes", type=int, default=8)
+    parser.add_argument("--frames", type=int, default=3000)
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--width", type=int, default=1280)
+    parser.add_argument("--height", type=int, default=720)
+    parser.add_argument("--burst-interval", type=float, default=0.0, help="seconds between arrival bursts (0 = none)")
+    parser.add_argument("--burst-factor", type=float, default=4.0)
+    parser.add_argument("--miss-rate", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0, help="pixels of noise on the box corners")
+    parser.add_argument("--time-interval", type=float, default=3.0)
+    parser.add_argument("--class-list", default="src/utils/class.names")
+    parser.add_argument("--write-zones", default="", help="also write the zone grid to this file, for use as zones_file_path")
+    parser.add_argument("--no-legacy", action="store_true", help="skip timing track_objects_in_zones and handle_zone_queuing")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    class_list = stls.load_class_names(args.class_list) if os.path.exists(args.class_list) else [f"class_{indx}" for indx in range(7)]
+    scene = Scene(args.width, args.height, args.lanes, args.vehicles, len(class_list), fps=args.fps, burst_interval=args.burst_interval,
+                  burst_factor=args.burst_factor, miss_rate=args.miss_rate, jitter=args.jitter, seed=args.seed)
+    zones = grid_zones(args.zones, args.width, args.height)
+    if args.write_zones:
+        write_zones_file(args.write_zones, zones, args.width, args.height)
+        print(f"Zones written to: {args.write_zones}")
+    stls.print_data(stress(scene, zones, class_list, args.time_interval, args.frames, not args.no_legacy))
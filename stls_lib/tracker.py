@@ -0,0 +1,178 @@
+import numpy as np
+
+# Constant-velocity Kalman model in SORT's state space:
+# state [cx, cy, area, aspect, vx, vy, v_area], measurement [cx, cy, area, aspect]
+_F = np.eye(7)
+_F[0, 4] = _F[1, 5] = _F[2, 6] = 1.0
+_H = np.eye(4, 7)
+_R = np.diag([1.0, 1.0, 10.0, 10.0])
+_Q = np.diag([1.0, 1.0, 1.0, 1.0, 0.01, 0.01, 0.0001])
+_P0 = np.diag([10.0, 10.0, 10.0, 10.0, 10000.0, 10000.0, 10000.0])
+
+
+def boxes_to_measurements(boxes):
+    w = np.maximum(boxes[:, 2] - boxes[:, 0], 1e-3)
+    h = np.maximum(boxes[:, 3] - boxes[:, 1], 1e-3)
+    return np.stack([boxes[:, 0] + w / 2, boxes[:, 1] + h / 2, w * h, w / h], axis=1)
+
+
+def states_to_boxes(states):
+    area = np.maximum(states[:, 2], 1e-3)
+    aspect = np.maximum(states[:, 3], 1e-3)
+    w = np.sqrt(area * aspect)
+    h = area / w
+    return np.stack([states[:, 0] - w / 2, states[:, 1] - h / 2, states[:, 0] + w / 2, states[:, 1] + h / 2], axis=1)
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU between (N, 4) and (M, 4) corner boxes."""
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def greedy_match(iou, threshold):
+    """Match pairs by descending IoU; returns (track_indices, detection_indices)."""
+    if iou.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    candidates = np.argwhere(iou >= threshold)
+    order = np.argsort(-iou[candidates[:, 0], candidates[:, 1]])
+    used_tracks, used_detections = set(), set()
+    tracks, detections = [], []
+    for t, d in candidates[order]:
+        if t in used_tracks or d in used_detections:
+            continue
+        used_tracks.add(t)
+        used_detections.add(d)
+        tracks.append(t)
+        detections.append(d)
+    return np.array(tracks, dtype=np.int64), np.array(detections, dtype=np.int64)
+
+
+class Tracker:
+    """
+    Lightweight SORT-style multi-object tracker in plain NumPy.
+
+    Detection only needs to run on keyframes: every keyframe_interval frames, or sooner when a
+    track becomes uncertain: it went unmatched on the last detection run, or the Kalman spread of
+    its predicted centre exceeds max_uncertainty times its box size (a new track, whose velocity is
+    still unknown, does so on the next frame). In between, tracks are propagated by their Kalman
+    motion model. Output rows keep the boxes layout (x1, y1, x2, y2, conf, cls) with the persistent
+    track id appended, oldest track first; tracks coasting after a missed detection are held back,
+    so a vehicle that has left does not keep its zone occupied.
+    """
+    def __init__(self, keyframe_interval=3, max_uncertainty=0.5, iou_threshold=0.3, max_missed=2, confidence_decay=0.85):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.max_uncertainty = max_uncertainty
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.confidence_decay = confidence_decay
+
+        self.states = np.zeros((0, 7))
+        self.covariances = np.zeros((0, 7, 7))
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.classes = np.zeros(0, dtype=np.float32)
+        self.confidences = np.zeros(0, dtype=np.float32)
+        self.missed = np.zeros(0, dtype=np.int64)
+
+        self.next_id = 0
+        self.frames_since_detection = self.keyframe_interval
+        self.detections_run = 0
+        self.frames_tracked = 0
+        self.early_keyframes = 0
+
+    def needs_detection(self):
+        if self.frames_since_detection >= self.keyframe_interval:
+            return True
+        if (self.missed > 0).any() or (self.uncertainty() > self.max_uncertainty).any():
+            self.early_keyframes += 1
+            return True
+        return False
+
+    def uncertainty(self):
+        """Spread (standard deviation) of each track's centre after the next prediction, relative to its box size."""
+        P = _F @ self.covariances @ _F.T + _Q
+        return np.sqrt(P[:, 0, 0] + P[:, 1, 1]) / np.sqrt(np.maximum(self.states[:, 2], 1e-3))
+
+    def predict(self):
+        self.states = self.states @ _F.T
+        # Keep the area from going negative when a shrinking track coasts
+        self.states[:, 2] = np.maximum(self.states[:, 2], 1e-3)
+        self.covariances = _F @ self.covariances @ _F.T + _Q
+
+    def propagate(self):
+        """Advance every track one frame without a detection."""
+        self.frames_tracked += 1
+        self.frames_since_detection += 1
+        self.predict()
+        self.confidences = self.confidences * self.confidence_decay
+        return self.output()
+
+    def update(self, boxes):
+        """Advance one frame and correct the tracks with this frame's detections."""
+        self.frames_tracked += 1
+        self.detections_run += 1
+        self.frames_since_detection = 0
+        self.predict()
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 6)
+        track_idx, det_idx = greedy_match(iou_matrix(states_to_boxes(self.states), boxes[:, :4]), self.iou_threshold)
+
+        if len(track_idx):
+            # Batched Kalman correction of the matched tracks
+            P = self.covariances[track_idx]
+            S = _H @ P @ _H.T + _R
+            K = P @ _H.T @ np.linalg.inv(S)
+            innovation = boxes_to_measurements(boxes[det_idx, :4]) - self.states[track_idx] @ _H.T
+            self.states[track_idx] += np.einsum('nij,nj->ni', K, innovation)
+            self.covariances[track_idx] = (np.eye(7) - K @ _H) @ P
+            self.classes[track_idx] = boxes[det_idx, 5]
+            self.confidences[track_idx] = boxes[det_idx, 4]
+
+        matched = np.zeros(len(self.ids), dtype=bool)
+        matched[track_idx] = True
+        self.missed[matched] = 0
+        self.missed[~matched] += 1
+
+        # Drop tracks that missed too many detection runs, then start tracks for unmatched detections
+        alive = self.missed <= self.max_missed
+        self.states, self.covariances = self.states[alive], self.covariances[alive]
+        self.ids, self.classes = self.ids[alive], self.classes[alive]
+        self.confidences, self.missed = self.confidences[alive], self.missed[alive]
+
+        new = np.setdiff1d(np.arange(len(boxes)), det_idx)
+        if len(new):
+            states = np.zeros((len(new), 7))
+            states[:, :4] = boxes_to_measurements(boxes[new, :4])
+            self.states = np.concatenate([self.states, states])
+            self.covariances = np.concatenate([self.covariances, np.repeat(_P0[None], len(new), axis=0)])
+            self.ids = np.concatenate([self.ids, np.arange(self.next_id, self.next_id + len(new))])
+            self.classes = np.concatenate([self.classes, boxes[new, 5]])
+            self.confidences = np.concatenate([self.confidences, boxes[new, 4]])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new), dtype=np.int64)])
+            self.next_id += len(new)
+        return self.output()
+
+    def output(self):
+        """Tracks matched on the last detection run; coasting ones stay internal until they match again or are dropped."""
+        confirmed = self.missed == 0
+        tracks = np.empty((int(confirmed.sum()), 7), dtype=np.float32)
+        tracks[:, :4] = states_to_boxes(self.states[confirmed])
+        tracks[:, 4] = self.confidences[confirmed]
+        tracks[:, 5] = self.classes[confirmed]
+        tracks[:, 6] = self.ids[confirmed]
+        return tracks  # Track ids only grow, so rows are already oldest first
+
+    def stats(self):
+        return {
+            "frames_tracked": self.frames_tracked,
+            "detections_run": self.detections_run,
+            "early_keyframes": self.early_keyframes,
+            "active_tracks": len(self.ids),
+            "next_id": self.next_id
+        }
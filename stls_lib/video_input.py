@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+from stls_lib import stls
+
+INTERPOLATIONS = {"linear": cv2.INTER_LINEAR, "area": cv2.INTER_AREA, "nearest": cv2.INTER_NEAREST}
+
+
+def has_gstreamer():
+    return any("GStreamer" in line and "YES" in line for line in cv2.getBuildInformation().splitlines())
+
+
+def gstreamer_pipeline(video_source, frame_width, frame_height):
+    """Decode and scale inside GStreamer, so only frame-sized BGR images reach Python."""
+    return (f"rtspsrc location={video_source} latency=0 ! decodebin ! videoscale ! "
+            f"video/x-raw,width={frame_width},height={frame_height} ! videoconvert ! video/x-raw,format=BGR ! "
+            f"appsink drop=true max-buffers=1 sync=false")
+
+
+class VideoInput:
+    """
+    Frame source for files, cameras and streams that only pays for the frames it keeps.
+
+    grab() advances the source without converting the frame; retrieve() converts and resizes
+    only the frames chosen for processing. Retrieved and resized frames go into preallocated
+    rings of buffers, so steady-state reading allocates nothing; pool_size must exceed the
+    number of frames in flight. With decode_scale on, the frame size is reduced before it
+    reaches Python where the backend allows it: cameras are asked for the processing size and
+    RTSP streams are scaled inside GStreamer when OpenCV is built with it. With hw_decode on,
+    files and streams are decoded by the GPU/VAAPI through FFmpeg when available (OpenCV's
+    FFmpeg backend decodes in grab() too, so this is what makes skipped frames cheap).
+    """
+    def __init__(self, video_source, frame_width, frame_height, decode_scale="off", interpolation="linear", pool_size=8, hw_decode="off"):
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.live = stls.is_live_source(video_source)
+        self.interpolation = INTERPOLATIONS.get(interpolation.lower(), cv2.INTER_LINEAR)
+        self.decoder_scaled = False
+
+        decode_scale = decode_scale.lower() == "on"
+        if decode_scale and str(video_source).lower().startswith("rtsp://") and has_gstreamer():
+            self.captured = cv2.VideoCapture(gstreamer_pipeline(video_source, frame_width, frame_height), cv2.CAP_GSTREAMER)
+            stls.check_camera(self.captured)
+            self.decoder_scaled = True
+        elif hw_decode.lower() == "on" and not isinstance(video_source, int) and not str(video_source).startswith("synthetic://"):
+            self.captured = cv2.VideoCapture(video_source, cv2.CAP_FFMPEG, [cv2.CAP_PROP_HW_ACCELERATION, cv2.VIDEO_ACCELERATION_ANY])
+            stls.check_camera(self.captured)
+            if self.live:
+                self.captured.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            print(f"Hardware decoding: {'on' if self.captured.get(cv2.CAP_PROP_HW_ACCELERATION) > 0 else 'not available, using software'}")
+        else:
+            self.captured = stls.load_camera(video_source)
+            if decode_scale and isinstance(video_source, int):
+                # Ask the camera for the processing size; it picks the closest mode it supports
+                self.captured.set(cv2.CAP_PROP_FRAME_WIDTH, frame_width)
+                self.captured.set(cv2.CAP_PROP_FRAME_HEIGHT, frame_height)
+
+        self.pool_size = pool_size
+        self.source_pool = None
+        self.frame_pool = np.empty((pool_size, frame_height, frame_width, 3), dtype=np.uint8)
+        self.next_slot = 0
+        self.grabbed = 0
+        self.retrieved = 0
+        print(f"Video input: {int(self.captured.get(cv2.CAP_PROP_FRAME_WIDTH))}x{int(self.captured.get(cv2.CAP_PROP_FRAME_HEIGHT))} "
+              f"decoded{' (scaled in GStreamer)' if self.decoder_scaled else ''}, processing at {frame_width}x{frame_height}")
+
+    def get(self, prop):
+        return self.captured.get(prop)
+
+    def grab(self):
+        """Advance to the next frame without converting it; False at the end of the source."""
+        success = self.captured.grab()
+        if success:
+            self.grabbed += 1
+        return success
+
+    def retrieve(self, resize=True):
+        """
+        Convert the last grabbed frame into the next pool slot. With resize it comes back at the
+        processing size, otherwise at the decoded size. Returns None when the frame cannot be read.
+        """
+        slot = self.next_slot
+        self.next_slot = (self.next_slot + 1) % self.pool_size
+
+        if self.source_pool is None:
+            success, frame = self.captured.retrieve()
+            if not success:
+                return None
+            self.source_pool = np.empty((self.pool_size,) + frame.shape, dtype=np.uint8)
+            np.copyto(self.source_pool[slot], frame)
+        else:
+            success, frame = self.captured.retrieve(self.source_pool[slot])
+            if not success:
+                return None
+            if frame.shape != self.source_pool.shape[1:]:
+                self.source_pool = None  # The stream changed resolution; reallocate on the next frame
+        frame = frame if self.source_pool is None else self.source_pool[slot]
+        self.retrieved += 1
+
+        if not resize or frame.shape == self.frame_pool.shape[1:]:
+            return frame
+        cv2.resize(frame, (self.frame_width, self.frame_height), dst=self.frame_pool[slot], interpolation=self.interpolation)
+        return self.frame_pool[slot]
+
+    def read(self):
+        """grab() and retrieve() in one call, for loops that keep every frame."""
+        if not self.grab():
+            return False, None
+        frame = self.retrieve()
+        return frame is not None, frame
+
+    def stats(self):
+        return {
+            "frames_grabbed": self.grabbed,
+            "frames_retrieved": self.retrieved,
+            "frames_grabbed_only": self.grabbed - self.retrieved
+        }
+
+    def release(self):
+        self.captured.release()
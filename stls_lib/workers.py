@@ -0,0 +1,183 @@
+import multiprocessing as mp
+import queue
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+
+class FrameRing:
+    """A fixed number of frame slots in one shared memory block, viewed as a (slots, H, W, 3) array."""
+    def __init__(self, slots, frame_shape, name=None):
+        self.owner = name is None
+        size = slots * int(np.prod(frame_shape))
+        # Spawned workers share the creator's resource tracker, so attaching does not add a second owner
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size)
+        self.frames = np.ndarray((slots,) + tuple(frame_shape), dtype=np.uint8, buffer=self.shm.buf)
+
+    def close(self):
+        self.frames = None  # Views must be gone before the block can be closed
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+def _worker(ring_name, slots, frame_shape, model_args, detect_sensitivity, rois, tasks, results):
+    """Worker process: load its own model, then detect on the ring slots named by the tasks."""
+    import cv2
+    from stls_lib import stls, roi
+
+    cv2.setNumThreads(1)
+    ring = FrameRing(slots, frame_shape, ring_name)
+    frame_height, frame_width = frame_shape[:2]
+    try:
+        model = stls.load_model(*model_args)
+        results.put(("ready", None, None, 0.0))
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot = task
+            start = time.perf_counter()
+            try:
+                frame = ring.frames[slot]
+                if rois:
+                    boxes = roi.detect_in_rois(frame, rois, model, detect_sensitivity, frame_width, frame_height)
+                else:
+                    boxes = stls.get_prediction_boxes(frame, model, detect_sensitivity)
+                results.put((seq, slot, np.asarray(boxes, dtype=np.float32).reshape(-1, 6), time.perf_counter() - start))
+            except Exception as e:
+                results.put((seq, slot, e, 0.0))
+    except Exception as e:
+        results.put(("failed", None, e, 0.0))
+    finally:
+        ring.close()
+
+
+class InferencePool:
+    """
+    Detection in N worker processes, each with its own model.
+
+    submit() resizes the frame straight into a free slot of a shared memory ring and sends
+    only (seq, slot) to the workers, so frames are never pickled; the boxes come back through
+    a result queue and next_result() hands the items out again in frame order. The frame of
+    an item lives in its slot until release(), so rendering needs no copy either.
+    """
+    def __init__(self, workers, frame_width, frame_height, model_args, detect_sensitivity, rois=None, slots=0):
+        context = mp.get_context("spawn")  # Forking a process that already runs threads and a model is unsafe
+        self.workers = workers
+        self.frame_shape = (frame_height, frame_width, 3)
+        slots = slots or workers * 2 + 2
+        self.ring = FrameRing(slots, self.frame_shape)
+        self.free_slots = queue.Queue()
+        for slot in range(slots):
+            self.free_slots.put(slot)
+
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.pending = {}
+        self.done = {}
+        self.next_seq = 0
+        self.next_out = 0
+
+        self.processes = [
+            context.Process(target=_worker, args=(self.ring.shm.name, slots, self.frame_shape, model_args, detect_sensitivity, rois, self.tasks, self.results),
+                            name=f"stls-inference-{indx}", daemon=True)
+            for indx in range(workers)
+        ]
+        for process in self.processes:
+            process.start()
+        for _ in range(workers):
+            status, _, error, _ = self.results.get()
+            if status != "ready":
+                self.close()
+                raise RuntimeError(f"Inference worker failed to start: {error}")
+        print(f"Inference pool: {workers} worker processes, {slots} shared frame slots")
+
+    def submit(self, item, stop_event=None):
+        """Copy the item's frame into a free slot and queue it; waits while every slot is in flight."""
+        while True:
+            try:
+                slot = self.free_slots.get(timeout=0.1)
+                break
+            except queue.Empty:
+                if stop_event is not None and stop_event.is_set():
+                    return False
+
+        target = self.ring.frames[slot]
+        frame = item["frame"]
+        if frame.shape == self.frame_shape:
+            np.copyto(target, frame)
+        else:
+            import cv2
+            cv2.resize(frame, (self.frame_shape[1], self.frame_shape[0]), dst=target)
+        item["frame"] = target
+        item["slot"] = slot
+
+        seq = self.next_seq
+        self.pending[seq] = item
+        self.next_seq += 1
+        self.tasks.put((seq, slot))
+        return True
+
+    def next_result(self, timeout=0.1):
+        """
+        The next item in frame order with its "detected_boxes"; raises queue.Empty on timeout.
+        A worker that died takes its frame with it, so that raises RuntimeError instead of waiting forever.
+        """
+        while self.next_out not in self.done:
+            try:
+                seq, _, boxes, elapsed = self.results.get(timeout=timeout)
+            except queue.Empty:
+                self.check_workers()
+                raise
+            if isinstance(boxes, Exception):
+                raise boxes
+            self.done[seq] = (boxes, elapsed)
+
+        boxes, elapsed = self.done.pop(self.next_out)
+        item = self.pending.pop(self.next_out)
+        self.next_out += 1
+        item["detected_boxes"] = boxes
+        # With N workers in parallel, each frame costs the loop 1/N of a detection
+        item["detect_time"] = elapsed / self.workers
+        return item
+
+    def check_workers(self):
+        """Raise RuntimeError if a worker process has exited."""
+        for process in self.processes:
+            if not process.is_alive():
+                raise RuntimeError(f"Inference worker {process.name} exited with code {process.exitcode}; frame {self.next_out} is lost.")
+
+    def release(self, item):
+        """Give the item's slot back once the frame is no longer needed."""
+        self.free_slots.put(item.pop("slot"))
+
+    def in_flight(self):
+        return self.next_seq - self.next_out
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self.ring.close()
+
+
+def export_once(weights_file_path, detector_backend, detector_imgsz):
+    """Export (or quantize) the model in the parent, so worker processes only load the cached file and never race on it."""
+    if detector_backend.lower() == "onnx_int8":
+        from stls_lib import quantize
+        quantize.quantized_model(weights_file_path, detector_imgsz)
+    elif detector_backend.lower() != "ultralytics":
+        from stls_lib import detectors
+        detectors.export_model(weights_file_path, detector_backend.lower(), detector_imgsz)
+
+
+def start_pool(workers, weights_file_path, detector_backend, detector_imgsz, warmup_runs, frame_width, frame_height, detect_sensitivity, rois=None):
+    """Export the model once, then start the pool."""
+    export_once(weights_file_path, detector_backend, detector_imgsz)
+    # One detector thread per worker; the parallelism comes from the processes
+    model_args = (weights_file_path, detector_backend, detector_imgsz, warmup_runs, frame_width, frame_height, 1)
+    return InferencePool(workers, frame_width, frame_height, model_args, detect_sensitivity, rois)
@@ -0,0 +1,88 @@
+import numpy as np
+
+NO_VEHICLE = -1
+
+class ZoneStateEngine:
+    """
+    Array-backed queuing state for any number of zones.
+
+    Countdown start times, refresh flags and the current vehicle class id of every zone live in
+    preallocated NumPy arrays and are updated for all zones in one vectorized step, with the
+    same rules as handle_zone_queuing: a zone that sees vehicles starts a countdown and holds
+    its first vehicle; when the countdown ends the zone takes the current first vehicle if more
+    than one is present, otherwise 'none'. step() works on integer class and zone ids (the
+    fields of a detections buffer) and update() on a boxes array; both return only the zones
+    whose vehicle changed. Names are only resolved when publishing or rendering.
+    """
+    def __init__(self, number_of_zones, interval, class_list, verbose=True):
+        self.number_of_zones = number_of_zones
+        self.interval = interval
+        self.class_list = class_list
+        self.verbose = verbose
+
+        self.countdown_start_time = np.zeros(number_of_zones, dtype=np.float64)
+        self.refresh = np.zeros(number_of_zones, dtype=bool)
+        self.vehicle = np.full(number_of_zones, NO_VEHICLE, dtype=np.int16)
+        self.counts = np.zeros(number_of_zones, dtype=np.int32)
+        self.first_class = np.full(number_of_zones, NO_VEHICLE, dtype=np.int16)
+        self.occupied = np.zeros(number_of_zones, dtype=bool)
+        self.detections = np.zeros(number_of_zones, dtype=np.int64)  # Running total of boxes seen per zone
+        self.transitions = 0
+
+    def observe(self, class_ids, zone_ids):
+        """Count the detections per zone and find the class of the first detection in each zone."""
+        in_zone = zone_ids >= 0
+        zone_ids = zone_ids[in_zone].astype(np.int64)
+        self.counts[:] = np.bincount(zone_ids, minlength=self.number_of_zones)[:self.number_of_zones]
+        self.first_class[:] = NO_VEHICLE
+        if len(zone_ids):
+            unique_zones, first_positions = np.unique(zone_ids, return_index=True)
+            self.first_class[unique_zones] = class_ids[in_zone][first_positions]
+        np.greater(self.counts, 0, out=self.occupied)
+        self.detections += self.counts
+
+    def update(self, boxes, box_zones, current_time):
+        """Advance every zone one frame from an (N, 6) boxes array and its zone ids."""
+        return self.step(boxes[:, 5], box_zones, current_time)
+
+    def step(self, class_ids, zone_ids, current_time):
+        """Advance every zone one frame; returns the indices of the zones whose vehicle changed."""
+        self.observe(class_ids, zone_ids)
+        previous = self.vehicle.copy()
+
+        # Start the countdown where it is not already refreshing and the zone has vehicles
+        start = ~self.refresh & self.occupied
+        self.refresh[start] = True
+        self.countdown_start_time[start] = current_time
+        self.vehicle[start] = self.first_class[start]
+
+        # Complete the countdowns that have elapsed
+        active = self.refresh & (self.countdown_start_time != 0.0)
+        done = active & (current_time - self.countdown_start_time >= self.interval)
+        if done.any():
+            if self.verbose:
+                for zone_index in np.nonzero(done)[0]:
+                    print(f"Countdown complete for Zone {zone_index}!")
+            self.refresh[done] = False
+            self.countdown_start_time[done] = 0.0
+            self.vehicle[done] = np.where(self.counts[done] > 1, self.first_class[done], NO_VEHICLE)
+
+        changed = np.nonzero(self.vehicle != previous)[0]
+        self.transitions += len(changed)
+        return changed
+
+    def vehicle_name(self, zone_index):
+        class_id = int(self.vehicle[zone_index])
+        return 'none' if class_id == NO_VEHICLE else self.class_list[class_id]
+
+    def vehicle_names(self):
+        """Per-zone vehicle names, resolved only when publishing or rendering."""
+        return [self.vehicle_name(zone_index) for zone_index in range(self.number_of_zones)]
+
+    def queuing_data(self, current_time):
+        """The per-zone dicts handle_zone_queuing used to return, for display."""
+        remaining = np.where(self.countdown_start_time != 0.0, np.round(current_time - self.countdown_start_time, 2), 0.0)
+        return [
+            {"zone_index": zone_index, "vehicle": self.vehicle_name(zone_index), "current_time": f'{remaining[zone_index]:.2f}'}
+            for zone_index in range(self.number_of_zones)
+        ]
@@ -0,0 +1,76 @@
+import threading
+import unittest
+from stls_lib import actuation
+
+CLASS_LIST = ["car", "bus"]
+
+
+class UdpLoopbackTest(unittest.TestCase):
+    def start_controller(self, drop_every=0):
+        controller = actuation.LoopbackController(0, drop_every=drop_every)
+        stop_event = threading.Event()
+
+        def serve():
+            while not stop_event.is_set():
+                controller.poll(0.01)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+
+        def stop():
+            stop_event.set()
+            thread.join(timeout=1.0)
+            controller.close()
+        self.addCleanup(stop)
+        return controller
+
+    def test_state_is_applied_and_acked(self):
+        controller = self.start_controller()
+        backend = actuation.UdpBackend([controller.address], CLASS_LIST, ack_timeout=0.5)
+        backend.send(backend.encode(["car"]))
+        backend.send(backend.encode(["none"]))
+        self.assertEqual(controller.applied, [1, actuation.NO_VEHICLE])
+        self.assertEqual(backend.acked, {controller.address})
+
+    def test_lost_message_times_out_and_retransmit_applies_once(self):
+        controller = self.start_controller(drop_every=3)
+        backend = actuation.UdpBackend([controller.address], CLASS_LIST, ack_timeout=0.2)
+        backend.send(backend.encode(["car"]))
+        backend.send(backend.encode(["bus"]))
+
+        message = backend.encode(["none"])
+        with self.assertRaises(TimeoutError):
+            backend.send(message)  # Dropped by the controller, so no ack
+        backend.send(message)  # The Publisher's retry: same bytes, same seq
+        backend.send(message)  # A refresh of an acked seq is acked but not applied again
+        self.assertEqual(controller.applied, [1, 2, actuation.NO_VEHICLE])
+
+    def test_stale_seq_is_acked_but_not_applied(self):
+        controller = self.start_controller()
+        backend = actuation.UdpBackend([controller.address], CLASS_LIST, ack_timeout=0.5)
+        old = backend.encode(["car"])
+        backend.send(backend.encode(["bus"]))
+        backend.send(old)  # Arrives late: the controller acks it so the sender stops, but keeps the newer state
+        self.assertEqual(controller.applied, [2])
+
+    def test_seq_wrap_keeps_being_applied(self):
+        controller = self.start_controller()
+        backend = actuation.UdpBackend([controller.address], CLASS_LIST, ack_timeout=0.5)
+        backend.seq = 0xFFFFFFFE  # A new session may start at any seq
+        backend.send(backend.encode(["car"]))
+        backend.send(backend.encode(["none"]))
+        backend.send(backend.encode(["bus"]))
+        self.assertEqual(backend.seq, 2)  # 0xFFFFFFFF, then 1 and 2
+        self.assertEqual(controller.applied, [1, actuation.NO_VEHICLE, 2])
+
+    def test_seq_newer(self):
+        self.assertTrue(actuation.seq_newer(2, 1))
+        self.assertFalse(actuation.seq_newer(1, 1))
+        self.assertFalse(actuation.seq_newer(1, 2))
+        self.assertTrue(actuation.seq_newer(1, 0xFFFFFFFF))
+        self.assertFalse(actuation.seq_newer(0xFFFFFFFF, 1))
+        self.assertEqual(actuation.next_seq(0xFFFFFFFF), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+import threading
+import time
+import unittest
+from stls_lib import actuation, hub, rtdb
+
+CLASS_LIST = ["car", "bus"]
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class HubTest(unittest.TestCase):
+    def setUp(self):
+        # Node 1 drives a controller that loses every second message; its zone 1 also shows in zone 0 of node 2
+        self.controller = actuation.LoopbackController(0, drop_every=2)
+        self.controller_stop = threading.Event()
+        self.controller_thread = threading.Thread(target=self.serve_controller, daemon=True)
+        self.controller_thread.start()
+
+        nodes = [hub.Node(1, controllers=[self.controller.address], links=[(1, 2, 0)]), hub.Node(2)]
+        self.firebase = rtdb.Publisher(rtdb.MultiPathBackend("memory"), formatter=dict)
+        self.hub = hub.Hub(CLASS_LIST, port=0, host="127.0.0.1", nodes=nodes, interval=0.01, firebase=self.firebase,
+                           firebase_interval=0.02, ack_timeout=0.02, max_delay=0.05)
+        self.hub_thread = threading.Thread(target=self.hub.serve, daemon=True)
+        self.hub_thread.start()
+
+    def tearDown(self):
+        self.hub.stop()
+        self.hub_thread.join(timeout=2.0)
+        self.hub.close()
+        self.firebase.stop()
+        self.controller_stop.set()
+        self.controller_thread.join(timeout=1.0)
+        self.controller.close()
+
+    def serve_controller(self):
+        while not self.controller_stop.is_set():
+            self.controller.poll(0.01)
+
+    def firebase_state(self, node_id):
+        latest = self.firebase.backend.stand_in.latest or {}
+        return latest.get(f"/zones/node{node_id}/z0-z1")
+
+    def test_deltas_over_udp_and_tcp_reach_controllers_and_firebase(self):
+        node1 = actuation.HubBackend(self.hub.address, 1, CLASS_LIST, "udp")
+        node2 = actuation.HubBackend(self.hub.address, 2, CLASS_LIST, "tcp")
+        try:
+            node1.send([1, 0])  # First report: full state, base seq 0
+            node2.send([0, 0])
+            self.assertTrue(wait_for(lambda: self.firebase_state(1) == "car&none"))
+            self.assertTrue(wait_for(lambda: self.controller.applied[-1:] == [1]))
+
+            node1.send([1, 2])  # Delta with only zone 1; it also fills the empty zone 0 of node 2
+            self.assertTrue(wait_for(lambda: self.firebase_state(1) == "car&bus"))
+            self.assertTrue(wait_for(lambda: self.firebase_state(2) == "bus&none"))
+            node2.send([1, 0])  # Node 2's own vehicle wins over the linked one
+            self.assertTrue(wait_for(lambda: self.firebase_state(2) == "car&none"))
+
+            # Both outputs of node 1 reached its controller, the second one after the hub retried it
+            self.assertTrue(wait_for(lambda: not self.hub.pending))
+            self.assertEqual(self.controller.applied, [1, 1])
+            self.assertEqual(self.hub.deltas, 4)
+            self.assertEqual(self.hub.nodes[1].codes, [1, 2])
+        finally:
+            node1.close()
+            node2.close()
+
+    def test_controller_retry(self):
+        node1 = actuation.HubBackend(self.hub.address, 1, CLASS_LIST, "udp")
+        try:
+            node1.send([1, 0])
+            self.assertTrue(wait_for(lambda: self.controller.applied == [1] and not self.hub.pending))
+            node1.send([0, 0])  # Second message to the controller is dropped, the retry gets through
+            self.assertTrue(wait_for(lambda: self.controller.applied == [1, actuation.NO_VEHICLE] and not self.hub.pending))
+            self.assertGreaterEqual(self.hub.controller_retries, 1)
+            self.assertEqual(self.hub.controller_drops, 0)
+        finally:
+            node1.close()
+
+    def test_resync_after_hub_lost_node_state(self):
+        for transport in ("udp", "tcp"):
+            with self.subTest(transport=transport):
+                node_id = 3 if transport == "udp" else 4
+                node = actuation.HubBackend(self.hub.address, node_id, CLASS_LIST, transport)
+                try:
+                    node.send([1, 1])
+                    self.assertTrue(wait_for(lambda: self.hub.nodes[node_id].codes == [1, 1]))
+                    resyncs = self.hub.resyncs
+
+                    self.hub.nodes[node_id].session = None  # As if the hub had restarted
+                    with self.assertRaises(ConnectionError):
+                        node.send([1, 0])  # A delta against a base the hub no longer holds
+                    node.send([1, 0])  # The Publisher's retry carries the full state
+                    self.assertEqual(self.hub.resyncs, resyncs + 1)
+                    self.assertTrue(wait_for(lambda: self.firebase_state(node_id) == "car&none"))
+                finally:
+                    node.close()
+
+    def test_stand_ins(self):
+        for transport in ("udp", "tcp"):
+            with self.subTest(transport=transport):
+                deltas = self.hub.deltas
+                report = hub.run_stand_ins(self.hub.address, 5, 2, CLASS_LIST, seconds=1.0, change_interval=0.2, transport=transport,
+                                           first_node=10 if transport == "udp" else 20)
+                self.assertEqual(report["failures"], 0)
+                self.assertGreater(report["messages"], 0)
+                self.assertEqual(self.hub.deltas - deltas, report["messages"])
+
+
+if __name__ == "__main__":
+    unittest.main()
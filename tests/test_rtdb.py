@@ -0,0 +1,78 @@
+import time
+import unittest
+from stls_lib import rtdb
+
+
+class FlakyBackend(rtdb.MemoryBackend):
+    """Memory backend that fails every send while down is set."""
+    def __init__(self):
+        super().__init__()
+        self.down = False
+
+    def send(self, payload):
+        if self.down:
+            raise ConnectionError("outage")
+        super().send(payload)
+
+
+def wait_for(condition, timeout=2.0):
+    deadline = time.perf_counter() + timeout
+    while not condition() and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class PublisherOutageTest(unittest.TestCase):
+    def test_state_dropped_during_outage_is_delivered_after_recovery(self):
+        backend = FlakyBackend()
+        publisher = rtdb.Publisher(backend, max_retries=1, base_delay=0.01, max_delay=0.01, formatter=lambda data: data, refresh_interval=0.05)
+        try:
+            publisher.publish("car")
+            self.assertTrue(wait_for(lambda: publisher.delivered == "car"))
+
+            backend.down = True
+            publisher.publish("none")
+            self.assertTrue(wait_for(lambda: publisher.drops == 1))
+            self.assertEqual(publisher.undelivered, "none")
+            self.assertEqual(publisher.delivered, "car")  # Only moves forward on a successful send
+            time.sleep(0.15)  # Refreshes during the outage fail as well
+            self.assertEqual(backend.latest, "car")
+
+            backend.down = False
+            self.assertTrue(wait_for(lambda: publisher.delivered == "none"))
+            self.assertEqual(backend.latest, "none")
+            self.assertIsNone(publisher.undelivered)
+
+            # Later refreshes repeat the recovered state, never the older one
+            refreshes = publisher.refreshes
+            self.assertTrue(wait_for(lambda: publisher.refreshes > refreshes))
+            self.assertEqual(backend.latest, "none")
+        finally:
+            publisher.stop()
+
+    def test_dropped_state_is_retried_without_refresh_interval(self):
+        # Firebase publishers run without a refresh interval; a dropped state must still get through
+        backend = FlakyBackend()
+        publisher = rtdb.Publisher(backend, max_retries=1, base_delay=0.01, max_delay=0.05, formatter=lambda data: data)
+        try:
+            backend.down = True
+            publisher.publish("car")
+            self.assertTrue(wait_for(lambda: publisher.drops == 1))
+            failures = publisher.failures
+            self.assertTrue(wait_for(lambda: publisher.failures > failures))  # Still retrying during the outage
+
+            backend.down = False
+            self.assertTrue(wait_for(lambda: publisher.delivered == "car"))
+            self.assertEqual(backend.latest, "car")
+            self.assertIsNone(publisher.undelivered)
+
+            # Once delivered, nothing is sent again until a new state arrives
+            sends = len(backend.history)
+            time.sleep(0.2)
+            self.assertEqual(len(backend.history), sends)
+        finally:
+            publisher.stop()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import numpy as np
+from stls_lib import tracker
+
+
+def car(x, conf=0.8):
+    return np.array([[x, 100, x + 60, 140, conf, 2]], dtype=np.float32)
+
+
+class TrackerKeyframeTest(unittest.TestCase):
+    def test_new_track_is_confirmed_before_the_interval(self):
+        vehicle_tracker = tracker.Tracker(keyframe_interval=5)
+        vehicle_tracker.update(car(100))
+        # The velocity of a new track is unknown, so it is detected again on the next frame
+        self.assertTrue(vehicle_tracker.needs_detection())
+        vehicle_tracker.update(car(104))
+        vehicle_tracker.update(car(108))
+        self.assertFalse(vehicle_tracker.needs_detection())
+
+    def test_growing_uncertainty_fires_before_the_interval(self):
+        vehicle_tracker = tracker.Tracker(keyframe_interval=20)
+        x = 100
+        for _ in range(2):
+            x += 4
+            vehicle_tracker.update(car(x))
+        frames = 0
+        while not vehicle_tracker.needs_detection():
+            vehicle_tracker.propagate()
+            frames += 1
+        self.assertLess(frames, 19)
+        self.assertEqual(vehicle_tracker.early_keyframes, 1)
+
+    def test_unmatched_track_forces_detection_and_is_not_reported(self):
+        vehicle_tracker = tracker.Tracker(keyframe_interval=3)
+        x = 100
+        for _ in range(3):
+            x += 4
+            vehicle_tracker.update(car(x))
+        self.assertFalse(vehicle_tracker.needs_detection())
+
+        # The car leaves: the track coasts, but is neither reported nor trusted until detected again
+        tracks = vehicle_tracker.update(np.zeros((0, 6), dtype=np.float32))
+        self.assertEqual(len(tracks), 0)
+        self.assertEqual(len(vehicle_tracker.propagate()), 0)
+        self.assertTrue(vehicle_tracker.needs_detection())
+
+        # Seen again before it is dropped: same id, reported again
+        tracks = vehicle_tracker.update(car(x + 8))
+        self.assertEqual(tracks[:, 6].tolist(), [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
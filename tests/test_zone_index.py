@@ -0,0 +1,66 @@
+import unittest
+import cv2
+import numpy as np
+from stls_lib import stls
+
+FRAME_WIDTH, FRAME_HEIGHT = 160, 96
+
+
+def random_zones(rng, count):
+    """Simple (star-shaped, often concave) polygons that overlap each other and may leave the frame."""
+    zones = {}
+    for zone_indx in range(count):
+        center = rng.uniform((20, 15), (FRAME_WIDTH - 20, FRAME_HEIGHT - 15))
+        vertices = int(rng.integers(3, 9))
+        angles = np.sort(rng.uniform(0, 2 * np.pi, vertices))
+        radii = rng.uniform(8, 60, vertices)
+        points = center + np.stack([np.cos(angles), np.sin(angles)], axis=1) * radii[:, None]
+        zones[f"zone{zone_indx}"] = np.round(points).astype(np.int32).tolist()
+    return zones
+
+
+def first_zone(zones, point):
+    """The per-box reference: first zone whose polygon strictly contains the point."""
+    for zone_indx, zone in enumerate(zones.values()):
+        if cv2.pointPolygonTest(np.array(zone, dtype=np.int32), point, False) == 1:
+            return zone_indx
+    return -1
+
+
+class ZoneIndexTest(unittest.TestCase):
+    def test_raster_matches_point_polygon_test_on_every_pixel(self):
+        rng = np.random.default_rng(7)
+        for _ in range(5):
+            zones = random_zones(rng, 3)
+            zone_index = stls.build_zone_index(zones, FRAME_WIDTH, FRAME_HEIGHT)
+            expected = np.array([[first_zone(zones, (x, y)) for x in range(FRAME_WIDTH)] for y in range(FRAME_HEIGHT)])
+            mismatches = np.argwhere(zone_index != expected)
+            self.assertEqual(len(mismatches), 0, f"{len(mismatches)} pixels differ, first at (y, x) {mismatches[:1].tolist()}")
+
+    def test_edge_pixels_and_overlap(self):
+        # Two overlapping squares: the outline is outside both, the overlap belongs to the first zone
+        zones = {"a": [[10, 10], [60, 10], [60, 60], [10, 60]], "b": [[40, 20], [100, 20], [100, 80], [40, 80]]}
+        zone_index = stls.build_zone_index(zones, FRAME_WIDTH, FRAME_HEIGHT)
+        self.assertEqual(zone_index[10, 30], -1)  # On the outline of a
+        self.assertEqual(zone_index[11, 30], 0)   # Just inside a
+        self.assertEqual(zone_index[40, 50], 0)   # In both: first match wins
+        self.assertEqual(zone_index[40, 60], 1)   # On the outline of a, inside b
+        self.assertEqual(zone_index[20, 70], -1)  # On the outline of b
+        self.assertEqual(zone_index[21, 70], 1)
+
+    def test_assign_boxes_matches_per_box_loop(self):
+        rng = np.random.default_rng(11)
+        zones = random_zones(rng, 4)
+        zone_index = stls.build_zone_index(zones, FRAME_WIDTH, FRAME_HEIGHT)
+        # Some box centers fall off the raster and take the exact fallback
+        corners = rng.uniform(-30, FRAME_WIDTH + 30, (500, 4)).astype(np.float32)
+        boxes = np.concatenate([corners, np.full((500, 1), 0.9, np.float32), np.zeros((500, 1), np.float32)], axis=1)
+
+        box_zones = stls.assign_boxes_to_zones(boxes, zones, zone_index)
+        for box, box_zone in zip(boxes, box_zones):
+            x1, y1, x2, y2 = map(int, box[:4])
+            self.assertEqual(box_zone, first_zone(zones, (int(x1 + x2) // 2, int(y1 + y2) // 2)))
+
+
+if __name__ == "__main__":
+    unittest.main()
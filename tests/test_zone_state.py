@@ -0,0 +1,40 @@
+import contextlib
+import io
+import unittest
+import numpy as np
+from stls_lib import stls, zone_state
+
+CLASS_LIST = ["car", "bus", "truck", "motorcycle"]
+
+
+class ZoneStateEngineTest(unittest.TestCase):
+    def test_engine_matches_handle_zone_queuing(self):
+        rng = np.random.default_rng(3)
+        number_of_zones, interval = 3, 2.0
+        engine = zone_state.ZoneStateEngine(number_of_zones, interval, CLASS_LIST, verbose=False)
+        zones_data = [{"countdown_start_time": 0.0, "refresh": False, "get_vehicle": 'none'} for _ in range(number_of_zones)]
+
+        # The queuing logic reads a countdown start of 0.0 as "no countdown", so the clock starts at 1
+        current_time = 1.0
+        for frame in range(2000):
+            current_time += float(rng.uniform(0.02, 0.4))
+            # Bursts of traffic and quiet spells, with zero, one or several vehicles per zone
+            count = int(rng.integers(0, 6)) if (frame // 50) % 2 == 0 else int(rng.integers(0, 2))
+            class_ids = rng.integers(0, len(CLASS_LIST), count).astype(np.int16)
+            zone_ids = rng.integers(-1, number_of_zones, count).astype(np.int16)
+
+            collected_vehicle = stls.init_list_of_collected_vehicle(number_of_zones)
+            for class_id, zone_id in zip(class_ids, zone_ids):
+                if zone_id >= 0:
+                    collected_vehicle[zone_id].append(CLASS_LIST[class_id])
+            with contextlib.redirect_stdout(io.StringIO()):
+                expected = [stls.handle_zone_queuing(zone, collected_vehicle, current_time, zones_data, interval) for zone in range(number_of_zones)]
+
+            engine.step(class_ids, zone_ids, current_time)
+            self.assertEqual(engine.queuing_data(current_time), expected, f"frame {frame}")
+            self.assertEqual(engine.vehicle_names(), [zone["get_vehicle"] for zone in zones_data])
+            self.assertEqual(engine.countdown_start_time.tolist(), [zone["countdown_start_time"] for zone in zones_data])
+
+
+if __name__ == "__main__":
+    unittest.main()